@@ -0,0 +1,226 @@
+'''
+Batch evaluation of a file of queries, as done by search.py. A Searcher opens the index once and evaluates queries
+one at a time or in batches, and search_queries evaluates a stream of queries either in the current process or
+across a pool of worker processes (search.py -j N), returning the results in the order of the queries.
+
+The queries are read in windows of jobs * WINDOW_CHUNKS chunks of chunk_size queries, and the chunks of a window are
+evaluated by the workers in parallel. The index is opened by the main process before the pool is started, so that
+on platforms which fork the workers, the workers inherit the memory mappings of the dictionary and postings files
+and share their pages with each other, instead of each reading its own copy. Where the workers cannot be forked,
+each worker maps the files itself, which still shares the pages through the operating system page cache.
+
+If the queries are grouped (search.py -g), the queries of a window are reordered so that the queries whose most
+frequent term is the same are evaluated in the same chunk, and each chunk is evaluated from a BatchPostings, so that
+the postings list of each term is decoded once per chunk. The results are put back into the order of the queries.
+
+If the Searcher traces the queries, the trace records (see Tracer.py) of the queries evaluated by a worker are sent
+back to the main process with their results, and passed to the callbacks of the Tracer of the main process in the
+order of the queries.
+'''
+import multiprocessing
+from itertools import islice
+from BooleanParser import evaluate_query, count_query, explain_query, query_terms
+from BooleanEval import ENGINES
+from SegmentedIndex import open_index
+from PostingsCache import PostingsCache, BatchPostings, DEFAULT_CACHE_SIZE
+from ResultCache import ResultCache, DEFAULT_RESULT_CACHE_SIZE
+from Tracer import Tracer, TracingPostings
+from Reordering import read_docid_map
+from WildcardIndex import DEFAULT_MAX_EXPANSIONS
+
+DEFAULT_CHUNK_SIZE = 256
+WINDOW_CHUNKS = 4
+
+class Searcher:
+    '''
+    The Searcher class evaluates queries against an index which is opened once, together with any delta segments,
+    behind a PostingsCache, with a ResultCache shared by all the queries. The result of a query is an array of
+    document IDs, or its number of document IDs if count_only is set, or its plan as text if explain is set, and a
+    malformed query, for which the parser raises a ValueError, has an empty result. If trace is set, the evaluation of
+    every query is recorded by the Tracer of the Searcher, whose callbacks receive the records.
+    If the document IDs of the index are reassigned (see Reordering.py), the results are mapped back to the original
+    document IDs.
+    '''
+
+    def __init__(self, dictionary_file, postings_file, engine="scalar", cache_size=DEFAULT_CACHE_SIZE,
+                 result_cache_size=DEFAULT_RESULT_CACHE_SIZE, limit=None, count_only=False, explain=False,
+                 trace=False, max_expansions=DEFAULT_MAX_EXPANSIONS, result_ttl=None):
+        '''
+        :param engine: the name of the merge engine in ENGINES.
+        :param cache_size: the budget in bytes of the PostingsCache of the index.
+        :param result_cache_size: the budget in bytes of the ResultCache, or 0 to evaluate every query.
+        :param limit: the maximum number of document IDs in a result, or None for all of them.
+        :param max_expansions: the maximum number of terms a wildcard operand is expanded into.
+        :param result_ttl: the number of seconds for which a result is kept in the ResultCache, or None to keep
+        results until they are evicted.
+        '''
+        self.postings = PostingsCache(open_index(dictionary_file, postings_file), cache_size)
+        self.engine = ENGINES[engine]
+        self.tracer = Tracer() if trace else None
+        if self.tracer is None:
+            self.evaluator = self.engine(self.postings)
+        else:
+            self.evaluator = self.engine(TracingPostings(self.postings, self.tracer))
+            self.evaluator.tracer = self.tracer
+        self.evaluator.max_expansions = max_expansions
+        self.results = ResultCache(result_cache_size, result_ttl) if result_cache_size else None
+        self.docid_map = read_docid_map(postings_file)
+        self.limit = limit
+        self.count_only = count_only
+        self.explain = explain
+
+    def search(self, query, evaluator=None):
+        '''
+        Returns the result of a query, evaluated by the given evaluator or the evaluator of the index.
+        '''
+        evaluator = evaluator or self.evaluator
+        if self.tracer is not None:
+            self.tracer.begin(query)
+        error = None
+        try:
+            if self.explain:
+                result = explain_query(query, evaluator)
+            elif self.count_only:
+                result = count_query(query, evaluator, self.results)
+            elif self.docid_map is None:
+                result = evaluate_query(query, evaluator, self.results, self.limit)
+            elif self.docid_map.ordered:
+                result = self.docid_map.original(evaluate_query(query, evaluator, self.results, self.limit))
+            else:
+                # the first original document IDs may be anywhere in the result
+                result = self.docid_map.original(evaluate_query(query, evaluator, self.results), self.limit)
+        except ValueError as exception:
+            error = str(exception)
+            result = "malformed query" if self.explain else 0 if self.count_only else []
+        if self.tracer is not None:
+            self.tracer.end(result if self.count_only else 0 if self.explain else len(result), error)
+        return result
+
+    def search_batch(self, queries, group=False):
+        '''
+        Returns the results of a list of queries, in order. If group is set, the postings lists of all the terms of
+        the queries are read once, and shared by the evaluation of all the queries (see BatchPostings).
+        '''
+        if not group:
+            return [self.search(query) for query in queries]
+        terms = set()
+        for query in queries:
+            terms.update(query_terms(query))
+        evaluator = self.engine(BatchPostings(self.evaluator.postings, terms))
+        evaluator.universe = self.evaluator.universe
+        evaluator.tracer = self.tracer
+        evaluator.max_expansions = self.evaluator.max_expansions
+        results = [self.search(query, evaluator) for query in queries]
+        self.evaluator.universe = evaluator.universe
+        return results
+
+    def group_key(self, query):
+        '''
+        Returns the term of a query with the longest postings list, which is the most expensive list to decode, or
+        an empty string if the query has no terms in the index.
+        '''
+        terms = [term for term in query_terms(query) if term in self.postings]
+        return max(terms, key=self.postings.freq, default="")
+
+    def stats(self):
+        '''
+        Returns the statistics of the PostingsCache and of the ResultCache, or None for the ResultCache if it is
+        disabled (see PostingsCache.stats and ResultCache.stats).
+        '''
+        return self.postings.stats(), self.results.stats() if self.results is not None else None
+
+    def close(self):
+        self.postings.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+worker_searcher = None
+
+def init_worker(*args):
+    '''
+    Initialises a worker process. A forked worker inherits the Searcher of the main process, and a spawned worker
+    opens its own.
+    '''
+    global worker_searcher
+    if worker_searcher is None:
+        worker_searcher = Searcher(*args)
+
+def search_chunk(chunk, searcher=None):
+    '''
+    Evaluates a (queries, group) chunk, in a worker process unless a searcher is given. Returns the results of the
+    queries and, if the queries are traced, their trace records, which are collected instead of being passed to
+    the callbacks of the Tracer.
+    '''
+    queries, group = chunk
+    searcher = searcher or worker_searcher
+    if searcher.tracer is None:
+        return searcher.search_batch(queries, group), None
+    records = []
+    callbacks, searcher.tracer.callbacks = searcher.tracer.callbacks, [records.append]
+    try:
+        results = searcher.search_batch(queries, group)
+    finally:
+        searcher.tracer.callbacks = callbacks
+    return results, records
+
+def group_window(window, searcher, chunk_size):
+    '''
+    Splits a window of queries into chunks of chunk_size queries, grouping the queries with the same group_key into
+    the same chunks. Returns the list of chunks and the list of the positions of the queries in the chunks, in order.
+    '''
+    order = sorted(range(len(window)), key=lambda index: searcher.group_key(window[index]))
+    chunks = [[window[index] for index in order[start:start + chunk_size]]
+              for start in range(0, len(order), chunk_size)]
+    positions = [0] * len(window)
+    for position, index in enumerate(order):
+        positions[index] = position
+    return chunks, positions
+
+def search_queries(queries, searcher, jobs=1, group=False, chunk_size=DEFAULT_CHUNK_SIZE, worker_args=()):
+    '''
+    Evaluates a stream of queries and yields their results in order.
+    :param queries: an iterable of boolean queries.
+    :param searcher: the Searcher of the main process, which is inherited by the forked workers.
+    :param jobs: the number of worker processes, or 1 to evaluate the queries in the current process.
+    :param group: whether to group the queries of a window by their most frequent term.
+    :param worker_args: the arguments of the Searcher opened by a worker which is not forked.
+    '''
+    global worker_searcher
+    pool = None
+    if jobs > 1:
+        worker_searcher = searcher
+        methods = multiprocessing.get_all_start_methods()
+        context = multiprocessing.get_context("fork" if "fork" in methods else None)
+        pool = context.Pool(jobs, init_worker, worker_args)
+    try:
+        queries = iter(queries)
+        while True:
+            window = list(islice(queries, chunk_size * WINDOW_CHUNKS * jobs))
+            if not window:
+                break
+            if group:
+                chunks, positions = group_window(window, searcher, chunk_size)
+            else:
+                chunks = [window[start:start + chunk_size] for start in range(0, len(window), chunk_size)]
+                positions = range(len(window))
+            if pool is not None:
+                outputs = pool.map(search_chunk, [(chunk, group) for chunk in chunks])
+            else:
+                outputs = [search_chunk((chunk, group), searcher) for chunk in chunks]
+            results = [result for chunk_results, records in outputs for result in chunk_results]
+            if searcher.tracer is not None:
+                records = [record for chunk_results, records in outputs for record in records]
+            for position in positions:
+                if searcher.tracer is not None:
+                    for callback in searcher.tracer.callbacks:
+                        callback(records[position])
+                yield results[position]
+    finally:
+        if pool is not None:
+            pool.close()
+            pool.join()
+            worker_searcher = None
@@ -0,0 +1,82 @@
+from array import array
+
+# the offsets of the set bits in each possible byte value
+BYTE_OFFSETS = [tuple(bit for bit in range(8) if byte >> bit & 1) for byte in range(256)]
+
+class Bitmap:
+    '''
+    A postings list of a high document frequency term stored as a bitmap, where bit d is set if
+    document ID d is in the list. The bitmap is held as a python int, so that the intersection, union and
+    difference of two bitmaps are single word-parallel int operations, and as the equivalent little-endian
+    bytes, which are used to test single document IDs. Each form is computed from the other when first needed.
+    '''
+
+    def __init__(self, bits=None, data=None, count=None):
+        '''
+        :param bits: the bitmap as a python int.
+        :param data: the bitmap as little-endian bytes, if bits is not given.
+        :param count: the number of set bits, if known.
+        '''
+        self._bits = bits
+        self._data = data
+        self.count = count
+
+    @staticmethod
+    def from_docIDs(docIDs):
+        '''
+        Returns the bitmap of a list of integer document IDs.
+        '''
+        if not docIDs:
+            return Bitmap(0, count=0)
+        data = bytearray((max(docIDs) >> 3) + 1)
+        for docID in docIDs:
+            data[docID >> 3] |= 1 << (docID & 7)
+        return Bitmap(data=bytes(data), count=len(docIDs))
+
+    @property
+    def bits(self):
+        if self._bits is None:
+            self._bits = int.from_bytes(self._data, "little")
+        return self._bits
+
+    @property
+    def data(self):
+        if self._data is None:
+            self._data = self._bits.to_bytes((self._bits.bit_length() + 7) >> 3, "little")
+        return self._data
+
+    def __len__(self):
+        if self.count is None:
+            self.count = bin(self.bits).count("1")
+        return self.count
+
+    def __iter__(self):
+        for index, byte in enumerate(self.data):
+            if byte:
+                base = index << 3
+                for offset in BYTE_OFFSETS[byte]:
+                    yield base + offset
+
+    def __contains__(self, docID):
+        data = self.data
+        return (docID >> 3) < len(data) and data[docID >> 3] >> (docID & 7) & 1 == 1
+
+    def filter(self, docIDs, keep=True):
+        '''
+        Returns the array of the document IDs in docIDs which are in the bitmap, or which are not in the
+        bitmap if keep is False.
+        :param docIDs: an array of integer document IDs.
+        '''
+        data = self.data
+        length = len(data) << 3
+        if keep:
+            return array(docIDs.typecode,
+                         [docID for docID in docIDs if docID < length and data[docID >> 3] >> (docID & 7) & 1])
+        return array(docIDs.typecode,
+                     [docID for docID in docIDs if docID >= length or not data[docID >> 3] >> (docID & 7) & 1])
+
+    def to_array(self, typecode):
+        '''
+        Returns the sorted array of the document IDs in the bitmap.
+        '''
+        return array(typecode, iter(self))
@@ -1,57 +1,35 @@
-def get_docID(list, index):
-    '''
-    Takes in a list and an index and returns the document ID at that index.
-    '''
-    return int(list[index].split("/")[0])
+from array import array
+from bisect import bisect_left
+from PostingsFormat import DOCID_TYPECODE, SkipList
+from Bitmap import Bitmap
+from WildcardIndex import DEFAULT_MAX_EXPANSIONS
 
-def has_skip(list, index):
-    '''
-    Checks if there is a skip pointer in the postings list at that index.
-    '''
-    return "/" in list[index]
-
-def get_skip_pointer(list, index):
-    '''
-    Returns the skip pointer associated with the given index on the list.
-    '''
-    return int(list[index].split("/")[1])
+try:
+    import numpy
+except ImportError:
+    numpy = None
 
-def get_skip_docID(list, index):
-    '''
-    Returns the document ID which the skip pointer specified at the given index points to.
-    '''
-    pointer = int(list[index].split("/")[1])
-    return get_docID(list, pointer)
+# the n-ary merges search for each document ID of the shortest list in the other lists if the other lists are longer
+# than this many times the length of the shortest list per list, and otherwise use set operations
+GALLOP_FACTOR = 16
 
-def insert_skip_pointers(postings_list):
+def get_skip_distance(length):
     '''
-    Inserts skip pointers into a postings list.
-    :param postings_list: a list of postings in the form of strings.
+    Returns the skip distance of a postings list of the given length, which is the root of the length.
+    Skip pointers are implicit: every index which is a multiple of the skip distance has a skip pointer
+    to the index skip distance further, if that index is within the list. Skip pointers are only used
+    if the skip distance exceeds 2, otherwise 0 is returned.
     '''
-    length = len(postings_list)
     skip_distance = int(length ** 0.5)
     if skip_distance <= 2:
-        return postings_list
-    new_list = []
-    count = 0
-    for posting in postings_list:
-        if count % skip_distance == 0:
-            skip_pointer = count + skip_distance
-            if skip_pointer < length:
-                new_list.append(posting + "/" + str(skip_pointer))
-            else:
-                new_list.append(posting)
-        else:
-            new_list.append(posting)
-        count += 1
-    return new_list
+        return 0
+    return skip_distance
 
-class NOT_term:
+def new_postings_list():
     '''
-    A class that stores elements meant to be negated with NOT.
+    Returns an empty postings list, which is an array of integer document IDs.
     '''
-    def __init__(self, value):
-        self.value = value
+    return array(DOCID_TYPECODE)
 
 class BooleanEval:
     '''
@@ -59,27 +37,56 @@ class BooleanEval:
     The methods may take in query terms or previously evaluated results, which are represented
     in the form of a (freq, postings list) tuple containing the length of the list to
     facilitate optimisation, and a list of postings.
-    The results of merge are also inserted with skip pointers to allow for future merges.
+    Postings lists are arrays of integer document IDs. Skip pointers are not stored, since the skip
+    pointer at each multiple of the skip distance of a list can be derived from its length (see get_skip_distance).
+    The postings lists of high frequency terms may instead be Bitmaps. The AND, OR and ANDNOT methods merge two
+    arrays with the *_arrays methods, and otherwise operate on the bitmaps directly, converting between the two
+    representations as needed (see to_bitmap and compact). The long lists of a skewed AND or ANDNOT may be SkipLists,
+    which are decoded lazily (see get_skip_list), and which only filter the result of the other lists.
+    If a Tracer (see Tracer.py) is set as the tracer of the evaluator, the pairwise merges of arrays report the
+    number of skip pointers followed and of single steps taken to it, and the SkipLists the number of gallops on
+    their skip tables and of blocks searched.
+    A wildcard operand is expanded into at most max_expansions terms (see expand), whose postings lists are merged
+    at once by OR_lists.
     '''
 
-    def __init__(self, dictionary):
-        self.dictionary = dictionary
+    def __init__(self, postings):
+        '''
+        :param postings: the PostingsStore serving the postings lists of the index.
+        '''
+        self.postings = postings
+        self.universe = None
+        self.tracer = None
+        self.max_expansions = DEFAULT_MAX_EXPANSIONS
 
     def get_postings_list(self, word):
         '''
         Returns a (freq, postings list) tuple given a word as a query.
         :param word: a single query term as a string.
         '''
-        postings = open("./postings.txt", "r")
-        if word in self.dictionary:
-            freq = self.dictionary[word][0]
-            postings_pointer = self.dictionary[word][1]
-            postings.seek(postings_pointer)
-            posting_list = list(postings.readline().split(","))
-        else:
-            return (0, [])
-        posting_list[-1] = posting_list[-1][:-1]
-        return (freq, posting_list)
+        if word not in self.postings:
+            return (0, new_postings_list())
+        return (self.postings.freq(word), self.postings.get(word))
+
+    def get_skip_list(self, word):
+        '''
+        Returns a (freq, postings list) tuple given a word as a query, where the postings list is a SkipList if the
+        index can serve one, so that the list is only decoded where it is searched, and is otherwise decoded as by
+        get_postings_list.
+        '''
+        if word not in self.postings:
+            return (0, new_postings_list())
+        skip_list = self.postings.skip_list(word)
+        if skip_list is None:
+            return self.get_postings_list(word)
+        return (len(skip_list), skip_list)
+
+    def expand(self, pattern):
+        '''
+        Returns the sorted list of the terms which match a wildcard pattern, e.g. "oil*", cut to the first
+        max_expansions terms (see WildcardIndex.py).
+        '''
+        return self.postings.expand(pattern, self.max_expansions)
 
     def get_postings_lists(self, input):
         '''
@@ -96,13 +103,36 @@ class BooleanEval:
 
     def get_all_docIDs(self):
         '''
-        Returns a list of all document IDs in the postings file.
+        Returns a Bitmap of all document IDs in the postings file. The bitmap is read once and cached.
+        '''
+        if self.universe is None:
+            self.universe = Bitmap.from_docIDs(self.postings.all_docIDs())
+        return self.universe
+
+    def to_bitmap(self, postings_list):
+        '''
+        Returns a postings list as a Bitmap.
+        '''
+        if isinstance(postings_list, Bitmap):
+            return postings_list
+        return Bitmap.from_docIDs(postings_list)
+
+    def to_array(self, postings_list):
+        '''
+        Returns a postings list as an array of integer document IDs.
+        '''
+        if isinstance(postings_list, Bitmap):
+            return postings_list.to_array(DOCID_TYPECODE)
+        return postings_list
+
+    def compact(self, bitmap):
         '''
-        postings = open("./postings.txt", "r")
-        postings.seek(0)
-        posting_list = list(postings.readline().split(","))
-        posting_list[-1] = posting_list[-1][:-1]
-        return posting_list
+        Converts the Bitmap result of a merge back into an array if it is sparse, i.e. if it has fewer document IDs
+        than a sixteenth of the number of bits in the bitmap, since an array is then cheaper to merge.
+        '''
+        if len(bitmap) * 16 < len(bitmap.data) * 8:
+            return bitmap.to_array(DOCID_TYPECODE)
+        return bitmap
 
     def eval_single_term(self, term):
         '''
@@ -111,135 +141,186 @@ class BooleanEval:
         :return: A (freq, postings list) tuple
         '''
         postings = self.get_postings_list(term)[1]
-        result = []
-        for index in range(len(postings)):
-            result.append(str(get_docID(postings, index)))
-        return (len(result), result)
+        return (len(postings), postings)
 
     def OR_lists(self, terms):
         '''
         Returns a (freq, postings list) tuple that represents the disjunction/union of 2 or more search terms.
+        All the lists are merged at once: the Bitmaps with a bitwise or, and the arrays with OR_many_arrays, so that
+        no intermediate union is built.
         :param terms: A list containing either search terms or already computed (freq, postings list) tuples.
         :return: A (freq, postings list) tuple
         '''
-        lists = self.get_postings_lists(terms)
-        lists.sort(key=lambda x: x[0])
-        lists = list(map(lambda x: x[1], lists))
-        while len(lists) > 1:
-            new_list = self.OR(lists[0], lists[1])
-            lists.pop(0)
-            lists.pop(0)
-            lists = [new_list] + lists
-        result = insert_skip_pointers(lists[0])
-        result = (len(result), result)
-        return result
+        lists = [postings_list for freq, postings_list in self.get_postings_lists(terms)]
+        bitmaps = [postings_list for postings_list in lists if isinstance(postings_list, Bitmap)]
+        arrays = [postings_list for postings_list in lists if not isinstance(postings_list, Bitmap) and postings_list]
+        if len(arrays) > 1:
+            result = self.OR_many_arrays(arrays)
+        elif arrays:
+            result = arrays[0]
+        else:
+            result = new_postings_list()
+        if bitmaps:
+            bits = self.to_bitmap(result).bits
+            for bitmap in bitmaps:
+                bits |= bitmap.bits
+            result = Bitmap(bits)
+        return (len(result), result)
 
     def OR(self, listA, listB):
         '''
-        Returns the union of listA and listB, both of which are postings lists.
+        Returns the union of listA and listB, both of which are postings lists. If either list is a Bitmap,
+        the other is converted into a bitmap and the result is a Bitmap.
         '''
-        result = []
+        if isinstance(listA, Bitmap) or isinstance(listB, Bitmap):
+            return Bitmap(self.to_bitmap(listA).bits | self.to_bitmap(listB).bits)
+        return self.OR_arrays(listA, listB)
+
+    def OR_arrays(self, listA, listB):
+        '''
+        Returns the union of listA and listB, both of which are arrays of document IDs.
+        '''
+        result = new_postings_list()
         i, j = 0, 0
         lengthA = len(listA)
         lengthB = len(listB)
         while i < lengthA and j < lengthB:
-            docID_A = get_docID(listA, i)
-            docID_B = get_docID(listB, j)
+            docID_A = listA[i]
+            docID_B = listB[j]
             if docID_A == docID_B:
-                result.append(str(docID_A))
+                result.append(docID_A)
                 i += 1
                 j += 1
             elif docID_A < docID_B:
-                result.append(str(docID_A))
+                result.append(docID_A)
                 i += 1
-            elif docID_A > docID_B:
-                result.append(str(docID_B))
+            else:
+                result.append(docID_B)
                 j += 1
-        while i < lengthA:
-            result.append(str(get_docID(listA, i)))
-            i += 1
-        while j < lengthB:
-            result.append(str(get_docID(listB, j)))
-            j += 1
+        result.extend(listA[i:])
+        result.extend(listB[j:])
         return result
 
-    def AND_and_ANDNOT_lists(self, terms):
-        '''
-        Returns the intersection of either positive or negative search terms e.g. A AND B AND C AND NOT D.
-        The elements in terms may be query terms or (freq, postings list) tuples.
-        Positive terms are placed in positive_posting_lists and negative terms are placed in negative_posting_lists.
-        Positive terms are intersected first, and the resulting intersection is intersected with the complement
-        of the postings lists in negative_posting_lists. This ensures that reordering of an expression with both
-        AND and AND NOT does not influence the final result.
-        For example, A AND B AND NOT C AND D can be evaluated as (A AND B AND D) AND NOT C. Evaluating in another order,
-        e.g. ((A AND B) AND NOT C) AND D, would be incorrect.
-        The terms are sorted by length of the postings list so that the shorter lists are merged first.
-        :return: A (freq, postings list) tuple
-        '''
-        negative_list = []
-        positive_list = []
-        for item in terms:
-            if isinstance(item, NOT_term):
-                negative_list.append(item.value)
-            else:
-                positive_list.append(item)
-        positive_posting_lists = self.get_postings_lists(positive_list)
-        positive_posting_lists.sort(key=lambda x: x[0]) # sort by length
-        negative_posting_lists = self.get_postings_lists(negative_list)
-        negative_posting_lists.sort(key=lambda x: x[0]) # sort by length
-        intersection = self.AND_lists(positive_posting_lists)
-        intersection = intersection[1]
-        negative_posting_lists = list(map(lambda x: x[1], negative_posting_lists))
-        while negative_posting_lists:
-            intersection = self.ANDNOT(intersection, negative_posting_lists.pop(0))
-        intersection = insert_skip_pointers(intersection)
-        return (len(intersection), intersection)
-
     def AND_lists(self, lists):
         '''
         Returns a (freq, postings list) tuple that represents the intersection of 2 or more search terms.
+        All the lists are intersected at once: the Bitmaps with a bitwise and, and the arrays with AND_many_arrays,
+        whose result is then filtered by the intersection of the bitmaps, so that no intermediate intersection is
+        built.
+        The SkipLists, if any, then filter the result, looking for each of its document IDs through their skip tables.
         :param lists: A list containing (freq, postings list) tuples.
         '''
-        lists = list(map(lambda x: x[1], lists))
-        while len(lists) > 1:
-            new_list = self.AND(lists[0], lists[1])
-            lists.pop(0)
-            lists.pop(0)
-            lists = [new_list] + lists
-        result = insert_skip_pointers(lists[0])
-        result = (len(result), result)
-        return result
+        lists = [postings_list for freq, postings_list in lists]
+        skip_lists = [postings_list for postings_list in lists if isinstance(postings_list, SkipList)]
+        if skip_lists:
+            lists = [postings_list for postings_list in lists if not isinstance(postings_list, SkipList)]
+            if not lists:
+                skip_lists.sort(key=len)
+                lists = [skip_lists.pop(0).to_array()]
+        bitmaps = [postings_list for postings_list in lists if isinstance(postings_list, Bitmap)]
+        arrays = [postings_list for postings_list in lists if not isinstance(postings_list, Bitmap)]
+        if bitmaps:
+            bits = bitmaps[0].bits
+            for bitmap in bitmaps[1:]:
+                bits &= bitmap.bits
+            bitmap = Bitmap(bits)
+        if not arrays:
+            result = self.compact(bitmap)
+        else:
+            result = self.AND_many_arrays(arrays) if len(arrays) > 1 else arrays[0]
+            if bitmaps:
+                result = bitmap.filter(result)
+        for skip_list in skip_lists:
+            result = skip_list.filter(self.to_array(result), tracer=self.tracer)
+        return (len(result), result)
+
+    def ANDNOT_lists(self, term, negatives):
+        '''
+        Returns a (freq, postings list) tuple of the document IDs of term which are in none of the negatives, e.g.
+        A AND NOT B AND NOT C. The document IDs are tested against all the negative lists at once, and through the skip
+        tables of the negatives which are SkipLists.
+        :param term: A (freq, postings list) tuple
+        :param negatives: A list containing (freq, postings list) tuples.
+        '''
+        result = term[1]
+        negatives = [postings_list for freq, postings_list in negatives]
+        skip_lists = [postings_list for postings_list in negatives if isinstance(postings_list, SkipList)]
+        if skip_lists:
+            negatives = [postings_list for postings_list in negatives if not isinstance(postings_list, SkipList)]
+            result = self.to_array(result)
+            for skip_list in skip_lists:
+                result = skip_list.filter(result, keep=False, tracer=self.tracer)
+        bitmaps = [postings_list for postings_list in negatives if isinstance(postings_list, Bitmap)]
+        arrays = [postings_list for postings_list in negatives if not isinstance(postings_list, Bitmap) and postings_list]
+        if bitmaps:
+            bits = bitmaps[0].bits
+            for bitmap in bitmaps[1:]:
+                bits |= bitmap.bits
+            result = self.ANDNOT(result, Bitmap(bits))
+        if len(arrays) == 1:
+            result = self.ANDNOT(result, arrays[0])
+        elif arrays:
+            if isinstance(result, Bitmap):
+                result = self.ANDNOT(result, self.OR_many_arrays(arrays))
+            else:
+                result = self.ANDNOT_many_arrays(result, arrays)
+        return (len(result), result)
 
     def AND(self, listA, listB):
         '''
         Returns the intersection of listA and listB, both of which are postings lists.
+        The intersection of two Bitmaps is a bitwise and, and the intersection of a Bitmap with an array
+        keeps the document IDs of the array which are set in the bitmap.
         '''
-        result = []
+        if isinstance(listA, Bitmap) and isinstance(listB, Bitmap):
+            return self.compact(Bitmap(listA.bits & listB.bits))
+        if isinstance(listA, Bitmap):
+            return listA.filter(listB)
+        if isinstance(listB, Bitmap):
+            return listB.filter(listA)
+        return self.AND_arrays(listA, listB)
+
+    def AND_arrays(self, listA, listB):
+        '''
+        Returns the intersection of listA and listB, both of which are arrays of document IDs.
+        '''
+        result = new_postings_list()
         i, j = 0, 0
-        while i < len(listA) and j < len(listB):
-            docID_A = get_docID(listA, i)
-            docID_B = get_docID(listB, j)
+        lengthA = len(listA)
+        lengthB = len(listB)
+        skipA = get_skip_distance(lengthA)
+        skipB = get_skip_distance(lengthB)
+        skipsA, skipsB = 0, 0
+        while i < lengthA and j < lengthB:
+            docID_A = listA[i]
+            docID_B = listB[j]
             if docID_A == docID_B:
-                result.append(str(docID_A))
+                result.append(docID_A)
                 i += 1
                 j += 1
             elif docID_A < docID_B:
-                if has_skip(listA, i) and get_skip_docID(listA, i) <= docID_B:
-                    while has_skip(listA, i) and get_skip_docID(listA, i) <= docID_B:
-                        i = get_skip_pointer(listA, i)
+                if skipA and i % skipA == 0 and i + skipA < lengthA and listA[i + skipA] <= docID_B:
+                    while i + skipA < lengthA and listA[i + skipA] <= docID_B:
+                        i += skipA
+                        skipsA += 1
                 else:
                     i += 1
-            elif docID_A > docID_B:
-                if has_skip(listB, j) and get_skip_docID(listB, j) <= docID_A:
-                    while has_skip(listB, j) and get_skip_docID(listB, j) <= docID_A:
-                        j = get_skip_pointer(listB, j)
+            else:
+                if skipB and j % skipB == 0 and j + skipB < lengthB and listB[j + skipB] <= docID_A:
+                    while j + skipB < lengthB and listB[j + skipB] <= docID_A:
+                        j += skipB
+                        skipsB += 1
                 else:
                     j += 1
+        if self.tracer is not None:
+            # every position passed over which was not skipped was a single step
+            self.tracer.merge_steps(skipsA + skipsB, i + j - skipsA * skipA - skipsB * skipB)
         return result
 
     def NOT(self, term):
         '''
         Returns a (freq, postings list) tuple of all the document IDs that are not in the postings list of term.
+        The complement is computed as a bitwise difference from the cached Bitmap of all the document IDs.
         :param term: A (freq, postings list) tuple
         '''
         if isinstance(term, str):
@@ -247,32 +328,235 @@ class BooleanEval:
         else:
             posting_list = term
         all = self.get_all_docIDs()
-        result = self.ANDNOT(all, posting_list[1])
-        result = insert_skip_pointers(result)
+        result = self.compact(Bitmap(all.bits & ~self.to_bitmap(posting_list[1]).bits))
         return (len(result), result)
 
     def ANDNOT(self, listA, listB):
         '''
         Returns a list of all document IDs which are in listA but not in listB.
+        If listA is a Bitmap, the result is a bitwise difference, otherwise the document IDs of listA are
+        tested against listB if it is a Bitmap.
         '''
-        result = []
+        if isinstance(listA, Bitmap):
+            return self.compact(Bitmap(listA.bits & ~self.to_bitmap(listB).bits))
+        if isinstance(listB, Bitmap):
+            return listB.filter(listA, keep=False)
+        return self.ANDNOT_arrays(listA, listB)
+
+    def ANDNOT_arrays(self, listA, listB):
+        '''
+        Returns a list of all document IDs which are in listA but not in listB, both of which are arrays of document IDs.
+        '''
+        result = new_postings_list()
         i, j = 0, 0
-        while i < len(listA) and j < len(listB):
-            docID_A = get_docID(listA, i)
-            docID_B = get_docID(listB, j)
+        lengthA = len(listA)
+        lengthB = len(listB)
+        skipB = get_skip_distance(lengthB)
+        skipsB = 0
+        while i < lengthA and j < lengthB:
+            docID_A = listA[i]
+            docID_B = listB[j]
             if docID_A == docID_B:
                 i += 1
                 j += 1
             elif docID_A < docID_B:
-                result.append(str(docID_A))
+                result.append(docID_A)
                 i += 1
-            elif docID_A > docID_B:
-                if has_skip(listB, j) and get_skip_docID(listB, j) <= docID_A:
-                    while has_skip(listB, j) and get_skip_docID(listB, j) <= docID_A:
-                        j = get_skip_pointer(listB, j)
+            else:
+                if skipB and j % skipB == 0 and j + skipB < lengthB and listB[j + skipB] <= docID_A:
+                    while j + skipB < lengthB and listB[j + skipB] <= docID_A:
+                        j += skipB
+                        skipsB += 1
                 else:
                     j += 1
-        while i < len(listA):
-            result.append(str(get_docID(listA, i)))
-            i += 1
+        if self.tracer is not None:
+            self.tracer.merge_steps(skipsB, i + j - skipsB * skipB)
+        result.extend(listA[i:])
+        return result
+
+    def OR_many_arrays(self, lists):
+        '''
+        Returns the union of 2 or more arrays of document IDs. The arrays are merged at once, by collecting their
+        document IDs into a single set which is then sorted, so that the cost is linear in the total length of the
+        arrays rather than in the sum of the lengths of the intermediate unions. (A k-way merge with a heap of the
+        next document ID of each array is equivalent, but much slower in python.)
+        '''
+        if len(lists) == 2:
+            return self.OR_arrays(lists[0], lists[1])
+        return array(DOCID_TYPECODE, sorted(set().union(*lists)))
+
+    def AND_many_arrays(self, lists):
+        '''
+        Returns the intersection of 2 or more arrays of document IDs, adapting to the lengths of the arrays.
+        If the shortest array is much shorter than the others, each of its document IDs is searched for in each other
+        array in turn by a binary search from the position reached in that array, which gallops through the longer
+        arrays, and otherwise the arrays are intersected at once as sets. No intermediate intersection is built.
+        '''
+        lists = sorted(lists, key=len)
+        if len(lists) == 2:
+            return self.AND_arrays(lists[0], lists[1])
+        shortest, others = lists[0], lists[1:]
+        if len(shortest) * len(others) * GALLOP_FACTOR >= sum(map(len, others)):
+            docIDs = set(shortest)
+            for postings_list in others:
+                docIDs.intersection_update(postings_list)
+                if not docIDs:
+                    break
+            return array(DOCID_TYPECODE, sorted(docIDs))
+        result = new_postings_list()
+        lengths = [len(postings_list) for postings_list in others]
+        positions = [0] * len(others)
+        for docID in shortest:
+            for index, postings_list in enumerate(others):
+                position = bisect_left(postings_list, docID, positions[index])
+                if position == lengths[index]:
+                    return result
+                positions[index] = position
+                if postings_list[position] != docID:
+                    break
+            else:
+                result.append(docID)
+        return result
+
+    def ANDNOT_many_arrays(self, listA, negatives):
+        '''
+        Returns the document IDs of listA which are in none of the negatives, all of which are arrays of document IDs.
+        As in AND_many_arrays, each document ID of listA is searched for in each negative array by a binary search if
+        listA is much shorter than the negatives, and otherwise the negatives are removed at once from a set of listA.
+        '''
+        if len(listA) * len(negatives) * GALLOP_FACTOR >= sum(map(len, negatives)):
+            return array(DOCID_TYPECODE, sorted(set(listA).difference(*negatives)))
+        result = new_postings_list()
+        lengths = [len(postings_list) for postings_list in negatives]
+        positions = [0] * len(negatives)
+        for docID in listA:
+            for index, postings_list in enumerate(negatives):
+                position = bisect_left(postings_list, docID, positions[index])
+                positions[index] = position
+                if position < lengths[index] and postings_list[position] == docID:
+                    break
+            else:
+                result.append(docID)
+        return result
+
+class NumpyBooleanEval(BooleanEval):
+    '''
+    A BooleanEval engine which merges postings lists with vectorized numpy operations on the sorted
+    document ID arrays instead of stepping through them one posting at a time.
+    Intersections use a galloping search (numpy.searchsorted) of the shorter list in the longer list when
+    the list lengths are skewed, and a merge of the two lists otherwise. Unions merge the two lists
+    with a stable sort, and differences mask out the document IDs found by searching listB.
+    Merges where both lists are short are left to the scalar merges of BooleanEval, as the fixed cost
+    of a numpy call outweighs the gain on a few postings.
+    '''
+
+    def __init__(self, postings, scalar_threshold=256, gallop_ratio=16):
+        '''
+        :param postings: the PostingsStore serving the postings lists of the index.
+        :param scalar_threshold: merges of lists with fewer postings than this in total use the scalar merges.
+        :param gallop_ratio: intersections where the longer list is at least this many times longer than
+        the shorter list use the galloping search.
+        '''
+        if numpy is None:
+            raise ImportError("the numpy engine requires numpy to be installed")
+        BooleanEval.__init__(self, postings)
+        self.scalar_threshold = scalar_threshold
+        self.gallop_ratio = gallop_ratio
+
+    def AND_arrays(self, listA, listB):
+        '''
+        Returns the intersection of listA and listB, both of which are arrays of document IDs.
+        '''
+        if len(listA) > len(listB):
+            listA, listB = listB, listA
+        if not listA:
+            return new_postings_list()
+        if len(listA) + len(listB) < self.scalar_threshold:
+            return BooleanEval.AND_arrays(self, listA, listB)
+        shorter = to_numpy(listA)
+        longer = to_numpy(listB)
+        if len(listA) * self.gallop_ratio <= len(listB):
+            indices = numpy.searchsorted(longer, shorter)
+            indices[indices == len(longer)] = 0
+            return from_numpy(shorter[longer[indices] == shorter])
+        return from_numpy(numpy.intersect1d(shorter, longer, assume_unique=True))
+
+    def OR_arrays(self, listA, listB):
+        '''
+        Returns the union of listA and listB, both of which are arrays of document IDs.
+        '''
+        if not listA or not listB:
+            return new_postings_list() + (listA or listB)
+        if len(listA) + len(listB) < self.scalar_threshold:
+            return BooleanEval.OR_arrays(self, listA, listB)
+        merged = numpy.concatenate((to_numpy(listA), to_numpy(listB)))
+        merged.sort(kind="stable")
+        keep = numpy.empty(len(merged), dtype=bool)
+        keep[0] = True
+        numpy.not_equal(merged[1:], merged[:-1], out=keep[1:])
+        return from_numpy(merged[keep])
+
+    def ANDNOT_arrays(self, listA, listB):
+        '''
+        Returns a list of all document IDs which are in listA but not in listB, both of which are arrays of document IDs.
+        '''
+        if not listA or not listB:
+            return new_postings_list() + listA
+        if len(listA) + len(listB) < self.scalar_threshold:
+            return BooleanEval.ANDNOT_arrays(self, listA, listB)
+        positive = to_numpy(listA)
+        negative = to_numpy(listB)
+        indices = numpy.searchsorted(negative, positive)
+        indices[indices == len(negative)] = 0
+        return from_numpy(positive[negative[indices] != positive])
+
+    def OR_many_arrays(self, lists):
+        '''
+        Returns the union of 2 or more arrays of document IDs, with a single numpy.unique of their concatenation.
+        '''
+        if sum(map(len, lists)) < self.scalar_threshold:
+            return BooleanEval.OR_many_arrays(self, lists)
+        return from_numpy(numpy.unique(numpy.concatenate([to_numpy(postings_list) for postings_list in lists])))
+
+    def AND_many_arrays(self, lists):
+        '''
+        Returns the intersection of 2 or more arrays of document IDs, intersecting the vectorized pairwise merges from
+        the shortest array, which stops as soon as the intersection is empty.
+        '''
+        lists = sorted(lists, key=len)
+        if len(lists[0]) * len(lists) < self.scalar_threshold:
+            return BooleanEval.AND_many_arrays(self, lists)
+        result = lists[0]
+        for postings_list in lists[1:]:
+            if not result:
+                break
+            result = self.AND_arrays(result, postings_list)
+        return result
+
+    def ANDNOT_many_arrays(self, listA, negatives):
+        '''
+        Returns the document IDs of listA which are in none of the negatives, with a vectorized difference from each
+        negative array in turn.
+        '''
+        result = listA
+        for postings_list in negatives:
+            if not result:
+                break
+            result = self.ANDNOT_arrays(result, postings_list)
         return result
+
+def to_numpy(postings_list):
+    '''
+    Returns a numpy view of a postings list array without copying it.
+    '''
+    return numpy.frombuffer(postings_list, dtype=numpy.uint32)
+
+def from_numpy(docIDs):
+    '''
+    Converts a numpy array of document IDs back into a postings list.
+    '''
+    result = new_postings_list()
+    result.frombytes(docIDs.astype(numpy.uint32, copy=False).tobytes())
+    return result
+
+ENGINES = {"scalar": BooleanEval, "numpy": NumpyBooleanEval}
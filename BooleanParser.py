@@ -1,18 +1,23 @@
-from nltk.stem.porter import PorterStemmer
-from BooleanEval import *
+from TokenNormaliser import normalise_token
+from array import array
+from itertools import islice
+from PostingsFormat import DOCID_TYPECODE
+from QueryPlanner import QueryPlanner, postfix_to_tree
+from WildcardIndex import is_wildcard
 
-def normalise_token(token):
+def normalise_operand(word):
     '''
-    Uses the nltk PorterStemmer to stem the token and case folds token to lowercase.
+    Normalises an operand of a query: a term is normalised as the terms of the documents are, and a wildcard pattern
+    (see WildcardIndex.py) is only case folded, since the terms it matches are already stemmed.
     '''
-    token = token.lower()
-    stemmer = PorterStemmer()
-    token = stemmer.stem(token)
-    return token
+    if is_wildcard(word):
+        return word.lower()
+    return normalise_token(word)
 
 def tokenise_query_to_list(string):
     '''
     Tokenises a boolean query from a string to a list, recognising the operators "AND", "OR", "NOT", "(" and ")"
+    The operands are normalised by normalise_operand, which keeps wildcard patterns such as oil* unstemmed.
     :param string: the query as a string
     :return: a list of operands and operators in a list (infix notation)
     '''
@@ -23,7 +28,7 @@ def tokenise_query_to_list(string):
             list.append(word)
         elif word[0] == "(" and word[-1] == ")":
             list.append("(")
-            list.append(normalise_token(word[1:-1]))
+            list.append(normalise_operand(word[1:-1]))
             list.append(")")
         elif word[0] == "(":
             list.append("(")
@@ -31,25 +36,34 @@ def tokenise_query_to_list(string):
             if term in ["AND", "OR", "NOT"]:
                 list.append(term)
             else:
-                list.append(normalise_token(term))
+                list.append(normalise_operand(term))
         elif word[-1] == ")":
             term = word[:-1]
             if term in ["AND", "OR", "NOT"]:
                 list.append(term)
             else:
-                list.append(normalise_token(term))
+                list.append(normalise_operand(term))
             list.append(")")
         else:
-            list.append(normalise_token(word))
+            list.append(normalise_operand(word))
     return list
 
+def query_terms(string):
+    '''
+    Returns the normalised terms of a boolean query, without its operators, in the order in which they occur.
+    '''
+    return [term for term in tokenise_query_to_list(string) if term not in ["AND", "OR", "NOT", "(", ")"]]
+
 def infix_to_postfix(infix_exp):
     '''
     Converts a infix expression to postfix expression using a modification of the Shunting-Yard algorithm
     In particular, a pair of adjacent "NOT"s is eliminated, "ANDNOT" followed by "NOT" is converted to "AND".
     Furthermore, X AND NOT Y is converted to X Y ANDNOT, and NOT X AND Y is converted to X Y NOTAND.
+    A "NOT" following a "NOTAND" negates the left operand of the NOTAND straight away, so that NOT X AND NOT Y
+    becomes X NOT Y ANDNOT.
     :param infix_exp: A boolean query in infix notation
     :return: A boolean query in postfix notation, as a list
+    Raises a ValueError if the parentheses are unbalanced.
     '''
     stack = []
     postfix = []
@@ -58,19 +72,26 @@ def infix_to_postfix(infix_exp):
         if term == "(":
             stack.append(term)
         elif term == ")":
-            while stack[-1] != "(":
+            while stack and stack[-1] != "(":
                 postfix.append(stack.pop())
+            if not stack:
+                raise ValueError("unbalanced parentheses")
             stack.pop()
         elif term in ["AND", "OR", "NOT"]:
             if term == "NOT" and stack:
                 if stack[-1] == "NOT":
                     stack.pop()
+                    continue
                 elif stack[-1] == "AND":
                     stack.pop()
                     term = "ANDNOT"
                 elif stack[-1] == "ANDNOT":
                     stack.pop()
                     term = "AND"
+                elif stack[-1] == "NOTAND":
+                    stack.pop()
+                    postfix.append("NOT")
+                    term = "ANDNOT"
             elif term == "AND" and stack:
                 if stack[-1] == "NOT":
                     stack.pop()
@@ -81,101 +102,77 @@ def infix_to_postfix(infix_exp):
         else:
             postfix.append(term)
     while stack:
+        if stack[-1] == "(":
+            raise ValueError("unbalanced parentheses")
         postfix.append(stack.pop())
     return postfix
 
-def evaluate_query(query, dictionary):
-    '''
-    Converts boolean query into a postfix expression, then uses a stack to evaluate the postfix expression.
-    In order to do query optimisation such that in a sequence of terms that are related by OR or AND,
-    for example X OR Y OR Z, or X AND Y AND Z, the term with the smaller postings list is merged first,
-    I maintain an auxiliary op_stack and temp list. For example, in a postfix sequence X Y OR Z OR A AND, [X,Y,Z]
-    will be accumulated in the stack while [OR, OR] will be in the op_stack. A will be inserted into a temp list,
-    and then since AND is different from the operators in the op_stack, the op_stack will be clearly such that
-    X Y OR Z OR is evaluated. (See Additional Details.pdf for detailed trace of various cases)
+def parse_query(query):
+    '''
+    Parses a boolean query into a postfix expression, which may be evaluated in place of the query, e.g. by the shards
+    of a sharded index, to which the coordinator sends the queries it has parsed (see ShardedIndex.py).
+    Raises a ValueError if the parentheses are unbalanced.
+    '''
+    return infix_to_postfix(tokenise_query_to_list(query))
+
+def plan_query(query, planner):
+    '''
+    Converts boolean query into a postfix expression and then into a canonical expression tree (see postfix_to_tree),
+    which the QueryPlanner rewrites into an execution plan based on the document frequencies of the terms.
+    The query may also be given already parsed, as a postfix expression list from parse_query.
+    The end of each stage is reported to the Tracer of the evaluator, if any.
+    '''
+    tracer = planner.evaluator.tracer
+    if tracer is None:
+        postfix = parse_query(query) if isinstance(query, str) else query
+        return planner.plan(postfix_to_tree(postfix))
+    if isinstance(query, str):
+        tokens = tokenise_query_to_list(query)
+        tracer.lap("tokenise")
+        postfix = infix_to_postfix(tokens)
+        tracer.lap("postfix")
+    else:
+        postfix = query
+    tree = postfix_to_tree(postfix)
+    tracer.lap("tree")
+    plan = planner.plan(tree)
+    tracer.lap("plan")
+    return plan
+
+def evaluate_query(query, evaluator, cache=None, limit=None):
+    '''
+    Evaluates a boolean query with the execution plan of the QueryPlanner (see QueryPlanner.py), using the merge
+    methods of the evaluator. If a limit is given, only the first limit document IDs of the result are computed,
+    with the lazy iterators of PostingsIterator.py.
 
     :param query: original infix boolean query as a string
-    :param dictionary: index dictionary with term frequency and pointers to postings lists
-    :return: evaluated boolean query in a (freq, postings) tuple
+    :param evaluator: the BooleanEval object, shared across queries
+    :param cache: the ResultCache shared across queries, if any
+    :param limit: the maximum number of document IDs to return, or None for all of them
+    :return: the evaluated boolean query as an array of document IDs
     '''
-    postfix_query = infix_to_postfix(tokenise_query_to_list(query))
-    evaluator = BooleanEval(dictionary)
-    stack = []
-    op_stack = []
-    temp = []
-    operators = ["AND", "NOT", "OR", "ANDNOT", "NOTAND"]
-    while postfix_query:
-        term = postfix_query.pop(0)
-        # if the operator differs from the operators in the op_stack or temp list has more than 1 item,
-        # combine the accumulated terms, then transfer the items in the temp list to the stack
-        if op_stack and term in operators:
-            if op_stack[-1] == "OR" and (term > "OR" or len(temp) > 1):
-                combine_ORs(stack, op_stack, evaluator)
-            elif op_stack[-1] == "AND" and (term != "AND" or len(temp) != 1):
-                combine_ANDS(stack, op_stack, evaluator)
-            while temp:
-                stack.append(temp.pop(0))
-        if term == "NOT":
-            stack.append(evaluator.NOT(stack.pop()))
-        elif term in ["OR", "AND"]:
-            # accumulate "AND" and "OR" operators in the op_stack until a different operator is found
-            op_stack.append(term)
-        elif term == "ANDNOT":
-            # breaks up "ANDNOT", creating a NOT_element from the top element which is inserted back into the stack,
-            # then pushes "AND" into the op_stack
-            not_term = NOT_term(stack.pop())
-            stack.append(not_term)
-            op_stack.append("AND")
-        elif term == "NOTAND":
-            # breaks up "NOTAND", creating a NOT_element from the second last element,
-            # then pushes "AND" into the op_stack
-            # this is possible since NOTAND forces the operators in the op_stack to evaluate
-            stack[-2] = NOT_term(stack[-2])
-            op_stack.append("AND")
-        else:
-            if op_stack:
-                temp.append(term)
-            else:
-                stack.append(term)
-    # clear remaining operators in the op_stack
-    if op_stack:
-        if op_stack[-1] == "OR":
-            combine_ORs(stack, op_stack, evaluator)
-        elif op_stack[-1] == "AND":
-            combine_ANDS(stack, op_stack, evaluator)
-    # evaluate a single term query without operators
-    if isinstance(stack[0], str):
-        stack[0] = evaluator.eval_single_term(stack[0])
-    result = stack[0][1]
+    planner = QueryPlanner(evaluator)
+    plan = plan_query(query, planner)
+    if limit is not None:
+        result = array(DOCID_TYPECODE, islice(planner.iterate(plan, cache), limit))
+    else:
+        result = evaluator.to_array(planner.execute(plan, cache)[1])
+    if evaluator.tracer is not None:
+        evaluator.tracer.lap("execute")
     return result
 
-def combine_ORs(stack, op_stack, evaluator):
-    '''
-    Evaluates the union of n+1 terms on the top of the stack if there are n "OR"s accumulated in the op_stack.
-    :param stack: stores the operands
-    :param op_stack: stores the accumulated "OR" operators
-    :param evaluator: the BooleanEval object
-    '''
-    or_list = []
-    while op_stack:
-        or_list.append(stack.pop())
-        op_stack.pop()
-    or_list.append(stack.pop())
-    result = evaluator.OR_lists(or_list)
-    stack.append(result)
+def count_query(query, evaluator, cache=None):
+    '''
+    Returns the number of document IDs matching a boolean query, without converting the result into an array.
+    '''
+    planner = QueryPlanner(evaluator)
+    count = len(planner.execute(plan_query(query, planner), cache)[1])
+    if evaluator.tracer is not None:
+        evaluator.tracer.lap("execute")
+    return count
 
-def combine_ANDS(stack, op_stack, evaluator):
-    '''
-    Evaluates the intersection of n+1 terms on the top of the stack if there are n "AND"s accumulated in the op_stack.
-    Calls the eval.AND_and_ANDNOT_lists method to intersect positive and negative "NOT" terms, stored as NOT_terms.
-    :param stack: stores the operands
-    :param op_stack: stores the accumulated "AND" operators
-    :param evaluator: the BooleanEval object
-    '''
-    and_list = []
-    while op_stack:
-        and_list.append(stack.pop())
-        op_stack.pop()
-    and_list.append(stack.pop())
-    result = evaluator.AND_and_ANDNOT_lists(and_list)
-    stack.append(result)
\ No newline at end of file
+def explain_query(query, evaluator):
+    '''
+    Returns the execution plan of a boolean query as indented lines of text (see PlanNode.explain).
+    '''
+    return plan_query(query, QueryPlanner(evaluator)).explain()
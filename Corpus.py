@@ -0,0 +1,233 @@
+'''
+Input adapters of index.py, which read the documents of a collection as a stream of (docID, text) tuples in a
+single sequential pass. The collection given by index.py -i is read in one of the FORMATS, given by -f or guessed
+from the path (see corpus_format):
+    dir         a directory with one file per document, named by its integer document ID, which is read in order
+                of document IDs
+    tar         a tar archive, optionally compressed with gzip, bzip2 or xz, with one member per document, named by
+                its integer document ID (the directories of the member names are ignored), which is read as a
+                stream in the order of the archive, without seeking
+    jsonl       a file of JSON objects, one per line, with the integer document ID in the DOCID_FIELD and the text
+                in the TEXT_FIELD of each object
+    records     a file of concatenated records, each of which is a header line "<docID> <length>", the length
+                being the number of bytes of the text, followed by the text, e.g. "7 5\\nhello"
+The jsonl and records files may be compressed with gzip, which is found from the first bytes of the file. The
+files and archives are read with buffers of READ_BUFFER_SIZE bytes, so that a collection of many small documents
+costs a few large reads rather than an open and a read for each document. The text of the documents is decoded as
+UTF-8 with the line endings of python text files, so that every format gives the same terms as a directory.
+
+The documents of the streamed formats may be in any order of document IDs, but a document ID must not be repeated.
+Errors in the input are raised as ValueErrors.
+'''
+import os
+import io
+import gzip
+import json
+import queue
+import tarfile
+import threading
+from contextlib import contextmanager
+from itertools import islice
+
+FORMATS = ["dir", "tar", "jsonl", "records"]
+TAR_SUFFIXES = (".tar", ".tar.gz", ".tgz", ".tar.bz2", ".tbz2", ".tar.xz", ".txz")
+JSONL_SUFFIXES = (".jsonl", ".jsonl.gz", ".json", ".json.gz")
+DOCID_FIELD = "id"
+TEXT_FIELD = "text"
+GZIP_MAGIC = b"\x1f\x8b"
+READ_BUFFER_SIZE = 1024 * 1024
+PIPELINE_CHUNK_SIZE = 64 # number of documents in each chunk passed from the reader to the consumer
+PIPELINE_QUEUE_SIZE = 16 # maximum number of chunks read ahead of the consumer
+
+def corpus_format(path):
+    '''
+    Guesses the format of a collection from its path: a directory, a tar archive or a jsonl file by their suffixes,
+    or else a records file.
+    '''
+    if os.path.isdir(path):
+        return "dir"
+    name = path.lower()
+    if name.endswith(TAR_SUFFIXES):
+        return "tar"
+    if name.endswith(JSONL_SUFFIXES):
+        return "jsonl"
+    return "records"
+
+def open_corpus(path, format=None):
+    '''
+    Returns the input adapter of a collection in the given format, or in the format guessed from its path.
+    '''
+    format = format or corpus_format(path)
+    if format == "dir":
+        return DirectoryCorpus(path)
+    if format == "tar":
+        return TarCorpus(path)
+    if format == "jsonl":
+        return JsonlCorpus(path)
+    if format == "records":
+        return RecordsCorpus(path)
+    raise ValueError("unsupported input format " + str(format))
+
+def translate_newlines(text):
+    '''
+    Translates the line endings of a text as a python text file does.
+    '''
+    if "\r" in text:
+        text = text.replace("\r\n", "\n").replace("\r", "\n")
+    return text
+
+def decode(data):
+    return translate_newlines(data.decode("utf-8"))
+
+def parse_docID(value, source):
+    '''
+    Returns the integer document ID of a document, given as a number or a string in the input.
+    '''
+    try:
+        docID = int(value)
+    except (TypeError, ValueError):
+        raise ValueError("invalid document ID " + repr(value) + " in " + source)
+    if docID < 0:
+        raise ValueError("invalid document ID " + repr(value) + " in " + source)
+    return docID
+
+@contextmanager
+def open_stream(path):
+    '''
+    Opens a file for sequential reading with a large buffer, decompressing it if it is compressed with gzip.
+    '''
+    with io.open(path, "rb", buffering=READ_BUFFER_SIZE) as file:
+        if file.peek(len(GZIP_MAGIC))[:len(GZIP_MAGIC)] == GZIP_MAGIC:
+            with io.BufferedReader(gzip.GzipFile(fileobj=file), buffer_size=READ_BUFFER_SIZE) as stream:
+                yield stream
+        else:
+            yield file
+
+class DirectoryCorpus:
+    '''
+    A directory with one file per document, named by its document ID.
+    '''
+
+    def __init__(self, path):
+        self.path = path
+        self.files = os.listdir(path)
+        self.files.sort(key=lambda fileID: parse_docID(fileID, os.path.join(path, fileID)))
+
+    def __len__(self):
+        return len(self.files)
+
+    def documents(self):
+        for fileID in self.files:
+            with io.open(os.path.join(self.path, fileID), mode="r", encoding="utf-8") as file:
+                text = file.read()
+            yield (int(fileID), text)
+
+class TarCorpus:
+    '''
+    A tar archive with one member per document, read as a stream.
+    '''
+
+    def __init__(self, path):
+        self.path = path
+
+    def documents(self):
+        # tarfile copies its whole stream buffer on every read, so the buffer is left small, and the large reads are
+        # done by the file under it
+        with io.open(self.path, "rb", buffering=READ_BUFFER_SIZE) as file, \
+                tarfile.open(fileobj=file, mode="r|*") as archive:
+            for member in archive:
+                if not member.isfile():
+                    continue
+                docID = parse_docID(os.path.basename(member.name), self.path + ": " + member.name)
+                yield (docID, decode(archive.extractfile(member).read()))
+
+class JsonlCorpus:
+    '''
+    A file of JSON objects, one document per line.
+    '''
+
+    def __init__(self, path):
+        self.path = path
+
+    def documents(self):
+        with open_stream(self.path) as file:
+            for line_number, line in enumerate(file, 1):
+                if not line.strip():
+                    continue
+                source = self.path + " line " + str(line_number)
+                try:
+                    document = json.loads(line)
+                except ValueError:
+                    raise ValueError("invalid JSON in " + source)
+                if not isinstance(document, dict) or DOCID_FIELD not in document \
+                        or not isinstance(document.get(TEXT_FIELD), str):
+                    raise ValueError("missing " + DOCID_FIELD + " or " + TEXT_FIELD + " in " + source)
+                yield (parse_docID(document[DOCID_FIELD], source), translate_newlines(document[TEXT_FIELD]))
+
+class RecordsCorpus:
+    '''
+    A file of concatenated records, each a "<docID> <length>" header line followed by length bytes of text. Blank
+    lines between the records are ignored.
+    '''
+
+    def __init__(self, path):
+        self.path = path
+
+    def documents(self):
+        with open_stream(self.path) as file:
+            while True:
+                header = file.readline()
+                if not header:
+                    return
+                if not header.strip():
+                    continue
+                fields = header.split()
+                if len(fields) != 2:
+                    raise ValueError("invalid record header " + repr(header[:80]) + " in " + self.path)
+                docID = parse_docID(fields[0], self.path)
+                if not fields[1].isdigit():
+                    raise ValueError("invalid record length " + repr(fields[1]) + " in " + self.path)
+                length = int(fields[1])
+                data = file.read(length)
+                if len(data) < length:
+                    raise ValueError("truncated record of document " + str(docID) + " in " + self.path)
+                yield (docID, decode(data))
+
+def pipeline(documents, chunk_size=PIPELINE_CHUNK_SIZE, queue_size=PIPELINE_QUEUE_SIZE):
+    '''
+    Reads an iterator of documents in a producer thread, which passes them in chunks through a bounded queue to the
+    consumer of the returned iterator, so that the input is read and decompressed while the documents before it are
+    being tokenised, and at most queue_size chunks are held in memory. An error of the producer is raised again in
+    the consumer.
+    '''
+    chunks = queue.Queue(queue_size)
+    stopped = threading.Event()
+
+    def produce():
+        try:
+            while not stopped.is_set():
+                chunk = list(islice(documents, chunk_size))
+                if not chunk:
+                    break
+                chunks.put(chunk)
+            chunks.put(None)
+        except BaseException as error:
+            chunks.put(error)
+
+    producer = threading.Thread(target=produce, daemon=True)
+    producer.start()
+    try:
+        while True:
+            chunk = chunks.get()
+            if chunk is None:
+                break
+            if isinstance(chunk, BaseException):
+                raise chunk
+            yield from chunk
+    finally:
+        stopped.set()
+        while producer.is_alive():
+            try:
+                chunks.get(timeout=0.1)
+            except queue.Empty:
+                pass
@@ -0,0 +1,237 @@
+'''
+Dictionary files. A dictionary maps each term to a (frequency, term_pointer) tuple, where term_pointer is the
+byte address of the postings list of the term in the postings file.
+
+Dictionaries are written in a binary format (version 1), which is memory-mapped and searched in place by
+BinaryDictionary, so that opening it costs no parsing and no python objects per term. The file is laid out as:
+    header          magic string, format version, pointer width, number of terms, terms per block and number of
+                    blocks
+    pointers        uint32 array, or uint64 array for postings files over 4GB, the postings pointer of each term
+    block offsets   array of the same width, the byte address of each block in the term blob, relative to the blob
+    frequencies     uint32 array, the document frequency of each term
+    term blob       the terms, sorted by their utf-8 bytes and front coded in blocks of block_size terms
+In each block, the first term is stored in full as a varint length followed by its utf-8 bytes, and every other
+term as the varint length of the prefix it shares with the previous term, followed by the varint length and the
+bytes of the rest of the term. A term is looked up by a binary search on the first terms of the blocks, followed
+by a scan of at most block_size terms, and its position gives its frequency and pointer in the arrays.
+
+Dictionaries in the older text format, one "term frequency pointer" line per term, are still read into
+a python dict by read_dictionary.
+'''
+import mmap
+import struct
+from array import array
+from PostingsFormat import encode_varint, decode_varint, WIDTH_TYPECODES, BIG_ENDIAN
+
+MAGIC = b"BRDICT"
+VERSION = 1
+HEADER_FORMAT = "<6sBBIII4x"
+HEADER_SIZE = struct.calcsize(HEADER_FORMAT)
+DEFAULT_BLOCK_SIZE = 16
+POINTER_TYPECODES = {4: WIDTH_TYPECODES[4], 8: array("Q").typecode}
+FREQ_TYPECODE = WIDTH_TYPECODES[4]
+
+def read_dictionary(dictionary_file):
+    '''
+    Opens a dictionary file. Returns a BinaryDictionary for a binary dictionary, or reads a text dictionary file
+    into a dictionary mapping each term to a (frequency, term_pointer) tuple.
+    '''
+    with open(dictionary_file, "rb") as file:
+        binary = file.read(len(MAGIC)) == MAGIC
+    if binary:
+        return BinaryDictionary(dictionary_file)
+    dictionary = {}
+    file = open(dictionary_file, "r")
+    for line in file:
+        line = line[:-1]
+        entry = line.split()
+        word = entry[0]
+        freq = int(entry[1])
+        pointer = int(entry[2])
+        dictionary[word] = (freq, pointer)
+    file.close()
+    return dictionary
+
+def write_dictionary(dictionary, dictionary_file, block_size=DEFAULT_BLOCK_SIZE):
+    '''
+    Writes the dictionary to the dictionary file in the binary dictionary format.
+    :param dictionary: a dictionary mapping each term to a (frequency, term_pointer) tuple.
+    '''
+    terms = sorted((term.encode("utf-8"), term) for term in dictionary)
+    pointers = array(POINTER_TYPECODES[8])
+    freqs = array(FREQ_TYPECODE)
+    block_offsets = array(POINTER_TYPECODES[8])
+    blob = bytearray()
+    previous = b""
+    for index, (term_bytes, term) in enumerate(terms):
+        freq, pointer = dictionary[term]
+        freqs.append(freq)
+        pointers.append(pointer)
+        if index % block_size == 0:
+            block_offsets.append(len(blob))
+            encode_varint(len(term_bytes), blob)
+            blob += term_bytes
+        else:
+            shared = 0
+            limit = min(len(previous), len(term_bytes))
+            while shared < limit and previous[shared] == term_bytes[shared]:
+                shared += 1
+            encode_varint(shared, blob)
+            encode_varint(len(term_bytes) - shared, blob)
+            blob += term_bytes[shared:]
+        previous = term_bytes
+    width = 4 if max(pointers, default=0) < 1 << 32 and len(blob) < 1 << 32 else 8
+    if width == 4:
+        pointers = array(POINTER_TYPECODES[4], pointers)
+        block_offsets = array(POINTER_TYPECODES[4], block_offsets)
+    if BIG_ENDIAN:
+        for values in [pointers, block_offsets, freqs]:
+            values.byteswap()
+    with open(dictionary_file, "wb") as file:
+        file.write(struct.pack(HEADER_FORMAT, MAGIC, VERSION, width, len(terms), block_size,
+                                len(block_offsets)))
+        file.write(pointers.tobytes())
+        file.write(block_offsets.tobytes())
+        file.write(freqs.tobytes())
+        file.write(blob)
+
+class BinaryDictionary:
+    '''
+    A read-only mapping from each term to a (frequency, term_pointer) tuple over a memory-mapped binary dictionary
+    file. Only the terms which are looked up are decoded.
+    '''
+
+    def __init__(self, dictionary_file):
+        self.file = open(dictionary_file, "rb")
+        self.buffer = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        self.view = memoryview(self.buffer)
+        header = struct.unpack(HEADER_FORMAT, self.view[:HEADER_SIZE])
+        magic, version, width, self.length, self.block_size, self.blocks = header
+        if magic != MAGIC or version != VERSION or width not in POINTER_TYPECODES:
+            raise ValueError("unsupported dictionary format")
+        offset = HEADER_SIZE
+        self.pointers = self.view_array(offset, POINTER_TYPECODES[width], self.length)
+        offset += width * self.length
+        self.block_offsets = self.view_array(offset, POINTER_TYPECODES[width], self.blocks)
+        offset += width * self.blocks
+        self.freqs = self.view_array(offset, FREQ_TYPECODE, self.length)
+        offset += 4 * self.length
+        self.blob = offset
+
+    def view_array(self, offset, typecode, length):
+        '''
+        Returns the array of length values of the typecode at offset, as a view of the mapping if possible.
+        '''
+        itemsize = array(typecode).itemsize
+        values = self.view[offset:offset + itemsize * length]
+        if not BIG_ENDIAN:
+            return values.cast(typecode)
+        values = array(typecode, bytes(values))
+        values.byteswap()
+        return values
+
+    def first_term(self, block):
+        '''
+        Returns the utf-8 bytes of the first term of a block.
+        '''
+        length, offset = decode_varint(self.view, self.blob + self.block_offsets[block])
+        return bytes(self.view[offset:offset + length])
+
+    def block_terms(self, block):
+        '''
+        Returns an iterator over the utf-8 bytes of the terms of a block.
+        '''
+        view = self.view
+        length, offset = decode_varint(view, self.blob + self.block_offsets[block])
+        term = bytes(view[offset:offset + length])
+        offset += length
+        yield term
+        for _ in range(min(self.block_size, self.length - block * self.block_size) - 1):
+            shared, offset = decode_varint(view, offset)
+            length, offset = decode_varint(view, offset)
+            term = term[:shared] + bytes(view[offset:offset + length])
+            offset += length
+            yield term
+
+    def find_block(self, term_bytes):
+        '''
+        Returns the last block whose first term is at most term_bytes, by a binary search on the first terms of the
+        blocks, or -1 if term_bytes is before the first term of the dictionary.
+        '''
+        low, high = 0, self.blocks - 1
+        if high < 0 or term_bytes < self.first_term(0):
+            return -1
+        while low < high:
+            middle = (low + high + 1) // 2
+            if self.first_term(middle) <= term_bytes:
+                low = middle
+            else:
+                high = middle - 1
+        return low
+
+    def find(self, term):
+        '''
+        Returns the position of a term in the dictionary, or -1 if the term is not in the dictionary.
+        '''
+        term_bytes = term.encode("utf-8")
+        low = self.find_block(term_bytes)
+        if low == -1:
+            return -1
+        for index, block_term in enumerate(self.block_terms(low)):
+            if block_term == term_bytes:
+                return low * self.block_size + index
+            if block_term > term_bytes:
+                break
+        return -1
+
+    def terms_from(self, term):
+        '''
+        Returns an iterator over the terms of the dictionary from term, in sorted order, which starts at the block of
+        term, so that a range of terms, e.g. the terms with a prefix, is read without scanning the dictionary.
+        '''
+        term_bytes = term.encode("utf-8")
+        for block in range(max(0, self.find_block(term_bytes)), self.blocks):
+            for block_term in self.block_terms(block):
+                if block_term >= term_bytes:
+                    yield block_term.decode("utf-8")
+
+    def get(self, term, default=None):
+        index = self.find(term)
+        if index == -1:
+            return default
+        return (self.freqs[index], self.pointers[index])
+
+    def __getitem__(self, term):
+        entry = self.get(term)
+        if entry is None:
+            raise KeyError(term)
+        return entry
+
+    def __contains__(self, term):
+        return self.find(term) != -1
+
+    def __len__(self):
+        return self.length
+
+    def __iter__(self):
+        for block in range(self.blocks):
+            for term in self.block_terms(block):
+                yield term.decode("utf-8")
+
+    def keys(self):
+        return iter(self)
+
+    def items(self):
+        for index, term in enumerate(self):
+            yield (term, (self.freqs[index], self.pointers[index]))
+
+    def close(self):
+        '''
+        Releases the memory mapping and closes the dictionary file.
+        '''
+        for values in [self.pointers, self.block_offsets, self.freqs]:
+            if isinstance(values, memoryview):
+                values.release()
+        self.view.release()
+        self.buffer.close()
+        self.file.close()
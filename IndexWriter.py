@@ -0,0 +1,51 @@
+from Dictionary import write_dictionary
+from PostingsFormat import encode_header, encode_postings, encode_bitmap, DEFAULT_BLOCK_SIZE
+
+class IndexWriter:
+    '''
+    Writes an index to a postings file and a dictionary file. The postings file header and the postings list of
+    all the documents in the collection are written first, followed by the postings list of each term as it is
+    added. The postings lists of terms with a document frequency of at least the bitmap threshold are encoded
+    as bitmaps. The dictionary, which maps each term to its frequency and the byte address of its postings list,
+    is written when the writer is closed.
+    '''
+
+    def __init__(self, dictionary_file, postings_file, all_docIDs, bitmap_threshold=None, block_size=DEFAULT_BLOCK_SIZE):
+        '''
+        :param all_docIDs: a sorted list of all the integer document IDs in the collection.
+        :param bitmap_threshold: the frequency from which postings lists are encoded as bitmaps, by default
+        an eighth of the largest docID, from which a bitmap is smaller than a list of one byte gaps.
+        :param block_size: the number of postings in each block of a list, i.e. the interval between the entries of
+        its skip table. Smaller blocks make skewed intersections decode fewer postings, and larger blocks make the
+        skip tables smaller.
+        '''
+        if bitmap_threshold is None:
+            bitmap_threshold = max(1, all_docIDs[-1] // 8 if all_docIDs else 1)
+        self.dictionary_file = dictionary_file
+        self.bitmap_threshold = bitmap_threshold
+        self.block_size = block_size
+        self.dictionary = {}
+        self.postings_file = open(postings_file, "wb")
+        self.postings_file.write(encode_header(block_size))
+        self.postings_file.write(encode_postings(all_docIDs, block_size))
+
+    def add(self, term, docIDs):
+        '''
+        Writes the postings list of a term.
+        :param docIDs: a sorted list of integer document IDs.
+        '''
+        start_byte = self.postings_file.tell()
+        if len(docIDs) >= self.bitmap_threshold:
+            self.postings_file.write(encode_bitmap(docIDs))
+        else:
+            self.postings_file.write(encode_postings(docIDs, self.block_size))
+        self.dictionary[term] = (len(docIDs), start_byte)
+
+    def close(self):
+        '''
+        Closes the postings file and writes the dictionary file.
+        :return: the dictionary mapping each term to a (frequency, term_pointer) tuple.
+        '''
+        self.postings_file.close()
+        write_dictionary(self.dictionary, self.dictionary_file)
+        return self.dictionary
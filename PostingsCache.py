@@ -0,0 +1,199 @@
+from collections import OrderedDict, Counter
+from Bitmap import Bitmap
+from BooleanParser import query_terms
+
+DEFAULT_CACHE_SIZE = 64 * 1024 * 1024
+
+def postings_size(postings_list):
+    '''
+    Returns the approximate number of bytes held by a decoded postings list. A Bitmap is counted twice, since it
+    may hold both its int and its bytes form.
+    '''
+    if isinstance(postings_list, Bitmap):
+        return 2 * len(postings_list.data)
+    return len(postings_list) * postings_list.itemsize
+
+class PostingsCache:
+    '''
+    The PostingsCache class keeps the most recently used decoded postings lists of an index in memory, up to a
+    budget of bytes, in front of a PostingsStore or SegmentedIndex, with the same methods. Since the query terms follow
+    a Zipfian distribution, a few frequent terms account for most of the lookups, and their lists are then decoded
+    only once. The least recently used lists are evicted when the budget is exceeded. The list of all the document IDs,
+    which every NOT needs, is pinned in the cache and never evicted. The numbers of hits, misses and evictions are
+    counted, and the cache can be warmed up with the most frequent terms of a log of queries.
+    A single PostingsCache is meant to be shared by all the queries evaluated by a process.
+    '''
+
+    def __init__(self, postings, max_bytes=DEFAULT_CACHE_SIZE):
+        '''
+        :param postings: the PostingsStore or SegmentedIndex serving the postings lists of the index.
+        :param max_bytes: the maximum number of bytes of postings lists kept in the cache, besides the pinned universe.
+        '''
+        self.postings = postings
+        self.max_bytes = max_bytes
+        self.cache = OrderedDict()
+        self.bytes = 0
+        self.universe = None
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __contains__(self, term):
+        return term in self.cache or term in self.postings
+
+    def freq(self, term):
+        '''
+        Returns the document frequency of a term, or 0 if the term is not in the dictionary.
+        '''
+        if term in self.cache:
+            return self.cache[term][0]
+        return self.postings.freq(term)
+
+    def get(self, term):
+        '''
+        Returns the postings list of a term, from the cache if possible. A list read from the index is added to the
+        cache, evicting the least recently used lists if the cache exceeds its budget.
+        '''
+        cache = self.cache
+        if term in cache:
+            self.hits += 1
+            cache.move_to_end(term)
+            return cache[term][1]
+        self.misses += 1
+        postings_list = self.postings.get(term)
+        self.add(term, self.postings.freq(term), postings_list)
+        return postings_list
+
+    def skip_list(self, term):
+        '''
+        Returns the postings list of a term as a SkipList from the index (see PostingsStore.skip_list), or None if the
+        list is in the cache, in which case the decoded list is cheaper to use. A SkipList is not cached.
+        '''
+        if term in self.cache:
+            return None
+        return self.postings.skip_list(term)
+
+    def add(self, term, freq, postings_list):
+        '''
+        Adds the postings list of a term to the cache, unless it is larger than the whole budget.
+        '''
+        size = postings_size(postings_list)
+        if size > self.max_bytes:
+            return
+        self.cache[term] = (freq, postings_list, size)
+        self.bytes += size
+        while self.bytes > self.max_bytes:
+            self.bytes -= self.cache.popitem(last=False)[1][2]
+            self.evictions += 1
+
+    def all_docIDs(self):
+        '''
+        Returns the list of all the document IDs in the collection, which is read once and pinned in the cache.
+        '''
+        if self.universe is None:
+            self.universe = self.postings.all_docIDs()
+        return self.universe
+
+    def terms(self):
+        return self.postings.terms()
+
+    def expand(self, pattern, max_expansions=None):
+        return self.postings.expand(pattern, max_expansions)
+
+    @property
+    def bytes_read(self):
+        '''
+        The number of bytes of postings lists read from the index, i.e. by the cache misses.
+        '''
+        return self.postings.bytes_read
+
+    def warm_up(self, queries):
+        '''
+        Loads the postings lists of the most frequent terms of a log of queries into the cache, from the most to the
+        least frequent, until the cache is full.
+        :param queries: an iterable of boolean queries, e.g. the lines of a query log file.
+        '''
+        counts = Counter()
+        for query in queries:
+            if query.strip():
+                counts.update(term for term in query_terms(query) if term in self.postings)
+        self.all_docIDs()
+        for term, count in counts.most_common():
+            if term in self.cache:
+                continue
+            postings_list = self.postings.get(term)
+            if self.bytes + postings_size(postings_list) > self.max_bytes:
+                break
+            self.add(term, self.postings.freq(term), postings_list)
+        # the least frequent terms of the log are evicted first
+        for term, count in counts.most_common():
+            if term in self.cache:
+                self.cache.move_to_end(term, last=False)
+
+    def stats(self):
+        '''
+        Returns a dictionary of the number of cache hits, misses, evictions, cached lists and cached bytes.
+        '''
+        return {"hits": self.hits, "misses": self.misses, "evictions": self.evictions, "size": len(self.cache),
+                "bytes": self.bytes}
+
+    def clear(self):
+        '''
+        Empties the cache, including the pinned universe, e.g. after the index has changed.
+        '''
+        self.cache.clear()
+        self.bytes = 0
+        self.universe = None
+
+    def close(self):
+        self.clear()
+        self.postings.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+class BatchPostings:
+    '''
+    Serves the postings lists of the terms of a batch of queries, which are each fetched once from the PostingsCache
+    of the index, with the same methods as a PostingsStore. A term which occurs in many queries of the batch is thus
+    only read once, even if the cache is too small to keep all the lists of the batch.
+    '''
+
+    def __init__(self, postings, terms):
+        '''
+        :param postings: the PostingsCache of the index.
+        :param terms: the normalised terms of the queries in the batch.
+        '''
+        self.postings = postings
+        self.lists = {}
+        for term in terms:
+            if term not in self.lists and term in postings:
+                self.lists[term] = postings.get(term)
+
+    def __contains__(self, term):
+        return term in self.lists
+
+    def freq(self, term):
+        return self.postings.freq(term)
+
+    def get(self, term):
+        return self.lists[term]
+
+    def skip_list(self, term):
+        return None
+
+    def expand(self, pattern, max_expansions=None):
+        '''
+        Returns the terms which match a wildcard pattern, whose postings lists are then also shared by the batch.
+        '''
+        terms = self.postings.expand(pattern, max_expansions)
+        for term in terms:
+            if term not in self.lists:
+                self.lists[term] = self.postings.get(term)
+        return terms
+
+    def all_docIDs(self):
+        return self.postings.all_docIDs()
@@ -0,0 +1,335 @@
+'''
+Binary postings file format (version 3).
+
+The file starts with a fixed size header (magic string, format version and block size, i.e. the skip interval, which
+is chosen at index time with index.py -k), directly followed by the postings list of all the document IDs in the
+collection, and then the postings list of each term. The byte offsets of the term postings lists are stored in the
+dictionary file.
+
+Each postings list is stored as:
+    varint  number of bytes in the rest of the list
+    byte    list kind, LIST_BLOCKS or LIST_BITMAP
+    varint  document frequency (df)
+followed, for a LIST_BLOCKS list of n = ceil(df / block_size) blocks, by the skip table
+    firsts  n uint32, the first docID of each block
+    lasts   n uint32, the last docID of each block
+    ends    n uint32, the byte address of the end of each block, relative to the start of the blocks
+and the blocks, each a width byte (1, 2 or 4) followed by the docID gaps of the block packed at that width
+or, for a LIST_BITMAP list, by
+    the bitmap of the docIDs as little-endian bytes, where bit d is set if docID d is in the list
+
+DocIDs are gap encoded, i.e. the first docID is stored as is and every following docID is stored as the
+difference from the previous one. The gaps are split into blocks of block_size postings. Since every gap
+in a block is stored with the same width, a block is decoded with a single array.frombytes call instead of
+parsing the docIDs one by one. The skip table is stored out of line, before the blocks, with fixed width
+entries, so that it can be searched without decoding it: the block which may hold a docID is found by a galloping
+search on the last docIDs (see gallop), a docID before the first docID of its block is known to be absent, and
+only that block is decoded, starting from the last docID of the previous block. A long list can thus be
+intersected with a short one by a SkipList in time proportional to the short list, decoding only the blocks which
+may hold its docIDs, rather than decoding the whole long list.
+
+The lists of terms with a high df are stored as bitmaps instead (see Bitmap.py), which are decoded into
+Bitmap objects. Version 2 files, whose block table is one (varint last docID gap, varint block length) pair per
+block, and version 1 files, which also have no list kind byte, can still be read, but have no SkipLists.
+
+Postings files written before this format (comma separated docID/skip_pointer text lines, with all the
+document IDs on the first line) have no header and are still readable with parse_text_postings.
+'''
+import struct
+import sys
+from array import array
+from bisect import bisect_left
+from itertools import accumulate, chain
+from Bitmap import Bitmap
+
+MAGIC = b"BRPOST"
+VERSION = 3
+SUPPORTED_VERSIONS = [1, 2, 3]
+LIST_BLOCKS = 0
+LIST_BITMAP = 1
+HEADER_FORMAT = "<6sBxI"
+HEADER_SIZE = struct.calcsize(HEADER_FORMAT)
+DEFAULT_BLOCK_SIZE = 128
+
+def _typecode(itemsize):
+    '''
+    Returns the array typecode of an unsigned integer with the given size in bytes.
+    '''
+    for typecode in ["B", "H", "I", "L"]:
+        if array(typecode).itemsize == itemsize:
+            return typecode
+    raise ValueError("no unsigned array type of size " + str(itemsize))
+
+WIDTH_TYPECODES = {1: _typecode(1), 2: _typecode(2), 4: _typecode(4)}
+DOCID_TYPECODE = WIDTH_TYPECODES[4]
+BIG_ENDIAN = sys.byteorder == "big"
+
+def encode_header(block_size=DEFAULT_BLOCK_SIZE):
+    '''
+    Returns the header written at the start of a binary postings file.
+    '''
+    return struct.pack(HEADER_FORMAT, MAGIC, VERSION, block_size)
+
+def decode_header(buffer):
+    '''
+    Returns the (version, block_size) of a postings file given its first bytes, or None if the file is
+    a legacy text postings file.
+    '''
+    if len(buffer) < HEADER_SIZE or bytes(buffer[:len(MAGIC)]) != MAGIC:
+        return None
+    magic, version, block_size = struct.unpack(HEADER_FORMAT, bytes(buffer[:HEADER_SIZE]))
+    if version not in SUPPORTED_VERSIONS:
+        raise ValueError("unsupported postings format version " + str(version))
+    return (version, block_size)
+
+def encode_varint(number, out):
+    '''
+    Appends the variable byte encoding of a non-negative integer to the bytearray out.
+    Each byte holds 7 bits of the number, and the high bit is set on every byte except the last.
+    '''
+    while number >= 0x80:
+        out.append((number & 0x7F) | 0x80)
+        number >>= 7
+    out.append(number)
+
+def decode_varint(buffer, offset):
+    '''
+    Decodes a variable byte encoded integer starting at offset.
+    :return: a (number, offset of the next byte) tuple
+    '''
+    number = 0
+    shift = 0
+    while True:
+        byte = buffer[offset]
+        offset += 1
+        number |= (byte & 0x7F) << shift
+        if byte < 0x80:
+            return number, offset
+        shift += 7
+
+def encode_postings(docIDs, block_size=DEFAULT_BLOCK_SIZE):
+    '''
+    Encodes a sorted list of integer document IDs into a binary postings list.
+    :param docIDs: a sorted list of document IDs as integers.
+    :param block_size: the number of postings in each block, i.e. the skip interval.
+    :return: the encoded postings list as bytes, including its length prefix.
+    '''
+    firsts = array(DOCID_TYPECODE)
+    lasts = array(DOCID_TYPECODE)
+    ends = array(DOCID_TYPECODE)
+    blocks = bytearray()
+    previous = 0
+    for start in range(0, len(docIDs), block_size):
+        gaps = []
+        for docID in docIDs[start:start + block_size]:
+            gaps.append(docID - previous)
+            previous = docID
+        largest = max(gaps)
+        width = 1 if largest < 0x100 else 2 if largest < 0x10000 else 4
+        packed = array(WIDTH_TYPECODES[width], gaps)
+        if BIG_ENDIAN:
+            packed.byteswap()
+        firsts.append(docIDs[start])
+        lasts.append(previous)
+        blocks.append(width)
+        blocks += packed.tobytes()
+        ends.append(len(blocks))
+    body = bytearray([LIST_BLOCKS])
+    encode_varint(len(docIDs), body)
+    for table in [firsts, lasts, ends]:
+        if BIG_ENDIAN:
+            table.byteswap()
+        body += table.tobytes()
+    body += blocks
+    return _prefix_length(body)
+
+def encode_bitmap(docIDs):
+    '''
+    Encodes a sorted list of integer document IDs into a binary bitmap postings list.
+    :return: the encoded postings list as bytes, including its length prefix.
+    '''
+    body = bytearray([LIST_BITMAP])
+    encode_varint(len(docIDs), body)
+    body += Bitmap.from_docIDs(docIDs).data
+    return _prefix_length(body)
+
+def _prefix_length(body):
+    '''
+    Prefixes an encoded postings list with its length.
+    '''
+    result = bytearray()
+    encode_varint(len(body), result)
+    return bytes(result + body)
+
+def decode_postings(buffer, offset, block_size, version=VERSION):
+    '''
+    Decodes the postings list starting at offset in buffer (bytes, mmap or memoryview) into an array of
+    integer document IDs, or into a Bitmap for a bitmap list.
+    :param offset: the byte address of the list, i.e. of its length prefix.
+    '''
+    length, offset = decode_varint(buffer, offset)
+    return decode_postings_body(buffer, offset, block_size, version, offset + length)
+
+def decode_postings_body(buffer, offset, block_size, version=VERSION, end=None):
+    '''
+    Decodes a postings list whose length prefix has already been skipped.
+    :param end: the byte address of the end of the list, which defaults to the end of the buffer.
+    '''
+    kind = LIST_BLOCKS
+    if version >= 2:
+        kind = buffer[offset]
+        offset += 1
+    df, offset = decode_varint(buffer, offset)
+    if kind == LIST_BITMAP:
+        return Bitmap(data=bytes(buffer[offset:end]), count=df)
+    count = (df + block_size - 1) // block_size
+    if version >= 3:
+        ends = read_table(buffer, offset + 8 * count, count)
+        lengths = [end - start for start, end in zip(chain([0], ends), ends)]
+        offset += 12 * count
+    else:
+        lengths = []
+        for _ in range(count):
+            offset = decode_varint(buffer, offset)[1]
+            length, offset = decode_varint(buffer, offset)
+            lengths.append(length)
+    blocks = []
+    for length in lengths:
+        block = array(WIDTH_TYPECODES[buffer[offset]])
+        block.frombytes(buffer[offset + 1:offset + length])
+        if BIG_ENDIAN:
+            block.byteswap()
+        blocks.append(block)
+        offset += length
+    return array(DOCID_TYPECODE, accumulate(chain.from_iterable(blocks)))
+
+def read_table(buffer, offset, count):
+    '''
+    Returns the array of count uint32 values of a skip table starting at offset.
+    '''
+    table = array(DOCID_TYPECODE)
+    table.frombytes(buffer[offset:offset + 4 * count])
+    if BIG_ENDIAN:
+        table.byteswap()
+    return table
+
+def gallop(values, target, low=0):
+    '''
+    Returns the position of the first value which is at least target in the sorted values from position low,
+    i.e. bisect_left(values, target, low), by galloping: the step from low is doubled until it passes the target,
+    and the last step is then searched by bisection, so that the cost is the log of the distance moved rather than
+    the log of the length of the values.
+    '''
+    length = len(values)
+    step = 1
+    high = low
+    while high < length and values[high] < target:
+        low = high + 1
+        high += step
+        step *= 2
+    return bisect_left(values, target, low, min(high, length))
+
+def decode_skip_list(buffer, offset, block_size, version=VERSION):
+    '''
+    Returns a SkipList over the postings list starting at offset in buffer, or None if the list is a bitmap or
+    if the version of the file has no skip table.
+    '''
+    if version < 3:
+        return None
+    length, offset = decode_varint(buffer, offset)
+    if buffer[offset] != LIST_BLOCKS:
+        return None
+    df, offset = decode_varint(buffer, offset + 1)
+    return SkipList(buffer, offset, df, block_size)
+
+class SkipList:
+    '''
+    A postings list which is decoded lazily, one block at a time, through its skip table. Only the skip table is
+    read when the SkipList is created, and a block is decoded when a docID which may be in it is looked for, so that
+    looking for k docIDs in a list of n docIDs costs about k log(n / k) comparisons, and at most k block decodes.
+    The last decoded block is kept, since the docIDs are looked for in increasing order.
+    '''
+
+    def __init__(self, buffer, offset, df, block_size):
+        '''
+        :param offset: the byte address of the skip table of the list.
+        '''
+        count = (df + block_size - 1) // block_size
+        self.buffer = buffer
+        self.df = df
+        self.firsts = read_table(buffer, offset, count)
+        self.lasts = read_table(buffer, offset + 4 * count, count)
+        self.ends = read_table(buffer, offset + 8 * count, count)
+        self.blocks = offset + 12 * count
+        self.block_index = -1
+        self.block_docIDs = None
+
+    def __len__(self):
+        return self.df
+
+    def block(self, index):
+        '''
+        Returns the array of the docIDs of a block.
+        '''
+        if index != self.block_index:
+            start = self.blocks + (self.ends[index - 1] if index else 0)
+            end = self.blocks + self.ends[index]
+            gaps = array(WIDTH_TYPECODES[self.buffer[start]])
+            gaps.frombytes(self.buffer[start + 1:end])
+            if BIG_ENDIAN:
+                gaps.byteswap()
+            previous = self.lasts[index - 1] if index else 0
+            self.block_docIDs = array(DOCID_TYPECODE, accumulate(gaps, initial=previous))[1:]
+            self.block_index = index
+        return self.block_docIDs
+
+    def filter(self, docIDs, keep=True, tracer=None):
+        '''
+        Returns the array of the docIDs, in sorted order, which are in the list, or which are not in the list if keep
+        is False, as Bitmap.filter does.
+        :param tracer: a Tracer (see Tracer.py), to which the number of gallops on the skip table and of blocks
+        searched are reported as the skips and steps of the merge.
+        '''
+        result = array(DOCID_TYPECODE)
+        firsts, lasts = self.firsts, self.lasts
+        count = len(lasts)
+        index = 0
+        gallops, searches = 0, 0
+        for position, docID in enumerate(docIDs):
+            if index < count and lasts[index] < docID:
+                index = gallop(lasts, docID, index + 1)
+                gallops += 1
+            if index == count:
+                if not keep:
+                    result.extend(docIDs[position:])
+                break
+            found = False
+            if docID >= firsts[index]:
+                block = self.block(index)
+                found = block[bisect_left(block, docID)] == docID
+                searches += 1
+            if found == keep:
+                result.append(docID)
+        if tracer is not None:
+            tracer.merge_steps(gallops, searches)
+        return result
+
+    def to_array(self):
+        '''
+        Returns the whole list as an array of docIDs.
+        '''
+        return array(DOCID_TYPECODE, chain.from_iterable(self.block(index) for index in range(len(self.lasts))))
+
+    def __iter__(self):
+        for index in range(len(self.lasts)):
+            yield from self.block(index)
+
+def parse_text_postings(line):
+    '''
+    Parses a line of a legacy text postings file into an array of integer document IDs,
+    dropping the skip pointers.
+    '''
+    line = line.strip()
+    if not line:
+        return array(DOCID_TYPECODE)
+    return array(DOCID_TYPECODE, [int(posting.split("/")[0]) for posting in line.split(",")])
@@ -0,0 +1,193 @@
+'''
+Lazy iterators over postings lists, which evaluate a query one document ID at a time, so that only as much of the
+postings lists is read as is needed for the first results of a query. Every iterator has the methods:
+    next()              moves to the next document ID and returns it, or None if there is none
+    advance(target)     moves to the first document ID which is at least target, and returns it, or None if there is
+                        none. The iterator does not move if its current document ID is at least target.
+and the document ID it is on is docID, which is -1 before the first call, and None once it is exhausted.
+Iterators over the postings lists of terms (PostingsIterator, BitmapIterator and SkipListIterator) are combined into
+trees by AndIterator and OrIterator, and a NOT is an AndIterator over all the document IDs with a negative child.
+The iterators are also python iterators over their remaining document IDs.
+'''
+from Bitmap import Bitmap, BYTE_OFFSETS
+from PostingsFormat import SkipList, gallop
+
+class PostingsIterator:
+    '''
+    Iterates over an array of document IDs. advance gallops from the current position (see gallop), so that it costs
+    the log of the distance moved rather than the distance.
+    '''
+
+    def __init__(self, postings_list):
+        self.postings_list = postings_list
+        self.length = len(postings_list)
+        self.position = -1
+        self.docID = -1
+
+    def next(self):
+        if self.docID is None:
+            return None
+        self.position += 1
+        return self.seek()
+
+    def advance(self, target):
+        if self.docID is None or self.docID >= target:
+            return self.docID
+        self.position = gallop(self.postings_list, target, self.position + 1)
+        return self.seek()
+
+    def seek(self):
+        if self.position >= self.length:
+            self.docID = None
+        else:
+            self.docID = self.postings_list[self.position]
+        return self.docID
+
+    def __iter__(self):
+        docID = self.next()
+        while docID is not None:
+            yield docID
+            docID = self.next()
+
+class BitmapIterator(PostingsIterator):
+    '''
+    Iterates over a Bitmap, by scanning its bytes for the next set bit.
+    '''
+
+    def __init__(self, bitmap):
+        self.data = bitmap.data
+        self.docID = -1
+
+    def next(self):
+        if self.docID is None:
+            return None
+        return self.advance(self.docID + 1)
+
+    def advance(self, target):
+        if self.docID is None or self.docID >= target:
+            return self.docID
+        data = self.data
+        index = target >> 3
+        mask = (0xFF << (target & 7)) & 0xFF
+        while index < len(data):
+            byte = data[index] & mask
+            if byte:
+                self.docID = (index << 3) + BYTE_OFFSETS[byte][0]
+                return self.docID
+            index += 1
+            mask = 0xFF
+        self.docID = None
+        return None
+
+class SkipListIterator(PostingsIterator):
+    '''
+    Iterates over a SkipList. advance gallops over the last document IDs of the blocks to the block which may hold the
+    target, and only decodes that block, so that the blocks which are jumped over are never decoded.
+    '''
+
+    def __init__(self, skip_list):
+        self.skip_list = skip_list
+        self.count = len(skip_list.lasts)
+        self.index = 0
+        self.postings_list = skip_list.block(0) if self.count else []
+        self.length = len(self.postings_list)
+        self.position = -1
+        self.docID = -1
+
+    def seek(self):
+        while self.position >= self.length:
+            self.index += 1
+            if self.index >= self.count:
+                self.docID = None
+                return None
+            self.postings_list = self.skip_list.block(self.index)
+            self.length = len(self.postings_list)
+            self.position = 0
+        self.docID = self.postings_list[self.position]
+        return self.docID
+
+    def advance(self, target):
+        if self.docID is None or self.docID >= target:
+            return self.docID
+        lasts = self.skip_list.lasts
+        if lasts[self.index] < target:
+            index = gallop(lasts, target, self.index + 1)
+            if index >= self.count:
+                self.docID = None
+                return None
+            self.index = index
+            self.postings_list = self.skip_list.block(index)
+            self.length = len(self.postings_list)
+            self.position = -1
+        self.position = gallop(self.postings_list, target, self.position + 1)
+        return self.seek()
+
+class AndIterator(PostingsIterator):
+    '''
+    Iterates over the intersection of the positive children, without the document IDs of the negative children,
+    by leapfrogging: the candidate document ID is advanced to in each positive child in turn, from the shortest, and
+    becomes the document ID of the child whenever the child has no such document ID, until all the positive children
+    agree on it. The candidate is then advanced to in the negative children, and skipped if any of them has it.
+    '''
+
+    def __init__(self, children, negatives=()):
+        self.children = children
+        self.negatives = negatives
+        self.docID = -1
+
+    def next(self):
+        if self.docID is None:
+            return None
+        return self.advance(self.docID + 1)
+
+    def advance(self, target):
+        if self.docID is None or self.docID >= target:
+            return self.docID
+        candidate = target
+        while True:
+            for child in self.children:
+                docID = child.advance(candidate)
+                if docID is None:
+                    self.docID = None
+                    return None
+                if docID != candidate:
+                    candidate = docID
+                    break
+            else:
+                if any(negative.advance(candidate) == candidate for negative in self.negatives):
+                    candidate += 1
+                else:
+                    self.docID = candidate
+                    return candidate
+
+class OrIterator(PostingsIterator):
+    '''
+    Iterates over the union of the children, whose document ID is the smallest of the document IDs of the children.
+    '''
+
+    def __init__(self, children):
+        self.children = children
+        self.docID = -1
+
+    def next(self):
+        if self.docID is None:
+            return None
+        return self.advance(self.docID + 1)
+
+    def advance(self, target):
+        if self.docID is None or self.docID >= target:
+            return self.docID
+        docIDs = [child.advance(target) for child in self.children]
+        docIDs = [docID for docID in docIDs if docID is not None]
+        self.docID = min(docIDs) if docIDs else None
+        return self.docID
+
+def postings_iterator(postings_list):
+    '''
+    Returns the iterator over a postings list, which is an array of document IDs, a Bitmap or a SkipList.
+    '''
+    if isinstance(postings_list, Bitmap):
+        return BitmapIterator(postings_list)
+    if isinstance(postings_list, SkipList):
+        return SkipListIterator(postings_list)
+    return PostingsIterator(postings_list)
@@ -0,0 +1,116 @@
+import mmap
+from PostingsFormat import HEADER_SIZE, decode_header, decode_varint, decode_postings_body, decode_skip_list, \
+    parse_text_postings, DOCID_TYPECODE
+from array import array
+from Dictionary import BinaryDictionary
+from WildcardIndex import WildcardIndex
+
+class PostingsStore:
+    '''
+    The PostingsStore class serves the postings lists of the index. The postings file is opened once and
+    memory-mapped, and each postings list is decoded directly from a slice of the mapping given the
+    byte offset stored in the dictionary, so that looking up a term costs no system calls.
+    A single PostingsStore is meant to be shared by all the queries evaluated by a process. The number of bytes of
+    postings lists decoded from the mapping is counted in bytes_read.
+    '''
+
+    def __init__(self, postings_file, dictionary):
+        '''
+        :param postings_file: the path to the postings file.
+        :param dictionary: a dictionary or a BinaryDictionary mapping each term to a (frequency, term_pointer) tuple.
+        '''
+        self.dictionary = dictionary
+        self.wildcards = WildcardIndex(dictionary)
+        self.file = open(postings_file, "rb")
+        self.buffer = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        self.view = memoryview(self.buffer)
+        self.bytes_read = 0
+        header = decode_header(self.view)
+        if header is None:
+            self.version = self.block_size = None
+            self.universe_pointer = 0
+        else:
+            self.version, self.block_size = header
+            self.universe_pointer = HEADER_SIZE
+
+    def __contains__(self, term):
+        return term in self.dictionary
+
+    def freq(self, term):
+        '''
+        Returns the document frequency of a term, or 0 if the term is not in the dictionary.
+        '''
+        entry = self.dictionary.get(term)
+        if entry is None:
+            return 0
+        return entry[0]
+
+    def read(self, pointer):
+        '''
+        Decodes the postings list starting at the byte address pointer into an array of integer document IDs,
+        or into a Bitmap if the list is stored as a bitmap.
+        '''
+        if self.block_size is None:
+            end = self.buffer.find(b"\n", pointer)
+            if end == -1:
+                end = len(self.buffer)
+            self.bytes_read += end - pointer
+            return parse_text_postings(str(self.view[pointer:end], "utf-8"))
+        length, offset = decode_varint(self.view, pointer)
+        self.bytes_read += offset + length - pointer
+        return decode_postings_body(self.view, offset, self.block_size, self.version, offset + length)
+
+    def get(self, term):
+        '''
+        Returns the postings list of a term as an array of integer document IDs or a Bitmap, which is empty
+        if the term is not in the dictionary.
+        '''
+        entry = self.dictionary.get(term)
+        if entry is None:
+            return array(DOCID_TYPECODE)
+        return self.read(entry[1])
+
+    def skip_list(self, term):
+        '''
+        Returns the postings list of a term as a SkipList, which is decoded lazily through its skip table, or None
+        if the term is not in the dictionary, if its list is a bitmap, or if the postings file has no skip tables.
+        '''
+        entry = self.dictionary.get(term)
+        if entry is None or self.block_size is None:
+            return None
+        return decode_skip_list(self.view, entry[1], self.block_size, self.version)
+
+    def all_docIDs(self):
+        '''
+        Returns the array of all the document IDs in the collection.
+        '''
+        return self.read(self.universe_pointer)
+
+    def terms(self):
+        '''
+        Returns the sorted list of the terms in the dictionary.
+        '''
+        return sorted(self.dictionary)
+
+    def expand(self, pattern, max_expansions=None):
+        '''
+        Returns the sorted list of the terms in the dictionary which match a wildcard pattern, at most max_expansions
+        of them (see WildcardIndex.py).
+        '''
+        return self.wildcards.expand(pattern, max_expansions)
+
+    def close(self):
+        '''
+        Releases the memory mapping and closes the postings file, and the dictionary file if it is memory-mapped.
+        '''
+        if isinstance(self.dictionary, BinaryDictionary):
+            self.dictionary.close()
+        self.view.release()
+        self.buffer.close()
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
@@ -0,0 +1,326 @@
+'''
+The query planner. A boolean query is converted by the parser into a canonical expression tree (postfix_to_tree),
+which the QueryPlanner rewrites into a tree of PlanNodes, estimating the size and the cost of every node from the
+document frequencies in the dictionary, and then executes with the merge methods of a BooleanEval object.
+
+A term is a string in the expression tree, and an operator is a ("NOT", operand, key) or an ("AND", operands, key)
+or ("OR", operands, key) tuple, where operands is a tuple and key is the expression_key of the operator, which is
+computed once when the node is built, from the keys of its operands. The plan is made of the nodes:
+    TERM        the postings list of a term
+    EMPTY       the empty list, e.g. a term which is not in the dictionary
+    ALL         the list of all the document IDs
+    AND         the intersection of the positive children, minus the union of the negative children (ANDNOT)
+    OR          the union of the children
+    NOT         the complement of the child
+'''
+import time
+from BooleanEval import new_postings_list, GALLOP_FACTOR
+from PostingsIterator import AndIterator, OrIterator, postings_iterator
+from WildcardIndex import is_wildcard
+
+def postfix_to_tree(postfix_exp):
+    '''
+    Converts a postfix expression from infix_to_postfix into a canonical expression tree, so that logically identical
+    queries have the same tree. ANDNOT and NOTAND are expanded into AND and NOT, nested ANDs and ORs are flattened,
+    repeated operands are removed, the operands of AND and OR are sorted by their expression_key, and double
+    negation is removed, e.g. b AND (NOT NOT a AND b) becomes ("AND", ("a", "b"), "AND('a','b')").
+    Raises a ValueError if the expression is malformed.
+    :param postfix_exp: A boolean query in postfix notation, as a list
+    :return: the expression tree
+    '''
+    stack = []
+    for term in postfix_exp:
+        if term == "NOT":
+            if not stack:
+                raise ValueError("NOT without an operand")
+            stack.append(negate(stack.pop()))
+        elif term in ["AND", "OR", "ANDNOT", "NOTAND"]:
+            if len(stack) < 2:
+                raise ValueError(term + " without two operands")
+            right = stack.pop()
+            left = stack.pop()
+            if term == "ANDNOT":
+                right = negate(right)
+            elif term == "NOTAND":
+                left = negate(left)
+            operator = "OR" if term == "OR" else "AND"
+            operands = {}
+            for operand in [left, right]:
+                if isinstance(operand, tuple) and operand[0] == operator:
+                    for item in operand[1]:
+                        operands[expression_key(item)] = item
+                else:
+                    operands[expression_key(operand)] = operand
+            if len(operands) == 1:
+                stack.append(operands.popitem()[1])
+            else:
+                stack.append(operator_node(operator, tuple(operands[key] for key in sorted(operands))))
+        else:
+            stack.append(term)
+    if len(stack) != 1:
+        raise ValueError("malformed query")
+    return stack[0]
+
+def negate(node):
+    '''
+    Returns the canonical expression tree of NOT node, removing a double negation.
+    '''
+    if isinstance(node, tuple) and node[0] == "NOT":
+        return node[1]
+    return ("NOT", node, "NOT(" + expression_key(node) + ")")
+
+def operator_node(operator, operands):
+    '''
+    Returns the AND or OR node of a tuple of operands, with its expression_key.
+    '''
+    return (operator, operands, operator + "(" + ",".join(map(expression_key, operands)) + ")")
+
+def expression_key(node):
+    '''
+    Returns a string which identifies an expression tree from postfix_to_tree, e.g. AND('a',NOT('b')), used to sort the
+    operands of the tree and as the key of its result in a ResultCache. The key of an operator is stored in its node,
+    so that it is not computed again from the whole subtree at every level of the tree.
+    '''
+    if isinstance(node, str):
+        return repr(node)
+    return node[2]
+
+class PlanNode:
+    '''
+    A node of an execution plan. size is the estimated number of document IDs in the result of the node, and cost is
+    the estimated number of postings read and merged to compute it. key is the expression_key of the expression
+    computed by the node, under which its result is cached, or None for the nodes introduced by the planner.
+    '''
+
+    def __init__(self, op, size, cost, term=None, children=(), negatives=(), key=None):
+        self.op = op
+        self.size = size
+        self.cost = cost
+        self.term = term
+        self.children = list(children)
+        self.negatives = list(negatives)
+        self.key = key
+
+    def explain(self, indent=0):
+        '''
+        Returns the plan rooted at this node as indented lines of text, one node per line, with the estimated size and
+        cost of each node, in the order in which the children are evaluated.
+        '''
+        label = self.op + (" " + self.term if self.term is not None else "")
+        lines = ["  " * indent + label + " (size " + str(int(round(self.size))) + ", cost " + str(int(round(self.cost)))
+                 + ")"]
+        for child in self.children:
+            lines.append(child.explain(indent + 1))
+        for child in self.negatives:
+            lines.append("  " * (indent + 1) + "ANDNOT")
+            lines.append(child.explain(indent + 2))
+        return "\n".join(lines)
+
+class QueryPlanner:
+    '''
+    The QueryPlanner class rewrites the expression tree of a query into a plan (see plan) and executes the plan
+    (see execute). Sizes are estimated from the document frequencies of the terms and the collection size, assuming
+    that the terms occur independently.
+    '''
+
+    def __init__(self, evaluator):
+        '''
+        :param evaluator: the BooleanEval object whose postings lists and merge methods are used.
+        '''
+        self.evaluator = evaluator
+        self.collection_size = None
+
+    def universe_size(self):
+        if self.collection_size is None:
+            self.collection_size = len(self.evaluator.get_all_docIDs())
+        return self.collection_size
+
+    def plan(self, node):
+        '''
+        Returns the PlanNode of an expression tree. The tree is rewritten bottom up:
+        - a term which is not in the dictionary is EMPTY, the empty list.
+        - a wildcard pattern is the OR of the terms which match it (see plan_wildcard).
+        - the negated operands of an AND are subtracted from the intersection of its positive operands (ANDNOT), so
+          that their complement is never computed. An AND of negated operands only is rewritten by De Morgan's law,
+          NOT a AND NOT b = NOT (a OR b), into a single complement.
+        - an OR with negated operands is rewritten by De Morgan's law, a OR NOT b OR NOT c = NOT ((b AND c) ANDNOT a),
+          so that a single complement is computed.
+        - EMPTY and ALL operands are removed from or short-circuit the AND, OR and NOT nodes, and the ANDs produced by
+          the rewrites inside another AND are flattened into it.
+        The operands of an AND and of an OR are ordered by increasing size, so that the shortest lists are merged
+        first.
+        '''
+        if isinstance(node, str):
+            if is_wildcard(node):
+                return self.plan_wildcard(node)
+            return self.plan_term(node)
+        key = expression_key(node)
+        if node[0] == "NOT":
+            return self.plan_not(self.plan(node[1]), key)
+        children = [self.plan(operand) for operand in node[1]]
+        if node[0] == "AND":
+            return self.plan_and([child for child in children if child.op != "NOT"],
+                                 [child.children[0] for child in children if child.op == "NOT"], key)
+        return self.plan_or(children, key)
+
+    def plan_term(self, term):
+        freq = self.evaluator.postings.freq(term)
+        if freq == 0:
+            return PlanNode("EMPTY", 0, 0)
+        return PlanNode("TERM", freq, freq, term=term)
+
+    def plan_wildcard(self, pattern):
+        '''
+        Returns the plan of a wildcard pattern: an OR of the terms which match it (see BooleanEval.expand), whose
+        postings lists are merged at once by OR_lists, and which is labelled with the pattern.
+        '''
+        plan = self.plan_or([self.plan_term(term) for term in self.evaluator.expand(pattern)], expression_key(pattern))
+        if plan.op == "OR":
+            plan.term = pattern
+        return plan
+
+    def plan_not(self, child, key=None):
+        if child.op == "EMPTY":
+            return PlanNode("ALL", self.universe_size(), 0)
+        if child.op == "ALL":
+            return PlanNode("EMPTY", 0, 0)
+        if child.op == "NOT":
+            return child.children[0]
+        return PlanNode("NOT", max(0, self.universe_size() - child.size), child.cost + self.universe_size() / 8,
+                        children=[child], key=key)
+
+    def plan_and(self, positives, negatives, key=None):
+        for child in [child for child in positives if child.op == "AND"]:
+            # an AND which the rewrites have nested in another AND is flattened into it
+            positives.remove(child)
+            positives += child.children
+            negatives += child.negatives
+        if any(child.op == "EMPTY" for child in positives):
+            return PlanNode("EMPTY", 0, 0)
+        if any(child.op == "ALL" for child in negatives):
+            return PlanNode("EMPTY", 0, 0)
+        negatives = [child for child in negatives if child.op != "EMPTY"]
+        if not positives:
+            # NOT a AND NOT b = NOT (a OR b)
+            if not negatives:
+                return PlanNode("ALL", self.universe_size(), 0)
+            return self.plan_not(self.plan_or(negatives), key)
+        if len(positives) > 1:
+            positives = [child for child in positives if child.op != "ALL"] or positives[:1]
+        if len(positives) == 1 and not negatives:
+            return positives[0]
+        positives.sort(key=lambda child: child.size)
+        negatives.sort(key=lambda child: child.size)
+        universe = self.universe_size()
+        size = positives[0].size
+        for child in positives[1:]:
+            size *= child.size / universe
+        for child in negatives:
+            size *= 1 - min(1, child.size / universe)
+        cost = sum(child.cost for child in positives + negatives)
+        return PlanNode("AND", size, cost, children=positives, negatives=negatives, key=key)
+
+    def plan_or(self, children, key=None):
+        children = [child for child in children if child.op != "EMPTY"]
+        if not children:
+            return PlanNode("EMPTY", 0, 0)
+        if any(child.op == "ALL" for child in children):
+            return PlanNode("ALL", self.universe_size(), 0)
+        if len(children) == 1:
+            return children[0]
+        negated = [child.children[0] for child in children if child.op == "NOT"]
+        if negated:
+            # a OR NOT b OR NOT c = NOT ((b AND c) ANDNOT a)
+            positives = [child for child in children if child.op != "NOT"]
+            return self.plan_not(self.plan_and(negated, positives), key)
+        children.sort(key=lambda child: child.size)
+        universe = self.universe_size()
+        missing = 1.0
+        for child in children:
+            missing *= 1 - min(1, child.size / universe)
+        size = universe * (1 - missing)
+        cost = sum(child.cost for child in children) + size
+        return PlanNode("OR", size, cost, children=children, key=key)
+
+    def execute(self, plan, cache=None):
+        '''
+        Executes a plan into a (freq, postings list) tuple. The children of an AND and of an OR are merged at once by
+        the n-ary AND_lists, ANDNOT_lists and OR_lists merges. An AND is empty as soon as one of its children is
+        empty, without evaluating the remaining children, and its negative children are only evaluated if the
+        intersection of its positive children is not empty. If a ResultCache is given, the result of every node with a
+        key is looked up in and added to the cache, so that the sub-expressions shared by different queries are only
+        evaluated once. The result of every node is reported to the Tracer of the evaluator, if any.
+        A term of an AND whose list is more than GALLOP_FACTOR times longer than the first list of the AND, or than the
+        intersection for a negative term, is read as a SkipList (see BooleanEval.get_skip_list), so that only the
+        blocks of its list which may hold the document IDs of the shorter lists are decoded.
+        '''
+        evaluator = self.evaluator
+        if evaluator.tracer is not None and plan.op not in ["TERM", "EMPTY", "ALL"]:
+            start = time.perf_counter()
+            result = self.execute_node(plan, cache)
+            evaluator.tracer.node(plan, result, time.perf_counter() - start)
+            return result
+        return self.execute_node(plan, cache)
+
+    def execute_node(self, plan, cache):
+        evaluator = self.evaluator
+        if plan.op == "TERM":
+            return evaluator.get_postings_list(plan.term)
+        if plan.op == "EMPTY":
+            return (0, new_postings_list())
+        if plan.op == "ALL":
+            universe = evaluator.get_all_docIDs()
+            return (len(universe), universe)
+        if cache is not None and plan.key is not None:
+            result = cache.get(plan.key)
+            if result is not None:
+                return result
+        if plan.op == "NOT":
+            result = evaluator.NOT(self.execute(plan.children[0], cache))
+        elif plan.op == "OR":
+            result = evaluator.OR_lists([self.execute(child, cache) for child in plan.children])
+        else:
+            lists = []
+            for child in plan.children:
+                if lists and child.op == "TERM" and child.size > GALLOP_FACTOR * lists[0][0]:
+                    lists.append(evaluator.get_skip_list(child.term))
+                else:
+                    lists.append(self.execute(child, cache))
+                if not lists[-1][1]:
+                    break
+            result = evaluator.AND_lists(lists) if lists[-1][1] else (0, new_postings_list())
+            if result[1] and plan.negatives:
+                negatives = []
+                for child in plan.negatives:
+                    if child.op == "TERM" and child.size > GALLOP_FACTOR * result[0]:
+                        negatives.append(evaluator.get_skip_list(child.term))
+                    else:
+                        negatives.append(self.execute(child, cache))
+                result = evaluator.ANDNOT_lists(result, negatives)
+        if cache is not None and plan.key is not None:
+            cache.put(plan.key, result)
+        return result
+
+    def iterate(self, plan, cache=None):
+        '''
+        Returns a lazy iterator over the result of a plan (see PostingsIterator.py), which only merges as much of the
+        postings lists as is needed for the document IDs taken from it, e.g. for the first results of a query. A node
+        whose result is in the ResultCache, if one is given, iterates over the cached result.
+        '''
+        evaluator = self.evaluator
+        if plan.op == "TERM":
+            return postings_iterator(evaluator.get_skip_list(plan.term)[1])
+        if plan.op == "EMPTY":
+            return postings_iterator(new_postings_list())
+        if plan.op == "ALL":
+            return postings_iterator(evaluator.get_all_docIDs())
+        if cache is not None and plan.key is not None:
+            result = cache.get(plan.key)
+            if result is not None:
+                return postings_iterator(result[1])
+        if plan.op == "NOT":
+            return AndIterator([postings_iterator(evaluator.get_all_docIDs())], [self.iterate(plan.children[0], cache)])
+        if plan.op == "OR":
+            return OrIterator([self.iterate(child, cache) for child in plan.children])
+        return AndIterator([self.iterate(child, cache) for child in plan.children],
+                           [self.iterate(child, cache) for child in plan.negatives])
@@ -0,0 +1,149 @@
+'''
+Reassignment of document IDs at index time (index.py -r). The documents are given new, consecutive document IDs
+from 0, in one of the ORDERS, before their postings lists are written:
+    compact     the order of the original document IDs, which only removes the unused document IDs between them, so
+                that the bitmaps cover fewer document IDs and the gaps are smaller
+    bisect      an order in which documents which share terms are close together, found by recursive graph
+                bisection (see bisect_order), so that the gaps are clustered
+The original document ID of each new document ID is kept in the document ID map of the index, the
+<postings-file>.docids file, one original document ID per line in order of new document IDs, and the results of
+the queries are mapped back to the original document IDs (see DocIDMap).
+'''
+import os
+import math
+from array import array
+from collections import Counter
+from PostingsFormat import DOCID_TYPECODE
+
+ORDERS = ["compact", "bisect"]
+BISECT_ITERATIONS = 4 # number of rounds of swaps between the two halves of each bisection
+BISECT_LEAF_SIZE = 16 # number of documents from which a range is no longer bisected
+
+def docid_map_file(postings_file):
+    return postings_file + ".docids"
+
+def write_docid_map(postings_file, docIDs):
+    '''
+    Writes the document ID map of an index.
+    :param docIDs: the original document IDs, in order of new document IDs.
+    '''
+    with open(docid_map_file(postings_file), "w") as file:
+        file.write("\n".join(map(str, docIDs)) + "\n")
+
+def read_docid_map(postings_file):
+    '''
+    Returns the DocIDMap of an index, or None if its document IDs are not reassigned.
+    '''
+    if not os.path.exists(docid_map_file(postings_file)):
+        return None
+    with open(docid_map_file(postings_file), "r") as file:
+        return DocIDMap(array(DOCID_TYPECODE, map(int, file.read().split())))
+
+def remove_docid_map(postings_file):
+    if os.path.exists(docid_map_file(postings_file)):
+        os.remove(docid_map_file(postings_file))
+
+class DocIDMap:
+    '''
+    Maps the new document IDs of an index back to the original document IDs. If the map is ordered, as for the
+    compact order, the results stay sorted when they are mapped, and the first document IDs of a result are still
+    the first original document IDs, so that a limited result can be computed lazily. Otherwise the mapped results
+    are sorted again.
+    '''
+
+    def __init__(self, docIDs):
+        '''
+        :param docIDs: the array of the original document IDs, in order of new document IDs.
+        '''
+        self.docIDs = docIDs
+        self.ordered = all(docIDs[index] < docIDs[index + 1] for index in range(len(docIDs) - 1))
+
+    def original(self, postings_list, limit=None):
+        '''
+        Returns the sorted array of the original document IDs of a postings list of new document IDs, or the first
+        limit of them if a limit is given.
+        '''
+        docIDs = self.docIDs
+        if self.ordered:
+            return array(DOCID_TYPECODE, [docIDs[docID] for docID in postings_list[:limit]])
+        result = array(DOCID_TYPECODE, sorted([docIDs[docID] for docID in postings_list]))
+        if limit is not None:
+            del result[limit:]
+        return result
+
+def document_order(order, docIDs, postings=(), max_df=None):
+    '''
+    Returns the original document IDs in the given order, whose positions are their new document IDs.
+    :param order: the name of the order in ORDERS.
+    :param docIDs: the sorted list of the original document IDs.
+    :param postings: an iterator of the (term, postings list) tuples of the collection, in original document IDs,
+    which is only read by the orders which depend on the terms of the documents.
+    :param max_df: the document frequency from which the terms are ignored, e.g. those whose postings lists are
+    stored as bitmaps, whose size does not depend on the order.
+    '''
+    if order == "compact":
+        return list(docIDs)
+    if max_df is None:
+        max_df = len(docIDs)
+    documents = {docID: array(DOCID_TYPECODE) for docID in docIDs}
+    for number, (term, postings_list) in enumerate(postings):
+        # a term of a single document has the same cost wherever the document is
+        if 1 < len(postings_list) < max_df:
+            for docID in postings_list:
+                documents[docID].append(number)
+    return bisect_order(documents, list(docIDs))
+
+def gap_cost(degree, size):
+    '''
+    Returns the estimated number of bits of the gaps of a term in degree of the size documents of a range, the
+    logarithm of the average gap for each of the documents.
+    '''
+    return degree * math.log2(size / (degree + 1))
+
+def bisect_order(documents, docIDs, iterations=BISECT_ITERATIONS, leaf_size=BISECT_LEAF_SIZE):
+    '''
+    Orders documents by recursive graph bisection: the documents are split into two halves, and the pairs of
+    documents whose swap between the halves most reduces the estimated size of the gaps of their terms in both halves
+    (see gap_cost) are swapped, for a few rounds, after which both halves are ordered in the same way. Documents which
+    share terms thus end up in the same ranges of document IDs, at every scale.
+    :param documents: a dictionary mapping each document ID to the array of the numbers of its terms.
+    :param docIDs: the list of the document IDs to order, in their current order.
+    :return: the ordered list of the document IDs.
+    '''
+    if len(docIDs) <= leaf_size:
+        return docIDs
+    middle = len(docIDs) // 2
+    left, right = docIDs[:middle], docIDs[middle:]
+    left_size, right_size = len(left), len(right)
+    position = {docID: index for index, docID in enumerate(docIDs)}
+    for iteration in range(iterations):
+        left_degrees = Counter(term for docID in left for term in documents[docID])
+        right_degrees = Counter(term for docID in right for term in documents[docID])
+        # the reduction of the cost of a term by moving one of its documents to the other half
+        gains = {}
+        for term in left_degrees.keys() | right_degrees.keys():
+            left_degree, right_degree = left_degrees[term], right_degrees[term]
+            cost = gap_cost(left_degree, left_size) + gap_cost(right_degree, right_size)
+            to_right = cost - gap_cost(left_degree - 1, left_size) - gap_cost(right_degree + 1, right_size) \
+                if left_degree else 0.0
+            to_left = cost - gap_cost(left_degree + 1, left_size) - gap_cost(right_degree - 1, right_size) \
+                if right_degree else 0.0
+            gains[term] = (to_right, to_left)
+        left_gains = sorted(((sum(gains[term][0] for term in documents[docID]), docID) for docID in left),
+                            reverse=True)
+        right_gains = sorted(((sum(gains[term][1] for term in documents[docID]), docID) for docID in right),
+                             reverse=True)
+        moved = set()
+        for (left_gain, left_docID), (right_gain, right_docID) in zip(left_gains, right_gains):
+            if left_gain + right_gain <= 0:
+                break
+            moved.add(left_docID)
+            moved.add(right_docID)
+        if not moved:
+            break
+        left, right = ([docID for docID in right if docID in moved] + [docID for docID in left if docID not in moved],
+                       [docID for docID in left if docID in moved] + [docID for docID in right if docID not in moved])
+        left.sort(key=position.get)
+        right.sort(key=position.get)
+    return bisect_order(documents, left, iterations, leaf_size) + bisect_order(documents, right, iterations,
+                                                                                leaf_size)
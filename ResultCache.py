@@ -0,0 +1,80 @@
+import time
+from collections import OrderedDict
+from PostingsCache import postings_size
+
+DEFAULT_RESULT_CACHE_SIZE = 32 * 1024 * 1024
+
+class ResultCache:
+    '''
+    The ResultCache class keeps the (freq, postings list) results of the most recently evaluated queries and
+    sub-expressions, keyed on the expression_key of their canonical expression tree (see postfix_to_tree), so that
+    a query which recurs, or is logically identical to an earlier query after stemming and reordering, is not
+    evaluated again. The least recently used results are evicted when the results exceed a budget of bytes, and a
+    result expires after ttl seconds if a ttl is given. The cache is cleared by clear when the index changes.
+    '''
+
+    def __init__(self, max_bytes=DEFAULT_RESULT_CACHE_SIZE, ttl=None):
+        '''
+        :param max_bytes: the maximum number of bytes of postings lists kept in the cache.
+        :param ttl: the number of seconds for which a result is kept, or None to keep results until they are evicted.
+        '''
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.cache = OrderedDict()
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def get(self, key):
+        '''
+        Returns the cached (freq, postings list) result of an expression key, or None if it is not cached or has
+        expired.
+        '''
+        cache = self.cache
+        if key not in cache:
+            self.misses += 1
+            return None
+        result, size, expiry = cache[key]
+        if expiry is not None and time.monotonic() > expiry:
+            del cache[key]
+            self.bytes -= size
+            self.expirations += 1
+            self.misses += 1
+            return None
+        self.hits += 1
+        cache.move_to_end(key)
+        return result
+
+    def put(self, key, result):
+        '''
+        Adds the (freq, postings list) result of an expression key to the cache, unless it is larger than the whole
+        budget, evicting the least recently used results if the cache exceeds its budget.
+        '''
+        size = postings_size(result[1])
+        if size > self.max_bytes:
+            return
+        if key in self.cache:
+            self.bytes -= self.cache.pop(key)[1]
+        expiry = time.monotonic() + self.ttl if self.ttl is not None else None
+        self.cache[key] = (result, size, expiry)
+        self.bytes += size
+        while self.bytes > self.max_bytes:
+            self.bytes -= self.cache.popitem(last=False)[1][1]
+            self.evictions += 1
+
+    def stats(self):
+        '''
+        Returns a dictionary of the number of cache hits, misses, evictions, expirations, cached results and
+        cached bytes.
+        '''
+        return {"hits": self.hits, "misses": self.misses, "evictions": self.evictions,
+                "expirations": self.expirations, "size": len(self.cache), "bytes": self.bytes}
+
+    def clear(self):
+        '''
+        Empties the cache, e.g. after the index has changed.
+        '''
+        self.cache.clear()
+        self.bytes = 0
@@ -0,0 +1,278 @@
+'''
+An index made of segments. The base segment (generation 0) is the index written by a full run of index.py,
+and every incremental run of index.py -a adds a delta segment indexing only the new documents, numbered
+from generation 1. The delta segments are listed in the <postings-file>.segments file, one
+"dictionary-file postings-file" line per segment, in order of generation.
+
+Deleted documents are recorded as tombstones in the <postings-file>.deleted file, one "docID generation" line per
+deletion, meaning that the document is deleted from all the segments older than the given generation. A document
+which is deleted and then added again is therefore only visible in the newer segment.
+
+compact.py replaces the files of an index in several steps, during which it holds the <postings-file>.publish
+file. open_index waits until the index is not being replaced, and opens it again if any of its files changed while
+it was being opened, so that a search never opens the files of two different versions of the index.
+'''
+import heapq
+import os
+import time
+from array import array
+from contextlib import contextmanager
+from Dictionary import read_dictionary
+from PostingsFormat import DOCID_TYPECODE
+from PostingsStore import PostingsStore
+
+PUBLISH_WAIT = 0.01 # seconds between two attempts to open an index which is being replaced
+PUBLISH_TIMEOUT = 30.0 # seconds after which an index which is still being replaced cannot be opened
+
+def segments_file(postings_file):
+    return postings_file + ".segments"
+
+def deleted_file(postings_file):
+    return postings_file + ".deleted"
+
+def publish_file(postings_file):
+    return postings_file + ".publish"
+
+def read_segments(postings_file):
+    '''
+    Returns the list of (dictionary_file, postings_file) tuples of the delta segments of an index, in order
+    of generation.
+    '''
+    segments = []
+    if os.path.exists(segments_file(postings_file)):
+        with open(segments_file(postings_file), "r") as file:
+            for line in file:
+                entry = line.split()
+                segments.append((entry[0], entry[1]))
+    return segments
+
+def new_segment_files(dictionary_file, postings_file):
+    '''
+    Returns the (dictionary_file, postings_file) tuple of the next delta segment of an index.
+    '''
+    generation = str(len(read_segments(postings_file)) + 1)
+    return (dictionary_file + "." + generation, postings_file + "." + generation)
+
+def add_segment(postings_file, segment_dictionary_file, segment_postings_file):
+    '''
+    Adds a delta segment, which has been written, to the list of segments of an index.
+    '''
+    with open(segments_file(postings_file), "a") as file:
+        file.write(segment_dictionary_file + " " + segment_postings_file + "\n")
+
+def read_deleted(postings_file):
+    '''
+    Returns a dictionary mapping each deleted document ID to the generation before which it is deleted.
+    '''
+    deleted = {}
+    if os.path.exists(deleted_file(postings_file)):
+        with open(deleted_file(postings_file), "r") as file:
+            for line in file:
+                docID, generation = map(int, line.split())
+                deleted[docID] = max(generation, deleted.get(docID, 0))
+    return deleted
+
+def add_deleted(postings_file, docIDs):
+    '''
+    Records the deletion of the documents from all the current segments of an index.
+    '''
+    generation = str(len(read_segments(postings_file)) + 1)
+    with open(deleted_file(postings_file), "a") as file:
+        for docID in docIDs:
+            file.write(str(docID) + " " + generation + "\n")
+
+def clear_segments(postings_file):
+    '''
+    Removes the delta segments and tombstones of an index, leaving the base segment.
+    '''
+    for segment_dictionary_file, segment_postings_file in read_segments(postings_file):
+        for path in [segment_dictionary_file, segment_postings_file]:
+            if os.path.exists(path):
+                os.remove(path)
+    for path in [segments_file(postings_file), deleted_file(postings_file)]:
+        if os.path.exists(path):
+            os.remove(path)
+
+@contextmanager
+def index_lock(postings_file):
+    '''
+    Holds a lock file while the segments of an index are changed, so that index updates and compaction
+    cannot run at the same time. Raises an OSError if the index is already locked.
+    '''
+    lock_file = postings_file + ".lock"
+    descriptor = os.open(lock_file, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+    try:
+        yield
+    finally:
+        os.close(descriptor)
+        os.remove(lock_file)
+
+@contextmanager
+def publishing(postings_file):
+    '''
+    Holds the publish file of an index while its files are replaced, so that the index is not opened until all of
+    them are replaced (see open_index).
+    '''
+    descriptor = os.open(publish_file(postings_file), os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+    try:
+        yield
+    finally:
+        os.close(descriptor)
+        os.remove(publish_file(postings_file))
+
+def index_version(dictionary_file, postings_file):
+    '''
+    Returns a value which changes whenever the index is rebuilt, updated or compacted: the modification time, size
+    and inode of the dictionary, postings, segments, deleted and publish files, or None for a file which does not
+    exist.
+    '''
+    version = []
+    for path in [dictionary_file, postings_file, segments_file(postings_file), deleted_file(postings_file),
+                 publish_file(postings_file)]:
+        try:
+            status = os.stat(path)
+            version.append((status.st_mtime_ns, status.st_size, status.st_ino))
+        except FileNotFoundError:
+            version.append(None)
+    return tuple(version)
+
+def open_index(dictionary_file, postings_file):
+    '''
+    Opens an index for searching. Returns a PostingsStore if the index only has its base segment,
+    and a SegmentedIndex otherwise.
+    '''
+    return open_index_version(dictionary_file, postings_file)[0]
+
+def open_index_version(dictionary_file, postings_file):
+    '''
+    Opens a consistent version of an index (see open_index), and returns it with its index_version. The index is
+    opened once it is not being replaced, and opened again if its version changed while it was being opened.
+    Raises an OSError if the index is still being replaced after PUBLISH_TIMEOUT seconds.
+    '''
+    deadline = time.monotonic() + PUBLISH_TIMEOUT
+    while True:
+        version = index_version(dictionary_file, postings_file)
+        if version[-1] is None:
+            index = read_index(dictionary_file, postings_file)
+            if index_version(dictionary_file, postings_file) == version:
+                return index, version
+            index.close()
+        if time.monotonic() > deadline:
+            raise OSError("the index is still being replaced: " + publish_file(postings_file))
+        time.sleep(PUBLISH_WAIT)
+
+def read_index(dictionary_file, postings_file):
+    '''
+    Opens the files of an index as they are (see open_index).
+    '''
+    segments = read_segments(postings_file)
+    deleted = read_deleted(postings_file)
+    base = PostingsStore(postings_file, read_dictionary(dictionary_file))
+    if not segments and not deleted:
+        return base
+    stores = [base]
+    for segment_dictionary_file, segment_postings_file in segments:
+        stores.append(PostingsStore(segment_postings_file, read_dictionary(segment_dictionary_file)))
+    return SegmentedIndex(stores, deleted)
+
+class SegmentedIndex:
+    '''
+    Serves the postings lists of an index made of a base segment and delta segments, with the same methods as
+    a PostingsStore. The postings list of a term is the union of its postings lists in all the segments,
+    without the documents deleted from each segment, and the document IDs in the collection are the live
+    documents of all the segments.
+    '''
+
+    def __init__(self, stores, deleted):
+        '''
+        :param stores: the PostingsStore of each segment, in order of generation.
+        :param deleted: a dictionary mapping each deleted document ID to the generation before which it is deleted.
+        '''
+        self.stores = stores
+        self.deleted = deleted
+        # segments of this generation or newer have no deleted documents
+        self.clean_generation = max(deleted.values()) if deleted else 0
+
+    def __contains__(self, term):
+        return any(term in store for store in self.stores)
+
+    def freq(self, term):
+        '''
+        Returns the sum of the document frequencies of a term in all the segments, which is an upper bound of its
+        document frequency if documents have been deleted.
+        '''
+        return sum(store.freq(term) for store in self.stores)
+
+    def live(self, postings, generation):
+        '''
+        Returns the postings list of a segment without the documents deleted from the segment.
+        '''
+        if generation >= self.clean_generation:
+            return postings
+        deleted = self.deleted
+        return array(DOCID_TYPECODE, [docID for docID in postings if deleted.get(docID, 0) <= generation])
+
+    def union(self, lists):
+        '''
+        Returns the union of the postings lists of the segments, which have no document IDs in common.
+        '''
+        if len(lists) == 1:
+            return lists[0]
+        return array(DOCID_TYPECODE, heapq.merge(*lists))
+
+    def get(self, term):
+        '''
+        Returns the postings list of a term over all the segments.
+        '''
+        lists = []
+        for generation, store in enumerate(self.stores):
+            if term in store:
+                lists.append(self.live(store.get(term), generation))
+        if not lists:
+            return array(DOCID_TYPECODE)
+        return self.union(lists)
+
+    def skip_list(self, term):
+        '''
+        Returns None, since the postings list of a term is merged from the lists of the segments.
+        '''
+        return None
+
+    def all_docIDs(self):
+        '''
+        Returns the array of all the live document IDs in the collection.
+        '''
+        return self.union([self.live(store.all_docIDs(), generation) for generation, store in enumerate(self.stores)])
+
+    def terms(self):
+        '''
+        Returns the sorted list of the terms of all the segments.
+        '''
+        terms = set()
+        for store in self.stores:
+            terms.update(store.dictionary)
+        return sorted(terms)
+
+    def expand(self, pattern, max_expansions=None):
+        '''
+        Returns the sorted list of the terms of all the segments which match a wildcard pattern, at most
+        max_expansions of them.
+        '''
+        terms = set()
+        for store in self.stores:
+            terms.update(store.expand(pattern, max_expansions))
+        return sorted(terms)[:max_expansions]
+
+    @property
+    def bytes_read(self):
+        return sum(store.bytes_read for store in self.stores)
+
+    def close(self):
+        for store in self.stores:
+            store.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
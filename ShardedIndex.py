@@ -0,0 +1,229 @@
+'''
+A document-partitioned index. index.py -s N splits the collection into N shards of consecutive document IDs, each
+indexed into its own dictionary and postings files, with its own postings list of all the documents of the shard.
+The shards are listed in the <postings-file>.shards file, one "dictionary-file postings-file" line per shard, in
+order of document IDs.
+
+A sharded index is searched by a ShardedSearcher, the coordinator, which starts a worker process for each shard,
+standing in for the node holding the shard. The coordinator parses each query once, sends the parsed queries to all
+the workers (scatter), each of which evaluates them against its shard with a Searcher, and concatenates the results
+of the shards in shard order (gather), which keeps them sorted since the shards hold consecutive document IDs.
+A NOT is evaluated by each shard relative to the document IDs of the shard (see BooleanEval.NOT), and since the
+shards partition the collection, the concatenation of the complements in the shards is the complement in the whole
+collection.
+'''
+import os
+import multiprocessing
+from array import array
+from itertools import islice
+from BatchSearch import Searcher, DEFAULT_CHUNK_SIZE
+from BooleanParser import parse_query
+from PostingsCache import DEFAULT_CACHE_SIZE
+from PostingsFormat import DOCID_TYPECODE
+from Reordering import docid_map_file
+from ResultCache import DEFAULT_RESULT_CACHE_SIZE
+from WildcardIndex import DEFAULT_MAX_EXPANSIONS
+
+def shards_file(postings_file):
+    return postings_file + ".shards"
+
+def read_shards(postings_file):
+    '''
+    Returns the list of (dictionary_file, postings_file) tuples of the shards of an index, in order of document IDs,
+    or an empty list if the index is not sharded.
+    '''
+    shards = []
+    if os.path.exists(shards_file(postings_file)):
+        with open(shards_file(postings_file), "r") as file:
+            for line in file:
+                entry = line.split()
+                shards.append((entry[0], entry[1]))
+    return shards
+
+def write_shards(postings_file, shards):
+    '''
+    Lists the shards of an index, which have been written, in the shards file of the index.
+    '''
+    with open(shards_file(postings_file), "w") as file:
+        for shard_dictionary_file, shard_postings_file in shards:
+            file.write(shard_dictionary_file + " " + shard_postings_file + "\n")
+
+def shard_files(dictionary_file, postings_file, count):
+    '''
+    Returns the list of the (dictionary_file, postings_file) tuples of count shards of an index.
+    '''
+    return [(dictionary_file + ".shard" + str(shard), postings_file + ".shard" + str(shard)) for shard in range(count)]
+
+def clear_shards(postings_file):
+    '''
+    Removes the shards of an index, with their docID maps, and its shards file, if any.
+    '''
+    for shard_dictionary_file, shard_postings_file in read_shards(postings_file):
+        for path in [shard_dictionary_file, shard_postings_file, docid_map_file(shard_postings_file)]:
+            if os.path.exists(path):
+                os.remove(path)
+    if os.path.exists(shards_file(postings_file)):
+        os.remove(shards_file(postings_file))
+
+def partition(files, count):
+    '''
+    Splits a sorted list of document IDs into at most count non-empty ranges of consecutive document IDs, whose sizes
+    differ by at most one document.
+    '''
+    count = max(1, min(count, len(files)))
+    size, remainder = divmod(len(files), count)
+    ranges = []
+    start = 0
+    for shard in range(count):
+        end = start + size + (1 if shard < remainder else 0)
+        ranges.append(files[start:end])
+        start = end
+    return ranges
+
+def serve_shard(connection, searcher_args, query_log_file=None):
+    '''
+    Runs in the worker process of a shard, evaluating the batches of parsed queries received from the coordinator
+    with a Searcher of the shard until it receives None.
+    :param connection: the worker end of the pipe to the coordinator.
+    :param searcher_args: the arguments of the Searcher of the shard.
+    :param query_log_file: a query log to warm up the PostingsCache of the shard with, if any.
+    '''
+    with Searcher(*searcher_args) as searcher:
+        if query_log_file is not None:
+            with open(query_log_file, "r") as log:
+                searcher.postings.warm_up(log)
+        while True:
+            request = connection.recv()
+            if request is None:
+                break
+            command, argument = request
+            if command == "search":
+                connection.send(searcher.search_batch(argument))
+            elif command == "stats":
+                connection.send(searcher.stats())
+    connection.close()
+
+class ShardedSearcher:
+    '''
+    The ShardedSearcher class is the coordinator of a sharded index, with the same methods as a Searcher. Every query
+    is sent to all the shards, so the shards evaluate each batch of queries in parallel, and the result of a query is
+    the concatenation of its results in the shards, or the sum of their sizes if count_only is set, or the plans of
+    the shards if explain is set. With a limit, each shard computes at most limit document IDs, and the concatenation
+    is cut to the limit.
+    '''
+
+    def __init__(self, shards, engine="scalar", cache_size=DEFAULT_CACHE_SIZE,
+                 result_cache_size=DEFAULT_RESULT_CACHE_SIZE, limit=None, count_only=False, explain=False,
+                 query_log_file=None, max_expansions=DEFAULT_MAX_EXPANSIONS, result_ttl=None):
+        '''
+        :param shards: the list of the (dictionary_file, postings_file) tuples of the shards, from read_shards.
+        :param cache_size: the budget in bytes of the PostingsCache of each shard.
+        :param result_cache_size: the budget in bytes of the ResultCache of each shard, or 0 to evaluate every query.
+        :param query_log_file: a query log to warm up the PostingsCache of each shard with, if any.
+        :param max_expansions: the maximum number of terms a wildcard operand is expanded into in each shard.
+        :param result_ttl: the number of seconds for which a result is kept in the ResultCache of each shard, or None
+        to keep results until they are evicted.
+        '''
+        self.limit = limit
+        self.count_only = count_only
+        self.explain = explain
+        self.connections = []
+        self.workers = []
+        for dictionary_file, postings_file in shards:
+            connection, worker_connection = multiprocessing.Pipe()
+            searcher_args = (dictionary_file, postings_file, engine, cache_size, result_cache_size, limit, count_only,
+                             explain, False, max_expansions, result_ttl)
+            worker = multiprocessing.Process(target=serve_shard, args=(worker_connection, searcher_args,
+                                                                       query_log_file), daemon=True)
+            worker.start()
+            worker_connection.close()
+            self.connections.append(connection)
+            self.workers.append(worker)
+
+    def search(self, query):
+        return self.search_batch([query])[0]
+
+    def search_batch(self, queries):
+        '''
+        Returns the results of a list of queries, in order. The queries are parsed by the coordinator, and a malformed
+        query, for which the parser raises a ValueError, has an empty result without being sent to the shards.
+        '''
+        parsed = []
+        for query in queries:
+            try:
+                parsed.append(parse_query(query))
+            except ValueError:
+                parsed.append(None)
+        batch = [postfix for postfix in parsed if postfix is not None]
+        if batch:
+            for connection in self.connections:
+                connection.send(("search", batch))
+            shard_results = [connection.recv() for connection in self.connections]
+        results = []
+        position = 0
+        for postfix in parsed:
+            if postfix is None:
+                results.append("malformed query" if self.explain else 0 if self.count_only else
+                               array(DOCID_TYPECODE))
+            else:
+                results.append(self.gather([shard[position] for shard in shard_results]))
+                position += 1
+        return results
+
+    def gather(self, results):
+        '''
+        Combines the results of a query in the shards, in shard order.
+        '''
+        if self.explain:
+            return "\n".join("shard " + str(shard) + ":\n" + plan for shard, plan in enumerate(results))
+        if self.count_only:
+            return sum(results)
+        docIDs = array(DOCID_TYPECODE)
+        for result in results:
+            if self.limit is not None and len(docIDs) >= self.limit:
+                break
+            docIDs.extend(result)
+        if self.limit is not None:
+            del docIDs[self.limit:]
+        return docIDs
+
+    def search_queries(self, queries, chunk_size=DEFAULT_CHUNK_SIZE):
+        '''
+        Evaluates a stream of queries in batches of chunk_size queries, and yields their results in order.
+        '''
+        queries = iter(queries)
+        while True:
+            batch = list(islice(queries, chunk_size))
+            if not batch:
+                break
+            yield from self.search_batch(batch)
+
+    def stats(self):
+        '''
+        Returns the statistics of the PostingsCaches and of the ResultCaches of the shards (see Searcher.stats),
+        summed over the shards.
+        '''
+        for connection in self.connections:
+            connection.send(("stats", None))
+        postings_stats, results_stats = {}, None
+        for shard_postings_stats, shard_results_stats in [connection.recv() for connection in self.connections]:
+            for key, value in shard_postings_stats.items():
+                postings_stats[key] = postings_stats.get(key, 0) + value
+            if shard_results_stats is not None:
+                results_stats = results_stats or {}
+                for key, value in shard_results_stats.items():
+                    results_stats[key] = results_stats.get(key, 0) + value
+        return postings_stats, results_stats
+
+    def close(self):
+        for connection in self.connections:
+            connection.send(None)
+            connection.close()
+        for worker in self.workers:
+            worker.join()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
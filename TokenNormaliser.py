@@ -0,0 +1,76 @@
+import json
+import os
+from collections import OrderedDict
+from nltk.stem.porter import PorterStemmer
+
+class TokenNormaliser:
+    '''
+    Normalises tokens by case folding them to lowercase and stemming them with a single nltk PorterStemmer.
+    The normalised form of each token is memoised in a bounded LRU cache, since the same tokens occur
+    many times over the collection and the queries. The numbers of cache hits and misses are counted, and
+    the cache can be saved to and loaded from a file to be reused between indexing runs.
+    '''
+
+    def __init__(self, max_size=100000):
+        '''
+        :param max_size: the maximum number of tokens kept in the cache.
+        '''
+        self.stemmer = PorterStemmer()
+        self.cache = OrderedDict()
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+
+    def normalise(self, token):
+        '''
+        Returns the case folded and stemmed form of a token.
+        '''
+        cache = self.cache
+        if token in cache:
+            self.hits += 1
+            cache.move_to_end(token)
+            return cache[token]
+        self.misses += 1
+        term = self.stemmer.stem(token.lower())
+        cache[token] = term
+        if len(cache) > self.max_size:
+            cache.popitem(last=False)
+        return term
+
+    def update(self, entries):
+        '''
+        Adds (token, normalised term) entries to the cache, e.g. from the cache of another process.
+        '''
+        for token, term in entries:
+            self.cache[token] = term
+        while len(self.cache) > self.max_size:
+            self.cache.popitem(last=False)
+
+    def stats(self):
+        '''
+        Returns a dictionary of the number of cache hits, misses and entries.
+        '''
+        return {"hits": self.hits, "misses": self.misses, "size": len(self.cache)}
+
+    def load(self, cache_file):
+        '''
+        Loads the cache saved by save from cache_file, if the file exists.
+        '''
+        if os.path.exists(cache_file):
+            with open(cache_file, "r", encoding="utf-8") as file:
+                self.update(json.load(file))
+
+    def save(self, cache_file):
+        '''
+        Saves the cache to cache_file as a JSON list of [token, term] pairs, from least to most recently used.
+        '''
+        with open(cache_file, "w", encoding="utf-8") as file:
+            json.dump(list(self.cache.items()), file)
+
+normaliser = TokenNormaliser()
+
+def normalise_token(token):
+    '''
+    Normalises a token with the normaliser shared by the indexer and the query parser.
+    '''
+    return normaliser.normalise(token)
@@ -0,0 +1,49 @@
+import re
+
+# Approximates the token boundaries of nltk word_tokenize (the Treebank word tokeniser) in a single regular
+# expression: contractions and clitics are split off, numbers keep their internal commas and periods,
+# words keep their internal hyphens, periods and apostrophes, and every other punctuation mark is a token.
+# A period directly after a word is kept as part of the word, like an abbreviation, if the next word starts with
+# a lowercase letter or a digit, and is otherwise a token of its own, as nltk would split it off at the end of a
+# sentence found by sent_tokenize.
+WORD_TOKEN = re.compile(r"""
+      \w+(?=n't\b)                              # the word before n't, e.g. do in don't
+    | n't\b
+    | '(?i:s|re|ve|ll|d|m)\b                    # clitics, e.g. 's
+    | (?:[A-Za-z]\.){2,}(?!\s*$)                # abbreviations, e.g. U.S., except at the end of the text
+    | \d+(?:[.,:]\d+)+                          # numbers, e.g. 1,000.50
+    | \w+(?:(?:-|\.|'(?!(?i:s|re|ve|ll|d|m)\b))\w+)*(?:\.(?=\s+[a-z0-9]))?
+    | \.\.\.|--
+    | [^\w\s]
+""", re.VERBOSE)
+
+OPENING_CHARACTERS = " \t\r\n([{<"
+
+def nltk_tokenise(text):
+    '''
+    Tokenises a text into individual tokens using the nltk sent_tokenize and word_tokenize.
+    '''
+    from nltk.tokenize import sent_tokenize, word_tokenize
+    tokens = []
+    for sentence in sent_tokenize(text):
+        tokens += word_tokenize(sentence)
+    return tokens
+
+def regex_tokenise(text):
+    '''
+    Tokenises a text into individual tokens with the WORD_TOKEN regular expression, in a single pass over the
+    text without splitting it into sentences. Like nltk, double quotes are converted into `` when they open
+    a quotation and into '' otherwise.
+    '''
+    tokens = WORD_TOKEN.findall(text)
+    if '"' in text:
+        position = 0
+        for index, token in enumerate(tokens):
+            position = text.index(token, position)
+            if token == '"':
+                opening = position == 0 or text[position - 1] in OPENING_CHARACTERS
+                tokens[index] = "``" if opening else "''"
+            position += len(token)
+    return tokens
+
+TOKENISERS = {"nltk": nltk_tokenise, "regex": regex_tokenise}
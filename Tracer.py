@@ -0,0 +1,157 @@
+'''
+Tracing of the evaluation of queries. A Tracer collects a record of the evaluation of each query, which is passed
+to each of its callbacks when the query is done, e.g. to write it to a trace file (search.py --trace). A record is
+a dictionary of:
+    query               the query
+    stages              the milliseconds spent in each stage: tokenise (tokenise_query_to_list), postfix
+                        (infix_to_postfix), tree (postfix_to_tree), plan (QueryPlanner.plan) and execute (the
+                        execution of the plan, including the reading of the postings lists)
+    postings_ms         the milliseconds spent reading postings lists, from the PostingsCache or the index
+    merge_ms            the milliseconds spent executing the plan other than reading postings lists
+    lists_read          the number of postings lists read, and postings_read the number of document IDs in them
+    lists_decoded       the number of postings lists decoded from the index, i.e. not found in the PostingsCache,
+                        and postings_decoded and bytes_read the number of document IDs and bytes in them
+    skips, steps        the number of skip pointers followed and of single steps taken by the pairwise AND and
+                        ANDNOT merges of arrays, and the number of gallops on the skip tables and of blocks
+                        searched by the SkipLists of skewed ANDs and ANDNOTs
+    nodes               the operator, estimated size, actual size and milliseconds (including the children) of
+                        each node of the plan executed, in the order in which they are completed
+    result_size         the number of document IDs in the result
+    error               the error message of a malformed query, or None
+    total_ms            the total milliseconds spent evaluating the query
+The hooks are only called when a Tracer is set as the tracer of the BooleanEval evaluating the queries (see
+Searcher in BatchSearch.py), so that queries evaluated without a tracer pay nothing for them.
+'''
+import time
+
+class Tracer:
+    '''
+    The Tracer class records the evaluation of one query at a time, between begin and end. The evaluation functions
+    report to it through lap, for the end of a stage, node, for a node of the plan, merge_steps, for a pairwise merge,
+    and postings_read, for a postings list read by a TracingPostings.
+    '''
+
+    def __init__(self, *callbacks):
+        '''
+        :param callbacks: functions which are each called with the record of every query.
+        '''
+        self.callbacks = list(callbacks)
+        self.record = None
+
+    def add_callback(self, callback):
+        self.callbacks.append(callback)
+
+    def begin(self, query):
+        self.record = {"query": query, "stages": {}, "postings_ms": 0.0, "merge_ms": 0.0, "lists_read": 0,
+                       "postings_read": 0, "lists_decoded": 0, "postings_decoded": 0, "bytes_read": 0, "skips": 0,
+                       "steps": 0, "nodes": [], "result_size": 0, "error": None, "total_ms": 0.0}
+        self.start = self.lap_start = time.perf_counter()
+
+    def lap(self, stage):
+        '''
+        Records the end of a stage, which started at the end of the previous stage.
+        '''
+        if self.record is None:
+            return
+        now = time.perf_counter()
+        stages = self.record["stages"]
+        stages[stage] = stages.get(stage, 0.0) + (now - self.lap_start) * 1000
+        self.lap_start = now
+
+    def node(self, plan, result, seconds):
+        if self.record is not None:
+            self.record["nodes"].append({"op": plan.op, "estimated_size": int(round(plan.size)),
+                                         "size": result[0], "ms": seconds * 1000})
+
+    def merge_steps(self, skips, steps):
+        if self.record is not None:
+            self.record["skips"] += skips
+            self.record["steps"] += steps
+
+    def postings_read(self, postings_list, seconds, decoded, bytes_read):
+        '''
+        Records a postings list read, which was decoded from bytes_read bytes of the index if decoded is True.
+        '''
+        record = self.record
+        if record is None:
+            return
+        record["postings_ms"] += seconds * 1000
+        record["lists_read"] += 1
+        record["postings_read"] += len(postings_list)
+        if decoded:
+            record["lists_decoded"] += 1
+            record["postings_decoded"] += len(postings_list)
+            record["bytes_read"] += bytes_read
+
+    def end(self, result_size=0, error=None):
+        '''
+        Completes the record of the query and passes it to the callbacks.
+        '''
+        record = self.record
+        if record is None:
+            return
+        record["total_ms"] = (time.perf_counter() - self.start) * 1000
+        record["result_size"] = result_size
+        record["error"] = error
+        record["merge_ms"] = max(0.0, record["stages"].get("execute", 0.0) - record["postings_ms"])
+        for key in ["total_ms", "postings_ms", "merge_ms"]:
+            record[key] = round(record[key], 4)
+        for stage in record["stages"]:
+            record["stages"][stage] = round(record["stages"][stage], 4)
+        for node in record["nodes"]:
+            node["ms"] = round(node["ms"], 4)
+        self.record = None
+        for callback in self.callbacks:
+            callback(record)
+
+class TracingPostings:
+    '''
+    Serves the postings lists of a PostingsCache, with the same methods, reporting every postings list read to a
+    Tracer, together with the time taken to read it and, for a cache miss, the number of bytes decoded.
+    '''
+
+    def __init__(self, postings, tracer):
+        '''
+        :param postings: the PostingsCache of the index.
+        '''
+        self.postings = postings
+        self.tracer = tracer
+
+    def __contains__(self, term):
+        return term in self.postings
+
+    def freq(self, term):
+        return self.postings.freq(term)
+
+    def get(self, term):
+        return self.read(self.postings.get, term)
+
+    def skip_list(self, term):
+        '''
+        Returns the SkipList of a term, which is reported as read, but not decoded, since only some of its blocks may
+        be decoded.
+        '''
+        start = time.perf_counter()
+        skip_list = self.postings.skip_list(term)
+        if skip_list is not None:
+            self.tracer.postings_read(skip_list, time.perf_counter() - start, False, 0)
+        return skip_list
+
+    def all_docIDs(self):
+        return self.read(self.postings.all_docIDs)
+
+    def expand(self, pattern, max_expansions=None):
+        return self.postings.expand(pattern, max_expansions)
+
+    def read(self, function, *args):
+        postings = self.postings
+        misses, bytes_read = postings.misses, postings.bytes_read
+        start = time.perf_counter()
+        postings_list = function(*args)
+        seconds = time.perf_counter() - start
+        decoded = postings.bytes_read != bytes_read or postings.misses != misses
+        self.tracer.postings_read(postings_list, seconds, decoded, postings.bytes_read - bytes_read)
+        return postings_list
+
+    def terms(self):
+        return self.postings.terms()
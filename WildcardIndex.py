@@ -0,0 +1,135 @@
+'''
+Wildcard operands of queries. An operand with a "*", e.g. oil* or *pet* or *ing, is a pattern in which each "*"
+matches any sequence of characters, and which stands for the union of the postings lists of the terms of the
+dictionary which it matches. Patterns are case folded, but not stemmed, since the terms they match are stems.
+
+The terms which match a pattern are found without scanning the dictionary:
+- a prefix pattern, e.g. oil*, matches the range of the sorted terms which starts at the prefix, which is found by a
+  binary search on the terms of the dictionary (see BinaryDictionary.terms_from).
+- any other pattern is matched with a k-gram index of the terms, which maps each gram (the substrings of 1 to
+  KGRAM_SIZE characters) of the terms, padded with BOUNDARY at both ends, to the sorted array of the numbers of the
+  terms which contain it. The terms which contain all the k-grams of the pattern, or the whole of each part of the
+  pattern which is shorter than a k-gram, are its candidates, which are then checked against the pattern, e.g. *pet*
+  has the candidates with the k-gram "pet", *ing the candidates with "ing" and "ng" followed by BOUNDARY, and a*b*
+  the candidates with BOUNDARY followed by "a", and with "b".
+The k-gram index is built in memory from the dictionary the first time it is needed.
+'''
+import re
+from array import array
+from bisect import bisect_left
+from itertools import islice, takewhile
+from Dictionary import BinaryDictionary
+
+WILDCARD = "*"
+KGRAM_SIZE = 3
+INTERSECT_FACTOR = 16 # the candidates are not intersected with the lists of grams more than this many times longer
+BOUNDARY = "\x00"
+TERM_NUMBER_TYPECODE = "I"
+DEFAULT_MAX_EXPANSIONS = 1000
+
+def is_wildcard(term):
+    return WILDCARD in term
+
+def pattern_regex(pattern):
+    '''
+    Returns the compiled regular expression which fully matches the terms matched by a pattern.
+    '''
+    return re.compile(".*".join(re.escape(part) for part in pattern.split(WILDCARD)), re.DOTALL)
+
+def kgrams(string):
+    '''
+    Returns the set of the k-grams of a string.
+    '''
+    return {string[start:start + KGRAM_SIZE] for start in range(len(string) - KGRAM_SIZE + 1)}
+
+def grams(string):
+    '''
+    Returns the set of the substrings of a string of 1 to KGRAM_SIZE characters.
+    '''
+    return {string[start:start + size] for size in range(1, KGRAM_SIZE + 1) for start in range(len(string) - size + 1)}
+
+class WildcardIndex:
+    '''
+    The WildcardIndex class finds the terms of a dictionary which match a pattern, at most max_expansions of them, in
+    the sorted order of the terms.
+    '''
+
+    def __init__(self, dictionary):
+        '''
+        :param dictionary: a dictionary or a BinaryDictionary mapping each term to a (frequency, term_pointer) tuple.
+        '''
+        self.dictionary = dictionary
+        self.terms = None
+        self.grams = None
+
+    def sorted_terms(self):
+        '''
+        Returns the list of the terms of the dictionary, sorted, which is read from the dictionary once.
+        '''
+        if self.terms is None:
+            self.terms = sorted(self.dictionary)
+        return self.terms
+
+    def terms_from(self, term):
+        '''
+        Returns an iterator over the sorted terms of the dictionary from term.
+        '''
+        if isinstance(self.dictionary, BinaryDictionary):
+            return self.dictionary.terms_from(term)
+        terms = self.sorted_terms()
+        return islice(terms, bisect_left(terms, term), None)
+
+    def kgram_index(self):
+        '''
+        Returns the k-gram index of the terms, a dictionary mapping each gram of 1 to KGRAM_SIZE characters to the
+        sorted array of the numbers of the terms which contain it, building it the first time it is needed.
+        '''
+        if self.grams is None:
+            index = {}
+            for number, term in enumerate(self.sorted_terms()):
+                for gram in grams(BOUNDARY + term + BOUNDARY):
+                    if gram not in index:
+                        index[gram] = array(TERM_NUMBER_TYPECODE)
+                    index[gram].append(number)
+            self.grams = index
+        return self.grams
+
+    def candidates(self, pattern):
+        '''
+        Returns the sorted list of the numbers of the candidate terms of a pattern, which contain all the k-grams of
+        its parts, and the whole of its parts which are shorter than a k-gram. The lists of the grams are intersected
+        from the shortest, and the longer lists, e.g. those of single letters, are left out once they are more than
+        INTERSECT_FACTOR times longer than the candidates, since the candidates are checked against the pattern anyway.
+        '''
+        index = self.kgram_index()
+        lists = []
+        for part in (BOUNDARY + pattern + BOUNDARY).split(WILDCARD):
+            if part in ["", BOUNDARY]:
+                continue
+            for gram in (kgrams(part) if len(part) >= KGRAM_SIZE else [part]):
+                if gram not in index:
+                    return []
+                lists.append(index[gram])
+        if not lists:
+            return range(len(self.sorted_terms()))
+        lists.sort(key=len)
+        candidates = set(lists[0])
+        for numbers in lists[1:]:
+            if not candidates or len(numbers) > INTERSECT_FACTOR * len(candidates):
+                break
+            candidates.intersection_update(numbers)
+        return sorted(candidates)
+
+    def expand(self, pattern, max_expansions=DEFAULT_MAX_EXPANSIONS):
+        '''
+        Returns the sorted list of the terms which match a pattern, cut to the first max_expansions terms, or all of
+        them if max_expansions is None.
+        '''
+        prefix = pattern.split(WILDCARD, 1)[0]
+        if pattern == prefix + WILDCARD:
+            terms = takewhile(lambda term: term.startswith(prefix), self.terms_from(prefix))
+            return list(islice(terms, max_expansions))
+        regex = pattern_regex(pattern)
+        terms = self.sorted_terms()
+        matches = (terms[number] for number in self.candidates(pattern) if regex.fullmatch(terms[number]))
+        return list(islice(matches, max_expansions))
@@ -0,0 +1,350 @@
+#!/usr/bin/python
+import sys
+import getopt
+import os
+import io
+import json
+import time
+import timeit
+import random
+import shutil
+import platform
+import tempfile
+import subprocess
+from array import array
+from itertools import accumulate
+import PostingsFormat
+import Dictionary
+from Bitmap import Bitmap
+from BooleanEval import ENGINES
+from BatchSearch import Searcher
+from PostingsFormat import DOCID_TYPECODE
+from Reordering import ORDERS
+from Corpus import open_corpus
+
+def usage():
+    print("usage: " + sys.argv[0] + " [-b micro,index,query,reorder] [-i directory-or-file-of-documents]"
+          + " [-q file-of-queries] [-n number-of-documents] [-v vocabulary-size] [-l words-per-document]"
+          + " [-z zipf-exponent]"
+          + " [-m number-of-queries] [-k max-query-depth] [-x not-probability] [-u micro-universe-size]"
+          + " [-e engine,...] [-t nltk|regex] [-s seed] [-w work-directory] [-o output-json-file]")
+
+BENCHMARKS = ["micro", "index", "query", "reorder"]
+SIZE_RATIOS = [1, 10, 100, 1000]
+PERCENTILES = [50, 90, 99]
+CONSONANTS = "bcdfghjklmnprstvwz"
+VOWELS = "aeiou"
+
+def main():
+    '''
+    Runs the benchmarks given by -b and writes their results as a JSON object, to the file given by -o or to
+    standard output, together with the configuration of the run, so that runs on different index formats, engines
+    or versions of the code can be compared. All the random choices are drawn from a generator seeded by -s, so that
+    a run with the same options generates the same corpus, queries and lists.
+    - micro: the time of the AND, OR, ANDNOT and NOT merges of each engine, for pairs of random postings lists whose
+      lengths differ by each of SIZE_RATIOS, with the longer list as an array and as a Bitmap.
+    - index: the time, peak memory and index size of a run of index.py on the corpus.
+    - query: the queries per second and the latency percentiles of each engine on the queries, over a first pass
+      with an empty postings cache and a second pass with a warm cache. The result cache is disabled.
+    - reorder: the index and query benchmarks of the corpus indexed with its original docIDs and with each of the
+      docID ORDERS of index.py -r (see Reordering.py).
+    The corpus is the directory given by -i, or otherwise a synthetic corpus (see generate_corpus), and the queries
+    are the file given by -q, or otherwise synthetic queries (see generate_query).
+    '''
+    work_directory = work_path or tempfile.mkdtemp()
+    try:
+        report = {"config": config(), "results": {}}
+        rng = random.Random(seed)
+        vocabulary = generate_vocabulary(vocabulary_size, rng)
+        if "micro" in benchmarks:
+            report["results"]["micro"] = benchmark_operators(random.Random(seed))
+        dictionary_file = os.path.join(work_directory, "dictionary.txt")
+        postings_file = os.path.join(work_directory, "postings.txt")
+        if "index" in benchmarks or "query" in benchmarks or "reorder" in benchmarks:
+            corpus_path = input_directory
+            if corpus_path is None:
+                corpus_path = os.path.join(work_directory, "corpus")
+                generate_corpus(corpus_path, vocabulary, rng)
+            report["results"]["index"] = benchmark_indexing(corpus_path, dictionary_file, postings_file)
+        if "query" in benchmarks or "reorder" in benchmarks:
+            if file_of_queries is not None:
+                with open(file_of_queries, "r") as file:
+                    queries = [line.strip() for line in file if line.strip()]
+            else:
+                weights = zipf_weights(len(vocabulary))
+                queries = [generate_query(vocabulary, weights, rng, max_depth) for _ in range(number_of_queries)]
+        if "query" in benchmarks:
+            report["results"]["query"] = benchmark_queries(dictionary_file, postings_file, queries)
+        if "reorder" in benchmarks:
+            results = [{"order": "none", "index": report["results"]["index"],
+                        "query": report["results"].get("query") or
+                        benchmark_queries(dictionary_file, postings_file, queries)}]
+            for order in ORDERS:
+                order_dictionary_file = os.path.join(work_directory, "dictionary." + order + ".txt")
+                order_postings_file = os.path.join(work_directory, "postings." + order + ".txt")
+                results.append({"order": order,
+                                "index": benchmark_indexing(corpus_path, order_dictionary_file, order_postings_file,
+                                                            order),
+                                "query": benchmark_queries(order_dictionary_file, order_postings_file, queries)})
+            report["results"]["reorder"] = results
+    finally:
+        if work_path is None:
+            shutil.rmtree(work_directory)
+    text = json.dumps(report, indent=2, sort_keys=True)
+    if output_file is None:
+        print(text)
+    else:
+        with open(output_file, "w") as file:
+            file.write(text + "\n")
+
+def config():
+    '''
+    Returns the configuration of the run: the options, the versions of the index formats and of python.
+    '''
+    return {"benchmarks": benchmarks, "seed": seed, "documents": number_of_documents,
+            "vocabulary_size": vocabulary_size, "words_per_document": words_per_document,
+            "zipf_exponent": zipf_exponent, "queries": number_of_queries, "max_query_depth": max_depth,
+            "not_probability": not_probability, "micro_universe_size": universe_size, "engines": engines,
+            "tokeniser": tokeniser, "corpus": input_directory, "query_file": file_of_queries,
+            "postings_format_version": PostingsFormat.VERSION, "dictionary_format_version": Dictionary.VERSION,
+            "python": platform.python_version(), "platform": platform.platform(),
+            "time": time.strftime("%Y-%m-%dT%H:%M:%S")}
+
+def generate_vocabulary(size, rng):
+    '''
+    Returns a list of size distinct pseudo-words made of consonant-vowel syllables, in the order of their rank.
+    '''
+    vocabulary = []
+    seen = set()
+    while len(vocabulary) < size:
+        word = "".join(rng.choice(CONSONANTS) + rng.choice(VOWELS) for _ in range(rng.randint(2, 4)))
+        if word not in seen:
+            seen.add(word)
+            vocabulary.append(word)
+    return vocabulary
+
+def zipf_weights(size):
+    '''
+    Returns the cumulative weights of the ranks 1 to size under a Zipfian distribution, for random.choices.
+    '''
+    return list(accumulate(1.0 / rank ** zipf_exponent for rank in range(1, size + 1)))
+
+def generate_corpus(corpus_path, vocabulary, rng):
+    '''
+    Writes number_of_documents documents named by their docIDs from 1 into the corpus directory. Each document
+    has words_per_document words drawn from the vocabulary with a Zipfian distribution over their ranks, and is
+    split into sentences of ten words.
+    '''
+    if os.path.exists(corpus_path):
+        shutil.rmtree(corpus_path)
+    os.makedirs(corpus_path)
+    weights = zipf_weights(len(vocabulary))
+    for docID in range(1, number_of_documents + 1):
+        words = rng.choices(vocabulary, cum_weights=weights, k=words_per_document)
+        sentences = [" ".join(words[start:start + 10]) + "." for start in range(0, len(words), 10)]
+        with io.open(os.path.join(corpus_path, str(docID)), mode="w", encoding="utf-8") as file:
+            file.write(" ".join(sentences) + "\n")
+
+def generate_query(vocabulary, weights, rng, depth):
+    '''
+    Returns a random boolean query of at most the given depth of nesting. The terms are drawn from the vocabulary
+    with a Zipfian distribution, every operand is negated with probability not_probability, and the operands of
+    each operator are parenthesised.
+    '''
+    if depth == 0 or rng.random() < 0.3:
+        query = rng.choices(vocabulary, cum_weights=weights)[0]
+    else:
+        operator = " " + rng.choice(["AND", "OR"]) + " "
+        operands = [generate_query(vocabulary, weights, rng, depth - 1) for _ in range(rng.randint(2, 3))]
+        query = "( " + operator.join(operands) + " )"
+    if rng.random() < not_probability:
+        query = "NOT " + query
+    return query
+
+def available_engines(names):
+    '''
+    Returns the engines whose dependencies are installed, leaving out e.g. the numpy engine without numpy.
+    '''
+    available = []
+    for name in names:
+        try:
+            ENGINES[name](None)
+            available.append(name)
+        except ImportError:
+            sys.stderr.write("skipping the " + name + " engine, which is not installed\n")
+    return available
+
+def time_call(function):
+    '''
+    Returns the best time in seconds of a call of function, over three repeats of enough calls to take at least
+    0.2 seconds.
+    '''
+    timer = timeit.Timer(function)
+    number, _ = timer.autorange()
+    return min(timer.repeat(repeat=3, number=number)) / number
+
+def benchmark_operators(rng):
+    '''
+    Times the merges of each engine on pairs of random postings lists drawn from a universe of universe_size
+    document IDs. The longer list holds a quarter of the universe and the shorter list is shorter by each of
+    SIZE_RATIOS. NOT is the complement of the shorter list.
+    '''
+    universe = Bitmap.from_docIDs(range(1, universe_size + 1))
+    long_size = universe_size // 4
+    results = []
+    for ratio in SIZE_RATIOS:
+        short_size = max(1, long_size // ratio)
+        long_list = array(DOCID_TYPECODE, sorted(rng.sample(range(1, universe_size + 1), long_size)))
+        short_list = array(DOCID_TYPECODE, sorted(rng.sample(range(1, universe_size + 1), short_size)))
+        for layout in ["array", "bitmap"]:
+            listA = (long_size, long_list if layout == "array" else Bitmap.from_docIDs(long_list))
+            listB = (short_size, short_list)
+            for name in engines:
+                evaluator = ENGINES[name](None)
+                evaluator.universe = universe
+                operations = {"AND": lambda: evaluator.AND_lists([listB, listA]),
+                              "OR": lambda: evaluator.OR_lists([listB, listA]),
+                              "ANDNOT": lambda: evaluator.ANDNOT_lists(listA, [listB]),
+                              "NOT": lambda: evaluator.NOT(listB)}
+                for operator, function in operations.items():
+                    seconds = time_call(function)
+                    results.append({"engine": name, "operator": operator, "ratio": ratio, "long_list": layout,
+                                    "long_size": long_size, "short_size": short_size,
+                                    "microseconds": round(seconds * 1e6, 3)})
+    return results
+
+def benchmark_indexing(corpus_path, dictionary_file, postings_file, order=None):
+    '''
+    Indexes the corpus with index.py in a child process, with new docIDs in the given order if any, and returns its
+    wall clock time, its peak resident memory, where the platform reports it, and the sizes of the index files.
+    The peak memory is that of this child alone, from the resource usage returned when it is waited for, rather
+    than the largest peak of all the children of the benchmark so far.
+    '''
+    command = [sys.executable, os.path.join(os.path.dirname(os.path.abspath(__file__)), "index.py"),
+               "-i", corpus_path, "-d", dictionary_file, "-p", postings_file, "-t", tokeniser]
+    if order is not None:
+        command += ["-r", order]
+    start = time.perf_counter()
+    process = subprocess.Popen(command)
+    usage = None
+    if hasattr(os, "wait4"): # not available on Windows
+        pid, status, usage = os.wait4(process.pid, 0)
+        process.returncode = os.waitstatus_to_exitcode(status)
+    else:
+        process.wait()
+    seconds = time.perf_counter() - start
+    if process.returncode:
+        raise subprocess.CalledProcessError(process.returncode, command)
+    result = {"documents": count_documents(corpus_path), "seconds": round(seconds, 3),
+              "dictionary_bytes": os.path.getsize(dictionary_file), "postings_bytes": os.path.getsize(postings_file)}
+    if usage is not None:
+        # ru_maxrss is in kilobytes on linux and in bytes on macOS
+        result["peak_memory_bytes"] = usage.ru_maxrss if sys.platform == "darwin" else usage.ru_maxrss * 1024
+    return result
+
+def count_documents(corpus_path):
+    '''
+    Returns the number of documents of a corpus in any of the input formats of index.py (see Corpus.py).
+    '''
+    corpus = open_corpus(corpus_path)
+    if hasattr(corpus, "__len__"):
+        return len(corpus)
+    return sum(1 for document in corpus.documents())
+
+def percentile(values, percent):
+    '''
+    Returns the nearest rank percentile of a sorted list of values.
+    '''
+    if not values:
+        return 0.0
+    return values[min(len(values) - 1, max(0, -(-len(values) * percent // 100) - 1))]
+
+def benchmark_queries(dictionary_file, postings_file, queries):
+    '''
+    Evaluates the queries with each engine, twice, timing each query, and returns the queries per second and the
+    latency percentiles in milliseconds of each pass.
+    '''
+    results = []
+    for name in engines:
+        with Searcher(dictionary_file, postings_file, name, result_cache_size=0) as searcher:
+            for run in ["cold", "warm"]:
+                latencies = []
+                total = time.perf_counter()
+                for query in queries:
+                    start = time.perf_counter()
+                    searcher.search(query)
+                    latencies.append(time.perf_counter() - start)
+                total = time.perf_counter() - total
+                latencies.sort()
+                result = {"engine": name, "run": run, "queries": len(queries),
+                          "qps": round(len(queries) / total, 1) if total else None,
+                          "mean_ms": round(1000 * sum(latencies) / max(1, len(latencies)), 4),
+                          "max_ms": round(1000 * latencies[-1], 4) if latencies else 0.0}
+                for percent in PERCENTILES:
+                    result["p" + str(percent) + "_ms"] = round(1000 * percentile(latencies, percent), 4)
+                results.append(result)
+    return results
+
+benchmarks = list(BENCHMARKS)
+input_directory = file_of_queries = output_file = work_path = None
+number_of_documents = 2000
+vocabulary_size = 20000
+words_per_document = 150
+zipf_exponent = 1.0
+number_of_queries = 1000
+max_depth = 3
+not_probability = 0.2
+universe_size = 100000
+engines = [name for name in ENGINES]
+tokeniser = "nltk"
+seed = 1
+
+if __name__ == "__main__":
+    try:
+        opts, args = getopt.getopt(sys.argv[1:], 'b:i:q:n:v:l:z:m:k:x:u:e:t:s:w:o:')
+    except getopt.GetoptError as err:
+        usage()
+        sys.exit(2)
+
+    for o, a in opts:
+        if o == '-b': # benchmarks to run
+            benchmarks = a.split(",")
+        elif o == '-i': # corpus to index instead of a synthetic corpus
+            input_directory = a
+        elif o == '-q': # queries to evaluate instead of synthetic queries
+            file_of_queries = a
+        elif o == '-n': # number of documents in the synthetic corpus
+            number_of_documents = int(a)
+        elif o == '-v': # number of distinct words in the synthetic corpus
+            vocabulary_size = int(a)
+        elif o == '-l': # number of words in each synthetic document
+            words_per_document = int(a)
+        elif o == '-z': # exponent of the Zipfian distribution of the words
+            zipf_exponent = float(a)
+        elif o == '-m': # number of synthetic queries
+            number_of_queries = int(a)
+        elif o == '-k': # maximum depth of nesting of the synthetic queries
+            max_depth = int(a)
+        elif o == '-x': # probability of negating each operand of the synthetic queries
+            not_probability = float(a)
+        elif o == '-u': # number of document IDs from which the lists of the micro-benchmarks are drawn
+            universe_size = int(a)
+        elif o == '-e': # engines to benchmark
+            engines = a.split(",")
+        elif o == '-t': # tokeniser used by index.py
+            tokeniser = a
+        elif o == '-s': # seed of the random generator
+            seed = int(a)
+        elif o == '-w': # directory in which the corpus and the index are kept, instead of a temporary directory
+            work_path = a
+        elif o == '-o': # JSON file to write the results to
+            output_file = a
+        else:
+            assert False, "unhandled option"
+
+    if any(name not in ENGINES for name in engines) or any(name not in BENCHMARKS for name in benchmarks):
+        usage()
+        sys.exit(2)
+    engines = available_engines(engines)
+
+    main()
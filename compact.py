@@ -0,0 +1,68 @@
+#!/usr/bin/python
+import sys
+import getopt
+import os
+from IndexWriter import IndexWriter
+from PostingsFormat import DEFAULT_BLOCK_SIZE
+from SegmentedIndex import SegmentedIndex, open_index, clear_segments, index_lock, publishing
+from ShardedIndex import read_shards
+
+def usage():
+    print("usage: " + sys.argv[0] + " -d dictionary-file -p postings-file [-b bitmap-df-threshold] [-k postings-per-skip-block]")
+
+def main():
+    '''
+    Compacts an index with delta segments or deleted documents (see SegmentedIndex.py) into a single base segment.
+    The live postings list of every term over all the segments is written to new dictionary and postings files,
+    which then replace the base segment, and the delta segments and tombstones are removed. The index is locked
+    while it is compacted, so that index.py -a and -x cannot change it in the meantime, but it can still be searched,
+    since the files of the old base segment stay readable by the processes which have opened them. The files of the
+    index are replaced while the publish file of the index is held (see SegmentedIndex.publishing), so that a search
+    which opens the index meanwhile waits for the new base segment rather than opening the new postings file with
+    the old dictionary or the old delta segments.
+    The postings lists keep the block size of the base segment, unless another one is given by -k.
+    '''
+    with index_lock(postings_file):
+        index = open_index(dictionary_file, postings_file)
+        base = index.stores[0] if isinstance(index, SegmentedIndex) else index
+        writer = IndexWriter(dictionary_file + ".compact", postings_file + ".compact", list(index.all_docIDs()),
+                             bitmap_threshold, block_size or base.block_size or DEFAULT_BLOCK_SIZE)
+        for term in index.terms():
+            docIDs = index.get(term)
+            if len(docIDs):
+                writer.add(term, list(docIDs))
+        writer.close()
+        index.close()
+        with publishing(postings_file):
+            os.replace(postings_file + ".compact", postings_file)
+            os.replace(dictionary_file + ".compact", dictionary_file)
+            clear_segments(postings_file)
+
+dictionary_file = postings_file = bitmap_threshold = block_size = None
+
+try:
+    opts, args = getopt.getopt(sys.argv[1:], 'd:p:b:k:')
+except getopt.GetoptError as err:
+    usage()
+    sys.exit(2)
+
+for o, a in opts:
+    if o == '-d':
+        dictionary_file = a
+    elif o == '-p':
+        postings_file = a
+    elif o == '-b': # document frequency from which postings are stored as bitmaps
+        bitmap_threshold = int(a)
+    elif o == '-k': # number of postings in each block, i.e. the skip interval
+        block_size = int(a)
+    else:
+        assert False, "unhandled option"
+
+if dictionary_file == None or postings_file == None:
+    usage()
+    sys.exit(2)
+if read_shards(postings_file):
+    print(sys.argv[0] + ": a sharded index has no segments to compact")
+    sys.exit(2)
+
+main()
@@ -1,271 +1,475 @@
 #!/usr/bin/python
 import re
-from nltk.stem.porter import PorterStemmer
-from nltk.tokenize import sent_tokenize, word_tokenize
 import sys
 import getopt
 import os
-import io
-import math
+import heapq
+import shutil
+import tempfile
+import multiprocessing
+from array import array
+from bisect import bisect_left, bisect_right
+from collections import deque
+from itertools import groupby, islice
+from TokenNormaliser import normaliser, normalise_token
+from Tokenisers import TOKENISERS
+from PostingsFormat import encode_postings, decode_postings, encode_varint, decode_varint, DEFAULT_BLOCK_SIZE, \
+    DOCID_TYPECODE
+from IndexWriter import IndexWriter
+from SegmentedIndex import open_index, new_segment_files, add_segment, add_deleted, clear_segments, index_lock
+from ShardedIndex import read_shards, write_shards, shard_files, clear_shards, partition
+from Reordering import ORDERS, document_order, write_docid_map, read_docid_map, remove_docid_map
+from Corpus import FORMATS, open_corpus, pipeline
 
 def usage():
-    print("usage: " + sys.argv[0] + " -i directory-of-documents -d dictionary-file -p postings-file")
+    print("usage: " + sys.argv[0] + " -i directory-or-file-of-documents -d dictionary-file -p postings-file"
+          + " [-f dir|tar|jsonl|records] [-a] [-b bitmap-df-threshold] [-m memory-budget-in-MB]"
+          + " [-j number-of-processes] [-c stem-cache-file] [-t nltk|regex] [-k postings-per-skip-block]"
+          + " [-s number-of-shards] [-r compact|bisect]")
+    print("       " + sys.argv[0] + " -x file-of-deleted-docIDs -d dictionary-file -p postings-file")
 
-helper_postings_file = "helper_postings.txt"
+# rough number of bytes of memory used by each posting and each term in an in-memory block
+POSTING_BYTES = 4
+TERM_BYTES = 120
+RUN_BUFFER_SIZE = 1024 * 1024
+BATCH_SIZE = 3000 # maximum number of documents in a batch indexed by a worker process
+PENDING_BATCHES = 2 # number of batches read ahead for each worker process
 
 def main():
     '''
-    Creates the index. Firstly, the file names in the file directory are sorted.
-    Next, a global postings list of all the documents are written to the start of the postings file.
-    Then, we retrieve a list of all the terms in the documents. This is used to create helper
-    dictionaries. The freq_dictionary stores the current number of documents for each term, and
-    the pointer_dictionary stores the pointers to the end of each postings list in the helper postings file.
+    Creates the index in a single pass over the collection using single-pass in-memory indexing (SPIMI).
+    The documents are read from the collection given by -i, in the format given by -f or guessed from the path:
+    a directory of files named by their docIDs, a tar archive, a JSONL file or a file of concatenated records
+    (see Corpus.py). They are read sequentially by a producer thread, which passes them through a bounded queue to
+    the tokeniser (see Corpus.pipeline).
 
-    The files are then split into batches for indexing. A helper postings file is written padded with '.' characters
-    such that writing directly to a specific position is possible. Each batch of files is then processed,
-    with additional postings appended to each postings list in the helper file in each iteration. This also
-    updates the freq_dictionary and the pointer_dictionary as postings are appended.
+    Each document is read and tokenised once, and its docID is appended to the postings list of each of its
+    terms in an in-memory block. Whenever the estimated size of the block exceeds the memory budget, the block is
+    sorted by term and spilled to a temporary run file (see spimi_invert). When the documents are read in docID
+    order, as from a directory, the postings list of a term in each run only holds docIDs larger than those in the
+    previous runs.
 
-    When all the postings have been written into the helper file, the postings in the helper file are processed
-    and inserted with skip pointers before being written to postings.txt. The byte address of the start of
-    each list is recorded in a dictionary together with the length of the postings list. This information is written
-    to dictionary.txt.
+    Finally, the runs are merged with a k-way merge on the terms, concatenating the postings lists of each term from
+    the runs in order, which are only sorted again if the documents were not read in docID order. The postings file
+    header and a global postings list of all the documents are written to the start of the postings file, followed
+    by the postings list of each term. Each merged postings list is encoded in the binary postings format
+    (see PostingsFormat.py) and written to postings.txt, as a bitmap if its document frequency is at least the
+    bitmap threshold. The byte address of the start of each list is recorded in a dictionary together with the
+    length of the postings list. This information is written to dictionary.txt.
+
+    Documents are tokenised with the tokeniser given by -t, either nltk (the default) or regex, a faster single
+    regular expression approximating the nltk token boundaries (see Tokenisers.py).
+    The postings lists are split into blocks of -k postings (128 by default), the interval of their skip tables.
+    Tokens are normalised with the shared TokenNormaliser, whose stem cache is loaded from and saved to the file
+    given by -c, if any.
+
+    With -j N, the documents are split into batches which are indexed into runs by a pool of N processes
+    (see parallel_invert). Merging the runs of all the batches in batch order gives the same index as indexing the
+    documents in a single process.
+
+    With -a, only the documents which are not in the existing index are indexed, into a new delta segment of the
+    index, and with -x, the documents listed in the given file are deleted from the existing index
+    (see SegmentedIndex.py). compact.py folds the segments back into a single index.
+
+    With -s N, the collection is partitioned into N shards of consecutive docIDs, each written into its own
+    dictionary and postings files from the runs of the whole collection (see build_shards and ShardedIndex.py).
+    A sharded index cannot be updated with -a or -x, and is rebuilt instead.
+
+    With -r, the documents are given new consecutive docIDs in the given order (see Reordering.py) before the
+    postings lists are written, and the original docIDs are kept in a docID map, to which search.py maps the
+    results back. A reordered index cannot be updated with -a or -x either.
     '''
-    corpus_path = input_directory if input_directory[-1] == "/" else input_directory + "/"
-    files = os.listdir(corpus_path)
-    files.sort(key=lambda x: int(x))
-    max_postings_line_length = print_all_docIDs(files)
-    all_terms = get_all_terms(corpus_path, files)
-    pointer_dictionary, line_to_term_dic = create_helper_dictionaries(all_terms, max_postings_line_length)
+    if (add_documents or deleted_docIDs_file) and read_shards(output_file_postings):
+        print(sys.argv[0] + ": -a and -x are not supported on a sharded index")
+        sys.exit(2)
+    if (add_documents or deleted_docIDs_file) and read_docid_map(output_file_postings) is not None:
+        print(sys.argv[0] + ": -a and -x are not supported on a reordered index")
+        sys.exit(2)
+    if deleted_docIDs_file:
+        with open(deleted_docIDs_file, "r") as file:
+            docIDs = [int(docID) for docID in file.read().split()]
+        with index_lock(output_file_postings):
+            add_deleted(output_file_postings, docIDs)
+        return
+    if stem_cache_file:
+        normaliser.load(stem_cache_file)
+    try:
+        corpus = open_corpus(input_path, input_format)
+        if add_documents:
+            with index_lock(output_file_postings):
+                with open_index(output_file_dictionary, output_file_postings) as index:
+                    live_docIDs = set(index.all_docIDs())
+                dictionary_file, postings_file = new_segment_files(output_file_dictionary, output_file_postings)
+                if build_index(corpus, dictionary_file, postings_file, live_docIDs):
+                    add_segment(output_file_postings, dictionary_file, postings_file)
+        elif shards > 1:
+            clear_segments(output_file_postings)
+            build_shards(corpus, output_file_dictionary, output_file_postings, shards)
+        else:
+            clear_shards(output_file_postings)
+            build_index(corpus, output_file_dictionary, output_file_postings)
+            clear_segments(output_file_postings)
+    except ValueError as error:
+        print(sys.argv[0] + ": " + str(error))
+        sys.exit(2)
+    if stem_cache_file:
+        normaliser.save(stem_cache_file)
+        stats = normaliser.stats()
+        sys.stderr.write("stem cache: " + str(stats["hits"]) + " hits, " + str(stats["misses"]) + " misses, "
+                         + str(stats["size"]) + " entries\n")
 
-    file_batches = [files[i:i + 3000] for i in range(0, len(files), 3000)] # split into batches
-    freq_dictionary = {}
-    open(helper_postings_file, "w").close()
-    file = open(helper_postings_file, 'r+')
-    file.write("." * max_postings_line_length * len(all_terms)) # write helper file
-    pointer_dictionary, freq_dictionary = process_file_batches(file_batches, corpus_path,
-                                                               pointer_dictionary, freq_dictionary) # process batches
+def build_index(corpus, dictionary_file, postings_file, skip_docIDs=None):
+    '''
+    Indexes the documents of a collection into the given dictionary and postings files (see main and write_index).
+    :param corpus: the input adapter of the collection (see Corpus.py).
+    :param skip_docIDs: the set of the docIDs of the documents which are not indexed, if any, e.g. those already in
+    the index. If it is given and no other document is found, no index is written.
+    :return: the sorted list of the docIDs of the indexed documents.
+    '''
+    run_directory = tempfile.mkdtemp(dir=os.path.dirname(os.path.abspath(postings_file)))
+    try:
+        run_files, block, docIDs = invert(corpus, run_directory, skip_docIDs)
+        if docIDs or skip_docIDs is None:
+            write_index(run_files, block, docIDs, dictionary_file, postings_file)
+    finally:
+        shutil.rmtree(run_directory)
+    return docIDs
 
-    # convert postings in helper file to postings.txt
-    final_dictionary = convert_raw_postings(pointer_dictionary, line_to_term_dic, freq_dictionary)
-    print_dictionary(final_dictionary) # print to dictionary.txt
-    os.remove(helper_postings_file)
+def build_shards(corpus, dictionary_file, postings_file, count):
+    '''
+    Indexes the documents of a collection into runs once, partitions their docIDs into count shards of consecutive
+    docIDs, and writes each shard into its own dictionary and postings files from the postings of its docID range in
+    the runs (see write_index), which are then listed in the shards file of the index. The dictionary and postings
+    files of an unsharded index previously written to the same files are removed, since they are replaced by the
+    shards.
+    '''
+    clear_shards(postings_file)
+    run_directory = tempfile.mkdtemp(dir=os.path.dirname(os.path.abspath(postings_file)))
+    try:
+        run_files, block, docIDs = invert(corpus, run_directory)
+        ranges = partition(docIDs, count)
+        shards = shard_files(dictionary_file, postings_file, len(ranges))
+        for (shard_dictionary_file, shard_postings_file), range_docIDs in zip(shards, ranges):
+            write_index(run_files, block, range_docIDs, shard_dictionary_file, shard_postings_file)
+    finally:
+        shutil.rmtree(run_directory)
+    write_shards(postings_file, shards)
+    remove_docid_map(postings_file)
+    for path in [dictionary_file, postings_file]:
+        if os.path.exists(path):
+            os.remove(path)
 
-def normalise_token(token):
+def invert(corpus, run_directory, skip_docIDs=None):
     '''
-    Normalises tokens using the nltk PorterStemmer and case folds token to lowercase.
+    Reads the documents of a collection in a single pass and indexes them into runs, in this process through the
+    pipeline of Corpus.py, or with a pool of processes if -j is given (see parallel_invert).
+    :param skip_docIDs: the set of the docIDs of the documents which are not indexed, if any.
+    :return: a list of the run files, the block left in memory, which follows the run files, and the sorted list of
+    the docIDs of the indexed documents.
     '''
-    token = token.lower()
-    stemmer = PorterStemmer()
-    token = stemmer.stem(token)
-    return token
+    docIDs = []
+    documents = unique_documents(corpus.documents(), docIDs, skip_docIDs or ())
+    if jobs > 1:
+        count = len(corpus) if hasattr(corpus, "__len__") else None
+        run_files = parallel_invert(documents, run_directory, memory_budget, tokeniser, jobs, bool(stem_cache_file),
+                                    count)
+        block = {}
+    else:
+        run_files, block = spimi_invert(pipeline(documents), run_directory, memory_budget, tokeniser)
+    docIDs.sort()
+    return run_files, block, docIDs
 
-def get_all_terms(corpus_path, files):
+def unique_documents(documents, docIDs, skip_docIDs=()):
     '''
-    Returns a set of all unique terms in the whole collection.
-    :param corpus_path: the path to the document collection
-    :param files: a list of all document IDs
+    Filters a stream of (docID, text) documents, leaving out the documents in skip_docIDs, and appends the docID of
+    each of the other documents to docIDs. A ValueError is raised if a docID is repeated.
     '''
-    all_terms = {}
-    for fileID in files:
-        file = corpus_path + fileID
-        lines = io.open(file, mode="r", encoding="utf-8")
-        file_lexicon = process_file_to_lexicon(lines)
-        for word in file_lexicon:
-            if word not in all_terms:
-                all_terms[word] = 0
-    return all_terms
+    seen = set()
+    for docID, text in documents:
+        if docID in skip_docIDs:
+            continue
+        if docID in seen:
+            raise ValueError("duplicate document ID " + str(docID))
+        seen.add(docID)
+        docIDs.append(docID)
+        yield (docID, text)
+
+def write_index(run_files, block, docIDs, dictionary_file, postings_file):
+    '''
+    Merges the runs into the given dictionary and postings files, keeping only the postings of the range of docIDs
+    from the first to the last of docIDs. If an order is given by -r, the documents are given new docIDs in that
+    order (see Reordering.py), which are written to the postings file instead of the original docIDs, and the
+    original docIDs are written to the docID map of the index. The terms of the documents, for the orders which
+    depend on them, are read from a first merge of the runs, before the runs are merged again into the postings file.
+    :param docIDs: a sorted list of the document IDs to be indexed.
+    '''
+    docID_range = (docIDs[0], docIDs[-1]) if docIDs else None
+    new_docIDs = None
+    if order is not None:
+        threshold = bitmap_threshold or max(1, len(docIDs) // 8)
+        original_docIDs = document_order(order, docIDs, merge_runs(run_files, block, docID_range), threshold)
+        new_docIDs = {docID: new_docID for new_docID, docID in enumerate(original_docIDs)}
+        docIDs = list(range(len(original_docIDs)))
+    writer = IndexWriter(dictionary_file, postings_file, docIDs, bitmap_threshold, block_size)
+    try:
+        for word, postings_list in merge_runs(run_files, block, docID_range):
+            if new_docIDs is not None:
+                postings_list = sorted([new_docIDs[docID] for docID in postings_list])
+            writer.add(word, postings_list)
+    finally:
+        writer.close()
+    if order is not None:
+        write_docid_map(postings_file, original_docIDs)
+    else:
+        remove_docid_map(postings_file)
 
-def process_file_to_lexicon(file):
+def process_text_to_lexicon(text, tokeniser="nltk"):
     '''
-    Takes in a file and tokenises it into individual tokens using the nltk sent_tokenize and word_tokenize.
-    Returns a set of unique tokens in the file (as a dictionary).
+    Takes in the text of a document and tokenises it into individual tokens with the given tokeniser
+    (see Tokenisers.py), by default the nltk sent_tokenize and word_tokenize. Returns a set of unique normalised
+    tokens in the document (as a dictionary).
     '''
-    text = file.read()
     lexicon = {}
-    sentences = sent_tokenize(text)
-    for sentence in sentences:
-        words = word_tokenize(sentence)
-        words = list(map(lambda x: normalise_token(x), words))
-        for word in words:
-            if word not in lexicon:
-                lexicon[word] = 0
+    for word in map(normalise_token, TOKENISERS[tokeniser](text)):
+        if word not in lexicon:
+            lexicon[word] = 0
     return lexicon
 
-def print_all_docIDs(all_files):
+def sort_block(block):
     '''
-    Prints a postings list with skip pointers to the first line of the postings.txt file.
-    :param all_files: A list of all the document IDs in the collection.
-    :return: The length of the the string written to postings.txt.
+    Sorts the postings lists of an in-memory block whose documents were not indexed in docID order.
     '''
-    open(output_file_postings, 'w').close()
-    postings_file = open(output_file_postings, 'a')
-    string = insert_skip_pointers(all_files) + "\n"
-    length = len(string)
-    postings_file.write(string)
-    return length
+    for word in block:
+        block[word] = array(DOCID_TYPECODE, sorted(block[word]))
 
-def create_helper_dictionaries(terms, length):
+def spimi_invert(documents, run_directory, memory_budget, tokeniser, run_prefix="run"):
     '''
-    Creates a pointer_dictionary which maps words to the start byte of each list in the helper file.
-    The line_to_term_dic maps the line in the helper file to the term.
-    :param terms: a list of all the unique terms in the collection
-    :param length: the maximum length of each postings list in the helper file
-    :return: pointer_dictionary and line_to_term_dic
+    Indexes the documents in a single pass. The postings of each term are accumulated in an in-memory block,
+    which is written out as a sorted run file whenever its estimated size exceeds the memory budget.
+    :param documents: an iterator of the (docID, text) tuples of the documents, usually in docID order.
+    :param run_directory: the directory in which the run files are written.
+    :param memory_budget: the maximum estimated size of the in-memory block in bytes.
+    :param tokeniser: the name of the tokeniser in Tokenisers.TOKENISERS.
+    :param run_prefix: the prefix of the names of the run files.
+    :return: a list of the run files in the order of the documents, and the block left in memory, which follows the
+    run files.
     '''
-    pointer_dictionary = {}
-    line_to_term_dic = {}
-    pointer = 0
-    line_number = 0
-    for term in terms:
-        pointer_dictionary[term] = pointer
-        pointer += length
-        line_to_term_dic[line_number] = term
-        line_number += 1
-    return pointer_dictionary, line_to_term_dic
+    run_files = []
+    block = {}
+    block_size = 0
+    last_docID = -1
+    ordered = True
+    for docID, text in documents:
+        file_lexicon = process_text_to_lexicon(text, tokeniser)
+        if docID < last_docID:
+            ordered = False
+        last_docID = docID
+        for word in file_lexicon:
+            if word not in block:
+                block[word] = array(DOCID_TYPECODE)
+                block_size += TERM_BYTES + len(word)
+            block[word].append(docID)
+        block_size += POSTING_BYTES * len(file_lexicon)
+        if block_size > memory_budget:
+            if not ordered:
+                sort_block(block)
+            run_file = os.path.join(run_directory, run_prefix + "_" + str(len(run_files)))
+            write_run(block, run_file)
+            run_files.append(run_file)
+            block = {}
+            block_size = 0
+            ordered = True
+    if not ordered:
+        sort_block(block)
+    return run_files, block
 
-def process_file_batches(file_batches, corpus_path, pointer_dictionary, freq_dictionary):
+def invert_batch(batch):
     '''
-    Takes in file batches and for each file batch, the files are processed into a sub_index which maps
-    terms to a postings list for that file batch. The print_postings function is then called to
-    append the postings lists in the sub_index into the helper postings file.
-    :param file_batches: a list of list of document IDs, where each list is a file batch.
-    :param corpus_path: the path to the collection.
-    :param pointer_dictionary: a dictionary mapping terms to the end of each postings list in the helper file
-    :param freq_dictionary: a dictionary mapping terms to their current frequency in the helper file
-    :return: the updated pointer_dictionary and freq_dictionary
+    Indexes a batch of documents in a worker process of parallel_invert, writing all its postings to run files.
+    :param batch: a (documents, run_directory, memory_budget, tokeniser, batch_number, return_cache) tuple, where
+    documents is the list of the (docID, text) tuples of the batch.
+    :return: the list of run files of the batch in the order of the documents, the numbers of stem cache hits and
+    misses in the batch, and the entries of the stem cache of the worker if return_cache is True, so that they can be
+    saved by the main process.
     '''
-    for files in file_batches:
-        sub_index = {}
-        for fileID in files:
-            file = corpus_path + fileID
-            lines = io.open(file, mode="r", encoding="utf-8")
-            file_lexicon = process_file_to_lexicon(lines)
-            for word in file_lexicon:
-                if word not in sub_index:
-                    sub_index[word] = []
-                sub_index[word].append(fileID)
-        freq_dictionary, pointer_dictionary = print_postings(sub_index, pointer_dictionary, freq_dictionary)
-    return pointer_dictionary, freq_dictionary
+    documents, run_directory, memory_budget, tokeniser, batch_number, return_cache = batch
+    hits, misses = normaliser.hits, normaliser.misses
+    run_prefix = "batch" + str(batch_number)
+    run_files, block = spimi_invert(documents, run_directory, memory_budget, tokeniser, run_prefix)
+    if block:
+        run_file = os.path.join(run_directory, run_prefix + "_" + str(len(run_files)))
+        write_run(block, run_file)
+        run_files.append(run_file)
+    cache_entries = list(normaliser.cache.items()) if return_cache else []
+    return run_files, normaliser.hits - hits, normaliser.misses - misses, cache_entries
 
-def print_postings(sub_index, pointer_dictionary, freq_dictionary):
+def parallel_invert(documents, run_directory, memory_budget, tokeniser, jobs, return_cache=False, count=None):
     '''
-    Writes the additional postings from the lexicon to the helper file.
-    For each word, it uses the pointer_dictionary to find the byte address of the end of the
-    postings list in the file and appends the additional postings directly to that address.
-    The freq_dictionary is also updated with the number of additional postings appended.
-    :param sub_index: A mapping from terms to postings from a subset of the document collection.
-    :param pointer_dictionary: A dictionary mapping terms to the byte address of the end of each postings list.
-    :param freq_dictionary: A dictionary mapping terms to the number of postings for that term.
-    :return: the updated pointer_dictionary and freq_dictionary.
+    Splits the stream of documents into batches of consecutive documents and indexes the batches with a pool of
+    processes. The documents are read by the pipeline of Corpus.py in the main process, which sends each batch to the
+    pool, and stops reading while PENDING_BATCHES batches for each process are waiting to be indexed, so that the
+    collection is never held in memory. If the number of documents is known, the batches are small enough for every
+    process to get several of them, which balances the load. Each process gets an equal share of the memory budget.
+    If return_cache is True, the stem cache entries of the workers are added to the stem cache of the main process.
+    :param count: the number of documents, if it is known.
+    :return: the list of the run files to be merged, in the order of the documents.
     '''
-    file = open(helper_postings_file, 'r+')
-    for word in sub_index:
-        start_pointer = pointer_dictionary[word]
-        file.seek(start_pointer)
-        string = ","
-        for docID in sub_index[word]:
-            string += str(docID) + ","
-        string = string[:-1]
-        string_length = len(string)
-        file.write(string)
-        new_pointer = start_pointer + string_length
-        pointer_dictionary[word] = new_pointer
-        if word not in freq_dictionary:
-            freq_dictionary[word] = 0
-        freq_dictionary[word] += len(sub_index[word])
-    return freq_dictionary, pointer_dictionary
+    batch_size = BATCH_SIZE if count is None else max(1, min(BATCH_SIZE, -(-count // (jobs * 4))))
+    run_files = []
 
-def convert_raw_postings(pointer_dictionary, line_to_term_dic, freq_dictionary):
+    def collect(result):
+        batch_run_files, hits, misses, cache_entries = result
+        run_files.extend(batch_run_files)
+        normaliser.hits += hits
+        normaliser.misses += misses
+        normaliser.update(cache_entries)
+
+    # the pool is started before the producer thread of the pipeline, so that no thread is running when it forks
+    with multiprocessing.Pool(jobs) as pool:
+        pending = deque()
+        documents = pipeline(documents)
+        batch_number = 0
+        while True:
+            batch_documents = list(islice(documents, batch_size))
+            if not batch_documents:
+                break
+            batch = (batch_documents, run_directory, memory_budget // jobs, tokeniser, batch_number, return_cache)
+            pending.append(pool.apply_async(invert_batch, (batch,)))
+            batch_number += 1
+            if len(pending) >= PENDING_BATCHES * jobs:
+                collect(pending.popleft().get())
+        while pending:
+            collect(pending.popleft().get())
+    return run_files
+
+def write_run(block, run_file):
     '''
-    Converts the helper file into the actual postings.txt file. Reads each postings list in the helper file,
-    inserts skip pointers and writes the line to postings.txt. The start_byte of each postings list
-    is also stored in the final_dictionary together with the frequency of each term.
-    :param pointer_dictionary: A dictionary mapping terms to the byte address of the end of each postings list.
-    :param line_to_term_dic: A dictionary mapping the line in the helper file to the term.
-    :param freq_dictionary: A dictionary mapping each term to its frequency in the collection.
-    :return: The final dictionary to be printed to dictionary.txt
+    Writes an in-memory block to a run file, sorted by term. Each record in the run file is the length of the record,
+    followed by the length of the term, the term and its postings list encoded as in the postings file,
+    all lengths being varints.
     '''
-    helper_file = open(helper_postings_file, 'r+')
-    # end off each postings list with endline char
-    for word in pointer_dictionary:
-        helper_file.seek(pointer_dictionary[word])
-        helper_file.write('\n')
-    postings_file = open(output_file_postings, 'a')
-    start_byte = postings_file.tell()
-    final_dictionary = {}
-    line_no = 0
-    helper_file = open(helper_postings_file, 'r')
-    for line in helper_file:
-        postings = line.replace(".", "")
-        if not postings or postings == "\n":
-            continue
-        postings = postings.split(",")[1:]
-        postings[-1] = postings[-1][:-1]
-        postings_list = insert_skip_pointers(postings) + '\n'
-        postings_file.write(postings_list)
-        word = line_to_term_dic[line_no]
-        line_no += 1
-        final_dictionary[word] = (freq_dictionary[word], start_byte)
-        start_byte = postings_file.tell()
-    return final_dictionary
+    with open(run_file, "wb") as file:
+        for term in sorted(block):
+            term_bytes = term.encode("utf-8")
+            record = bytearray()
+            encode_varint(len(term_bytes), record)
+            record += term_bytes
+            record += encode_postings(block[term])
+            length = bytearray()
+            encode_varint(len(record), length)
+            file.write(length)
+            file.write(record)
 
-def print_dictionary(dictionary):
+def read_run(run_file):
     '''
-    Writes the dictionary to the dictionary file. Each line has a term, the term frequency and
-    the pointer to the beginning of the posting list, separated by a space.
+    Returns an iterator over the (term, postings list) tuples of a run file, reading the file sequentially.
     '''
-    open(output_file_dictionary, "w").close()
-    file = open(output_file_dictionary, 'a')
-    for entry in dictionary:
-        freq = dictionary[entry][0]
-        value = dictionary[entry][1]
-        file.write(str(entry) + " " + str(freq) + " " + str(value) + "\n")
+    with open(run_file, "rb", buffering=RUN_BUFFER_SIZE) as file:
+        while True:
+            length = 0
+            shift = 0
+            byte = file.read(1)
+            if not byte:
+                return
+            while byte[0] >= 0x80:
+                length |= (byte[0] & 0x7F) << shift
+                shift += 7
+                byte = file.read(1)
+            length |= byte[0] << shift
+            record = file.read(length)
+            term_length, offset = decode_varint(record, 0)
+            term = record[offset:offset + term_length].decode("utf-8")
+            yield (term, decode_postings(record, offset + term_length, DEFAULT_BLOCK_SIZE))
 
-def insert_skip_pointers(postings):
+def merge_runs(run_files, block, docID_range=None):
     '''
-    Inserts skip pointers in the form of indices into a postings list with a skip distance
-    of the root of the length of the list. Skip pointers are only inserted if the skip distance
-    exceeds 2.
-    :param postings: a list of postings as integers.
-    :return: a list of postings as strings, including skip pointers.
+    Merges the sorted runs with a k-way merge on the terms. The postings lists of a term from the runs are
+    concatenated in run order, which keeps them sorted if the runs are in docID order, and are otherwise sorted
+    again. Each merged postings list is then written to the postings file by the IndexWriter (see write_index),
+    which also records the start_byte of each postings list together with the frequency of each term in the
+    dictionary.
+    :param run_files: the list of the run files, in the order of the documents.
+    :param block: the in-memory block which follows the run files.
+    :param docID_range: the (first, last) tuple of the range of docIDs whose postings are kept, if any. The terms
+    without postings in the range are left out.
+    :return: an iterator of the (term, postings list) tuples of the collection, sorted by term.
     '''
-    length = len(postings)
-    skip_distance = int(math.sqrt(length))
-    if skip_distance <= 2:
-        return ",".join(postings)
-    string = ""
-    count = 0
-    for posting in postings:
-        string += posting
-        if count % skip_distance == 0:
-            skip_pointer = count + skip_distance
-            if skip_pointer < length:
-                string += "/" + str(skip_pointer)
-        string += ","
-        count += 1
-    return string[:-1]
+    runs = [read_run(run_file) for run_file in run_files] + [iter(sorted(block.items()))]
+    merged = heapq.merge(*runs, key=lambda entry: entry[0])
+    for word, entries in groupby(merged, key=lambda entry: entry[0]):
+        docIDs = array(DOCID_TYPECODE)
+        ordered = True
+        for entry in entries:
+            if docIDs and entry[1] and entry[1][0] < docIDs[-1]:
+                ordered = False
+            docIDs.extend(entry[1])
+        if not ordered:
+            docIDs = array(DOCID_TYPECODE, sorted(docIDs))
+        if docID_range is not None:
+            start, end = bisect_left(docIDs, docID_range[0]), bisect_right(docIDs, docID_range[1])
+            if start == end:
+                continue
+            if end - start < len(docIDs):
+                docIDs = docIDs[start:end]
+        yield (word, docIDs)
 
-input_directory = output_file_dictionary = output_file_postings = None
+if __name__ == "__main__":
+    input_path = output_file_dictionary = output_file_postings = None
+    input_format = None
+    bitmap_threshold = None
+    memory_budget = 256 * 1024 * 1024
+    jobs = 1
+    stem_cache_file = None
+    tokeniser = "nltk"
+    block_size = DEFAULT_BLOCK_SIZE
+    add_documents = False
+    deleted_docIDs_file = None
+    shards = 1
+    order = None
 
-try:
-    opts, args = getopt.getopt(sys.argv[1:], 'i:d:p:')
-except getopt.GetoptError as err:
-    usage()
-    sys.exit(2)
-    
-for o, a in opts:
-    if o == '-i': # input directory
-        input_directory = a
-    elif o == '-d': # dictionary file
-        output_file_dictionary = a
-    elif o == '-p': # postings file
-        output_file_postings = a
-    else:
-        assert False, "unhandled option"
+    try:
+        opts, args = getopt.getopt(sys.argv[1:], 'i:d:p:f:b:m:j:c:t:k:s:r:ax:')
+    except getopt.GetoptError as err:
+        usage()
+        sys.exit(2)
+
+    for o, a in opts:
+        if o == '-i': # input directory, archive or file of documents
+            input_path = a
+        elif o == '-d': # dictionary file
+            output_file_dictionary = a
+        elif o == '-p': # postings file
+            output_file_postings = a
+        elif o == '-f': # input format
+            input_format = a
+        elif o == '-b': # document frequency from which postings are stored as bitmaps
+            bitmap_threshold = int(a)
+        elif o == '-m': # memory budget of an in-memory block in megabytes
+            memory_budget = int(float(a) * 1024 * 1024)
+        elif o == '-j': # number of indexing processes
+            jobs = int(a)
+        elif o == '-c': # stem cache file
+            stem_cache_file = a
+        elif o == '-t': # tokeniser
+            tokeniser = a
+        elif o == '-k': # number of postings in each block, i.e. the skip interval
+            block_size = int(a)
+        elif o == '-s': # number of shards of consecutive docIDs
+            shards = int(a)
+        elif o == '-r': # order in which new docIDs are given to the documents
+            order = a
+        elif o == '-a': # index new documents into a delta segment
+            add_documents = True
+        elif o == '-x': # file of document IDs to be deleted
+            deleted_docIDs_file = a
+        else:
+            assert False, "unhandled option"
 
-if input_directory == None or output_file_postings == None or output_file_dictionary == None:
-    usage()
-    exit(2)
+    if (input_path == None and deleted_docIDs_file == None) or output_file_postings == None \
+            or output_file_dictionary == None or tokeniser not in TOKENISERS \
+            or (input_format is not None and input_format not in FORMATS) \
+            or (order is not None and (order not in ORDERS or add_documents or deleted_docIDs_file)):
+        usage()
+        exit(2)
 
-main()
+    main()
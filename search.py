@@ -2,77 +2,155 @@
 import re
 import sys
 import getopt
-from BooleanParser import evaluate_query
+import json
+from itertools import tee
+from BooleanEval import ENGINES
+from BatchSearch import Searcher, search_queries
+from PostingsCache import DEFAULT_CACHE_SIZE
+from ResultCache import DEFAULT_RESULT_CACHE_SIZE
+from ShardedIndex import ShardedSearcher, read_shards
+from WildcardIndex import DEFAULT_MAX_EXPANSIONS
 
 def usage():
-    print("usage: " + sys.argv[0] + " -d dictionary-file -p postings-file -q file-of-queries -o output-file-of-results")
+    print("usage: " + sys.argv[0] + " -d dictionary-file -p postings-file -q file-of-queries -o output-file-of-results [-e scalar|numpy]"
+          + " [-c cache-size-in-MB] [-w query-log-file]"
+          + " [-r result-cache-size-in-MB] [-t result-ttl-in-seconds] [-x] [-l max-results-per-query] [-C]"
+          + " [-j number-of-jobs] [-g] [-m max-wildcard-expansions] [--trace trace-file] [--stats]")
+
+OUTPUT_BUFFER_SIZE = 1024 * 1024
+OUTPUT_CHUNK_SIZE = 4096
 
 def main():
     '''
-    Main function reads in the dictionary file into memory, then processes each query in the query file,
-    writing the evaluated output to the output file line by line.
+    Main function reads in the dictionary file into memory and opens the postings file once, together with any delta
+    segments of the index, then processes each query in the query file, writing the evaluated output to the output
+    file line by line. The decoded postings lists are cached across the queries by a PostingsCache, which may first
+    be warmed up with the terms of a query log, and the results of the queries and their sub-expressions are cached
+    by a ResultCache, so that recurring queries are only evaluated once. With a limit, only the first document IDs of
+    each result are computed, lazily, and with count_only only the number of document IDs of each result is written.
+    With more than one job, the queries are evaluated in parallel by a pool of worker processes (see BatchSearch.py),
+    and the results are still written in the order of the queries. With a trace file, a JSON record of the evaluation
+    of each query (see Tracer.py) is written to the trace file, one line per query.
+    If the index is sharded (see ShardedIndex.py), the queries are evaluated by a worker process for each shard, and
+    the results of the shards are concatenated by a ShardedSearcher.
     '''
-    dictionary = read_dictionary()
+    shards = read_shards(postings_file)
+    if shards:
+        searcher = ShardedSearcher(shards, engine, cache_size, result_cache_size, limit, count_only, explain,
+                                   query_log_file, max_expansions, result_ttl)
+    else:
+        worker_args = (dictionary_file, postings_file, engine, cache_size, result_cache_size, limit, count_only,
+                       explain, trace_file is not None, max_expansions, result_ttl)
+        searcher = Searcher(*worker_args)
+        if trace_file is not None:
+            trace = open(trace_file, "w", buffering=OUTPUT_BUFFER_SIZE)
+            searcher.tracer.add_callback(lambda record: trace.write(json.dumps(record) + "\n"))
+        if query_log_file is not None:
+            with open(query_log_file, "r") as log:
+                searcher.postings.warm_up(log)
     file = open(file_of_queries, "r")
-    open(output_file_of_results, "w").close()
-    output = open(output_file_of_results, 'a')
-    for line in file:
-        query = line[:-1] if line[-1] == "\n" else line
-        if query:
-            try:
-                postings = evaluate_query(query, dictionary)
-            except:
-                postings = []
-            output.write(print_output(postings) + "\n")
-
-def print_output(list):
-    '''
-    Converts a list into a string to be written to output.
-    Also removes skip pointers from the output.
-    '''
-    string = ""
-    for posting in list:
-        docID = posting.split("/")[0]
-        string += docID + " "
-    return string[:-1]
+    output = open(output_file_of_results, "w", buffering=OUTPUT_BUFFER_SIZE)
+    queries = (line[:-1] if line[-1] == "\n" else line for line in file)
+    queries, echoed = tee(query for query in queries if query)
+    if shards:
+        results = searcher.search_queries(queries)
+    else:
+        results = search_queries(queries, searcher, jobs, group, worker_args=worker_args)
+    for query, result in zip(echoed, results):
+        if explain:
+            output.write(query + "\n" + result + "\n\n")
+        elif count_only:
+            output.write(str(result) + "\n")
+        else:
+            write_output(output, result)
+    file.close()
+    output.close()
+    if trace_file is not None:
+        trace.close()
+    if print_cache_stats:
+        postings_stats, results_stats = searcher.stats()
+        print("postings cache: " + ", ".join(key + " " + str(value) for key, value in postings_stats.items()))
+        if results_stats is not None:
+            print("result cache: " + ", ".join(key + " " + str(value) for key, value in results_stats.items()))
+    searcher.close()
 
-def read_dictionary():
+def write_output(output, docIDs):
     '''
-    Read the dictionary file into a dictionary mapping each term to a (frequency, term_pointer) tuple.
+    Writes a postings list of integer document IDs to the output as a line of space separated document IDs. The line is
+    written in chunks of OUTPUT_CHUNK_SIZE document IDs, so that the string of a long result is never built at once.
     '''
-    dictionary = {}
-    file = open(dictionary_file, "r")
-    for line in file:
-        line = line[:-1]
-        entry = line.split()
-        word = entry[0]
-        freq = int(entry[1])
-        pointer = int(entry[2])
-        dictionary[word] = (freq, pointer)
-    return dictionary
+    for start in range(0, len(docIDs), OUTPUT_CHUNK_SIZE):
+        if start:
+            output.write(" ")
+        output.write(" ".join(map(str, docIDs[start:start + OUTPUT_CHUNK_SIZE])))
+    output.write("\n")
 
 dictionary_file = postings_file = file_of_queries = output_file_of_results = None
+engine = "scalar"
+cache_size = DEFAULT_CACHE_SIZE
+query_log_file = None
+result_cache_size = DEFAULT_RESULT_CACHE_SIZE
+result_ttl = None
+print_cache_stats = False
+explain = False
+limit = None
+count_only = False
+jobs = 1
+group = False
+trace_file = None
+max_expansions = DEFAULT_MAX_EXPANSIONS
 
-try:
-    opts, args = getopt.getopt(sys.argv[1:], 'd:p:q:o:')
-except getopt.GetoptError as err:
-    usage()
-    sys.exit(2)
+if __name__ == "__main__":
+    try:
+        opts, args = getopt.getopt(sys.argv[1:], 'd:p:q:o:e:c:w:r:t:xl:Cj:gm:', ['trace=', 'stats'])
+    except getopt.GetoptError as err:
+        usage()
+        sys.exit(2)
 
-for o, a in opts:
-    if o == '-d':
-        dictionary_file = a
-    elif o == '-p':
-        postings_file = a
-    elif o == '-q':
-        file_of_queries = a
-    elif o == '-o':
-        output_file_of_results = a
-    else:
-        assert False, "unhandled option"
+    for o, a in opts:
+        if o == '-d':
+            dictionary_file = a
+        elif o == '-p':
+            postings_file = a
+        elif o == '-q':
+            file_of_queries = a
+        elif o == '-o':
+            output_file_of_results = a
+        elif o == '-e': # merge engine
+            engine = a
+        elif o == '-c': # postings cache size in MB, 0 to disable
+            cache_size = int(float(a) * 1024 * 1024)
+        elif o == '-w': # query log to warm up the postings cache with
+            query_log_file = a
+        elif o == '-r': # result cache size in MB, 0 to disable
+            result_cache_size = int(float(a) * 1024 * 1024)
+        elif o == '-t': # number of seconds for which a result is kept in the result cache
+            result_ttl = float(a)
+        elif o == '-x': # write the execution plan of each query instead of its results
+            explain = True
+        elif o == '-l': # maximum number of document IDs written per query
+            limit = int(a)
+        elif o == '-C': # write the number of document IDs of each query instead of the document IDs
+            count_only = True
+        elif o == '-j': # number of worker processes evaluating the queries
+            jobs = int(a)
+        elif o == '-g': # group the queries by their most frequent term, to decode each postings list once per batch
+            group = True
+        elif o == '-m': # maximum number of terms a wildcard operand is expanded into
+            max_expansions = int(a)
+        elif o == '--trace': # file to write a JSON record of the evaluation of each query to
+            trace_file = a
+        elif o == '--stats': # print the counters of the postings and result caches after the queries
+            print_cache_stats = True
+        else:
+            assert False, "unhandled option"
 
-if dictionary_file == None or postings_file == None or file_of_queries == None or output_file_of_results == None:
-    usage()
-    sys.exit(2)
+    if dictionary_file == None or postings_file == None or file_of_queries == None or output_file_of_results == None \
+            or engine not in ENGINES:
+        usage()
+        sys.exit(2)
+    if read_shards(postings_file) and (jobs > 1 or group or trace_file is not None):
+        print(sys.argv[0] + ": -j, -g and --trace are not supported on a sharded index")
+        sys.exit(2)
 
-main()
\ No newline at end of file
+    main()
@@ -0,0 +1,283 @@
+#!/usr/bin/python
+import sys
+import getopt
+import json
+import asyncio
+import traceback
+from urllib.parse import urlsplit, parse_qs
+from BooleanParser import query_terms, evaluate_query
+from BooleanEval import ENGINES
+from SegmentedIndex import open_index_version, index_version
+from ShardedIndex import read_shards
+from Reordering import read_docid_map
+from WildcardIndex import DEFAULT_MAX_EXPANSIONS
+from PostingsCache import PostingsCache, BatchPostings, DEFAULT_CACHE_SIZE
+from ResultCache import ResultCache, DEFAULT_RESULT_CACHE_SIZE
+
+MAX_BODY_SIZE = 16 * 1024 * 1024
+STATUS_TEXT = {200: "OK", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed",
+               413: "Payload Too Large", 500: "Internal Server Error"}
+
+def usage():
+    print("usage: " + sys.argv[0] + " -d dictionary-file -p postings-file [-e scalar|numpy]"
+          + " [-H host] [-P port | -u unix-socket-path] [-c cache-size-in-MB] [-w query-log-file]"
+          + " [-r result-cache-size-in-MB] [-t result-ttl-in-seconds] [-m max-wildcard-expansions]")
+
+class QueryServer:
+    '''
+    The QueryServer class answers boolean queries over HTTP from an index which is opened once when the server starts.
+    Requests are served by an asyncio event loop, so that many clients may be connected at once, with keep-alive
+    connections, while each query is evaluated in turn by a single BooleanEval shared by all the requests:
+        GET /query?q=<query>    evaluates one query, given in the query string, with at most n document IDs in
+                                the result if n is given, e.g. /query?q=oil&n=10
+        POST /query             evaluates one query, given as the request body
+        POST /batch             evaluates a batch of queries, given as the lines of the request body, reading the
+                                postings list of each term once for the whole batch (see BatchPostings)
+        GET /stats              returns the number of requests and queries served and the counters of the caches
+    Results are returned as JSON objects, e.g. {"query": "a AND b", "docIDs": [1, 5]} for a single query and
+    {"results": [[1, 5], [2]]} for a batch. A query which cannot be parsed has an empty result, as in search.py, and
+any other error while a request is served is returned as a 500 response, and its traceback is printed to stderr.
+    Before each request, the server checks whether the index files have changed, e.g. after index.py -a or
+    compact.py, in which case the index is opened again and the caches are cleared.
+    '''
+
+    def __init__(self, dictionary_file, postings_file, engine="scalar", cache_size=DEFAULT_CACHE_SIZE, results=None,
+                 max_expansions=DEFAULT_MAX_EXPANSIONS):
+        '''
+        :param engine: the name of the merge engine in ENGINES.
+        :param cache_size: the budget in bytes of the PostingsCache of the index.
+        :param results: the ResultCache shared by all the queries, or None to evaluate every query.
+        :param max_expansions: the maximum number of terms a wildcard operand is expanded into.
+        '''
+        self.dictionary_file = dictionary_file
+        self.postings_file = postings_file
+        self.engine = ENGINES[engine]
+        self.cache_size = cache_size
+        self.results = results
+        self.max_expansions = max_expansions
+        self.requests = 0
+        self.queries = 0
+        self.open()
+
+    def open(self):
+        '''
+        Opens the index, together with any delta segments, behind a PostingsCache, and its docID map, if the
+        document IDs of the index are reassigned (see Reordering.py).
+        '''
+        index, self.version = open_index_version(self.dictionary_file, self.postings_file)
+        self.postings = PostingsCache(index, self.cache_size)
+        self.evaluator = self.engine(self.postings)
+        self.evaluator.max_expansions = self.max_expansions
+        self.docid_map = read_docid_map(self.postings_file)
+
+    def check_index(self):
+        '''
+        Opens the index again and clears the result cache if the index files have changed since they were opened.
+        '''
+        if index_version(self.dictionary_file, self.postings_file) != self.version:
+            self.postings.close()
+            if self.results is not None:
+                self.results.clear()
+            self.open()
+
+    def close(self):
+        self.postings.close()
+
+    def search(self, query, evaluator=None, limit=None):
+        '''
+        Returns the list of document IDs matching a query, or its first limit document IDs if a limit is given, or an
+        empty list if the query is malformed.
+        '''
+        self.queries += 1
+        try:
+            if self.docid_map is None:
+                return list(evaluate_query(query, evaluator or self.evaluator, self.results, limit))
+            if self.docid_map.ordered:
+                return list(self.docid_map.original(evaluate_query(query, evaluator or self.evaluator, self.results,
+                                                                   limit)))
+            return list(self.docid_map.original(evaluate_query(query, evaluator or self.evaluator, self.results),
+                                                limit))
+        except ValueError:
+            return []
+
+    def search_batch(self, queries):
+        '''
+        Returns the lists of document IDs matching each query of a batch, in order. The postings lists of all the
+        terms of the batch are read once, and shared by the evaluation of all the queries.
+        '''
+        terms = set()
+        for query in queries:
+            terms.update(query_terms(query))
+        evaluator = self.engine(BatchPostings(self.postings, terms))
+        evaluator.universe = self.evaluator.universe
+        evaluator.max_expansions = self.max_expansions
+        results = [self.search(query, evaluator) for query in queries]
+        self.evaluator.universe = evaluator.universe
+        return results
+
+    def respond(self, method, target, body):
+        '''
+        Returns the (status, JSON object) response to a request.
+        '''
+        url = urlsplit(target)
+        self.check_index()
+        if url.path == "/query":
+            params = parse_qs(url.query)
+            try:
+                limit = int(params["n"][0]) if "n" in params else None
+            except ValueError:
+                return (400, {"error": "n is not a number"})
+            if method == "GET":
+                query = params.get("q", [""])[0]
+            elif method == "POST":
+                query = body.decode("utf-8").strip()
+            else:
+                return (405, {"error": "use GET or POST"})
+            if not query:
+                return (400, {"error": "no query given"})
+            return (200, {"query": query, "docIDs": self.search(query, limit=limit)})
+        if url.path == "/batch":
+            if method != "POST":
+                return (405, {"error": "use POST"})
+            queries = [line.strip() for line in body.decode("utf-8").splitlines() if line.strip()]
+            return (200, {"results": self.search_batch(queries)})
+        if url.path == "/stats":
+            stats = {"requests": self.requests, "queries": self.queries, "cache": self.postings.stats()}
+            if self.results is not None:
+                stats["result_cache"] = self.results.stats()
+            return (200, stats)
+        return (404, {"error": "unknown path " + url.path})
+
+    async def handle(self, reader, writer):
+        '''
+        Serves the HTTP requests of a connection until the client closes it. A malformed request line or
+        Content-Length is answered with a 400 error, and the connection is then closed.
+        '''
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line.strip():
+                    break
+                fields = request_line.decode("latin-1").split()
+                status = None
+                keep_alive = False
+                if len(fields) != 3:
+                    status, response = (400, {"error": "malformed request line"})
+                else:
+                    method, target, version = fields
+                    headers = {}
+                    while True:
+                        line = await reader.readline()
+                        if line in (b"\r\n", b"\n", b""):
+                            break
+                        name, _, value = line.decode("latin-1").partition(":")
+                        headers[name.strip().lower()] = value.strip()
+                    try:
+                        length = int(headers.get("content-length", 0))
+                    except ValueError:
+                        length = -1
+                    if length < 0:
+                        status, response = (400, {"error": "Content-Length is not a valid length"})
+                    elif length > MAX_BODY_SIZE:
+                        status, response = (413, {"error": "request body too large"})
+                if status is None:
+                    body = await reader.readexactly(length)
+                    self.requests += 1
+                    try:
+                        status, response = self.respond(method, target, body)
+                    except Exception as error:
+                        traceback.print_exc()
+                        status, response = (500, {"error": type(error).__name__ + ": " + str(error)})
+                    connection = headers.get("connection", "").lower()
+                    keep_alive = connection != "close" if version == "HTTP/1.1" else connection == "keep-alive"
+                payload = json.dumps(response).encode("utf-8")
+                writer.write(("HTTP/1.1 " + str(status) + " " + STATUS_TEXT[status] + "\r\n"
+                              + "Content-Type: application/json\r\n"
+                              + "Content-Length: " + str(len(payload)) + "\r\n"
+                              + "Connection: " + ("keep-alive" if keep_alive else "close") + "\r\n\r\n")
+                             .encode("latin-1") + payload)
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (ValueError, asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+async def serve(server):
+    '''
+    Starts the server on the unix socket or the host and port given on the command line and serves forever.
+    '''
+    if unix_socket is not None:
+        listener = await asyncio.start_unix_server(server.handle, path=unix_socket)
+    else:
+        listener = await asyncio.start_server(server.handle, host, port)
+    async with listener:
+        await listener.serve_forever()
+
+def main():
+    '''
+    Opens the index once, together with any delta segments, and serves queries until interrupted. The decoded
+    postings lists are cached across all the requests by a PostingsCache, and the results by a ResultCache.
+    '''
+    results = ResultCache(result_cache_size, result_ttl) if result_cache_size else None
+    server = QueryServer(dictionary_file, postings_file, engine, cache_size, results, max_expansions)
+    if query_log_file is not None:
+        with open(query_log_file, "r") as log:
+            server.postings.warm_up(log)
+    try:
+        asyncio.run(serve(server))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.close()
+
+dictionary_file = postings_file = unix_socket = query_log_file = None
+cache_size = DEFAULT_CACHE_SIZE
+result_cache_size = DEFAULT_RESULT_CACHE_SIZE
+result_ttl = None
+max_expansions = DEFAULT_MAX_EXPANSIONS
+engine = "scalar"
+host, port = "127.0.0.1", 8080
+
+if __name__ == "__main__":
+    try:
+        opts, args = getopt.getopt(sys.argv[1:], 'd:p:e:H:P:u:c:w:r:t:m:')
+    except getopt.GetoptError as err:
+        usage()
+        sys.exit(2)
+
+    for o, a in opts:
+        if o == '-d':
+            dictionary_file = a
+        elif o == '-p':
+            postings_file = a
+        elif o == '-e': # merge engine
+            engine = a
+        elif o == '-H': # host to listen on
+            host = a
+        elif o == '-P': # port to listen on
+            port = int(a)
+        elif o == '-u': # unix socket to listen on instead of a port
+            unix_socket = a
+        elif o == '-c': # postings cache size in MB, 0 to disable
+            cache_size = int(float(a) * 1024 * 1024)
+        elif o == '-w': # query log to warm up the postings cache with
+            query_log_file = a
+        elif o == '-r': # result cache size in MB, 0 to disable
+            result_cache_size = int(float(a) * 1024 * 1024)
+        elif o == '-t': # seconds for which a cached result is kept
+            result_ttl = float(a)
+        elif o == '-m': # maximum number of terms a wildcard operand is expanded into
+            max_expansions = int(a)
+        else:
+            assert False, "unhandled option"
+
+    if dictionary_file == None or postings_file == None or engine not in ENGINES:
+        usage()
+        sys.exit(2)
+    if read_shards(postings_file):
+        print(sys.argv[0] + ": a sharded index is searched with search.py")
+        sys.exit(2)
+
+    main()
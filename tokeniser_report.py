@@ -0,0 +1,81 @@
+#!/usr/bin/python
+import sys
+import getopt
+import time
+from collections import Counter
+from itertools import islice
+from Corpus import open_corpus
+from TokenNormaliser import normalise_token
+from Tokenisers import TOKENISERS
+
+def usage():
+    print("usage: " + sys.argv[0] + " -i directory-or-file-of-documents [-n number-of-documents]"
+          + " [-a tokeniser] [-b tokeniser]")
+
+def main():
+    '''
+    Compares the index produced by two tokenisers on the documents in the corpus (by default the nltk and the regex
+    tokenisers of Tokenisers.py) and prints a report of the differences: the tokenising time of each, the terms
+    found by only one of them with their document frequencies, and the number of postings which differ.
+    '''
+    seconds = {tokeniser_a: 0.0, tokeniser_b: 0.0}
+    freq = {tokeniser_a: Counter(), tokeniser_b: Counter()}
+    differing_postings = 0
+    identical_documents = 0
+    documents = 0
+    for docID, text in islice(open_corpus(input_directory).documents(), number_of_documents):
+        documents += 1
+        lexicons = {}
+        for tokeniser in [tokeniser_a, tokeniser_b]:
+            start = time.perf_counter()
+            tokens = TOKENISERS[tokeniser](text)
+            seconds[tokeniser] += time.perf_counter() - start
+            lexicons[tokeniser] = set(map(normalise_token, tokens))
+            freq[tokeniser].update(lexicons[tokeniser])
+        difference = lexicons[tokeniser_a] ^ lexicons[tokeniser_b]
+        differing_postings += len(difference)
+        if not difference:
+            identical_documents += 1
+
+    postings = {tokeniser: sum(freq[tokeniser].values()) for tokeniser in freq}
+    print("documents: " + str(documents) + ", with identical terms: " + str(identical_documents))
+    for tokeniser in [tokeniser_a, tokeniser_b]:
+        print(tokeniser + ": " + str(len(freq[tokeniser])) + " terms, " + str(postings[tokeniser]) + " postings, "
+              + "%.3f" % seconds[tokeniser] + "s tokenising")
+    print("differing postings: " + str(differing_postings) + " ("
+          + "%.2f" % (100.0 * differing_postings / max(1, postings[tokeniser_a])) + "% of " + tokeniser_a + ")")
+    for tokeniser, other in [(tokeniser_a, tokeniser_b), (tokeniser_b, tokeniser_a)]:
+        only = [term for term in freq[tokeniser] if term not in freq[other]]
+        only.sort(key=lambda term: (-freq[tokeniser][term], term))
+        print("terms only in " + tokeniser + ": " + str(len(only)))
+        for term in only[:top_terms]:
+            print("    " + term + " " + str(freq[tokeniser][term]))
+
+input_directory = None
+number_of_documents = None
+tokeniser_a, tokeniser_b = "nltk", "regex"
+top_terms = 20
+
+try:
+    opts, args = getopt.getopt(sys.argv[1:], 'i:n:a:b:')
+except getopt.GetoptError as err:
+    usage()
+    sys.exit(2)
+
+for o, a in opts:
+    if o == '-i': # input directory, archive or file of documents
+        input_directory = a
+    elif o == '-n': # number of documents to compare
+        number_of_documents = int(a)
+    elif o == '-a': # first tokeniser
+        tokeniser_a = a
+    elif o == '-b': # second tokeniser
+        tokeniser_b = a
+    else:
+        assert False, "unhandled option"
+
+if input_directory == None or tokeniser_a not in TOKENISERS or tokeniser_b not in TOKENISERS:
+    usage()
+    sys.exit(2)
+
+main()